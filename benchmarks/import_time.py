@@ -0,0 +1,91 @@
+"""
+Measure the import time of pyscenekit subpackages.
+
+Each module is imported in a fresh interpreter. Besides the wall time, the
+script checks that heavy backends are not imported eagerly and exits with a
+non-zero status when one of them shows up, or when --max-seconds is exceeded.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 5 --max-seconds 2.0
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# module -> dependencies that must not be loaded by importing it
+TARGETS = {
+    "pyscenekit": ["torch", "open3d", "trimesh"],
+    "pyscenekit.scenekit2d.depth": [
+        "transformers",
+        "diffusers",
+        "mmengine",
+        "huggingface_hub",
+    ],
+    "pyscenekit.scenekit2d.normal": ["transformers", "diffusers", "huggingface_hub"],
+    "pyscenekit.scenekit2d.segmentation": ["transformers"],
+    "pyscenekit.scenekit3d.common": ["open3d", "trimesh", "matplotlib"],
+    "pyscenekit.scenekit3d.reconstruction": ["open3d", "trimesh", "mini_dust3r"],
+    "pyscenekit.scenekit3d.datasets": ["pytorch3d", "open3d", "h5py"],
+    "pyscenekit.scenekit3d.visualization": ["pyrender", "pytorch3d"],
+}
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+# lazy_import keeps modules out of sys.modules until they are used, so any entry
+# counts as loaded, including LazyLoader placeholders
+loaded = [name for name in {forbidden!r} if name in sys.modules]
+print(json.dumps({{"seconds": seconds, "loaded": loaded}}))
+"""
+
+
+def measure(module, forbidden):
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return {"error": error[-1] if error else "import failed"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("modules", nargs="*", default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        forbidden = TARGETS.get(module, [])
+        runs = [measure(module, forbidden) for _ in range(args.repeat)]
+        errors = [run["error"] for run in runs if "error" in run]
+        if errors:
+            print(f"{module:<40} error: {errors[0]}")
+            failed = True
+            continue
+
+        seconds = statistics.median(run["seconds"] for run in runs)
+        loaded = sorted(set(name for run in runs for name in run["loaded"]))
+        status = "ok"
+        if loaded:
+            status = f"eagerly imports {', '.join(loaded)}"
+            failed = True
+        if args.max_seconds is not None and seconds > args.max_seconds:
+            status = f"slower than {args.max_seconds:.2f}s"
+            failed = True
+        print(f"{module:<40} {seconds:8.3f}s  {status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Compare the CPU mesh rasterizer against the PyTorch3D path.
+
+Renders depth and pix_to_face for cameras placed inside a synthetic room, or
+inside the mesh given with --mesh, and reports the time per view of each
+backend and how often their pix_to_face maps agree. The PyTorch3D backend is
+skipped when pytorch3d is not installed.
+
+    python benchmarks/mesh_rasterization.py
+    python benchmarks/mesh_rasterization.py --mesh mesh_aligned_0.05.ply --views 32
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from pyscenekit.scenekit3d.common import SceneKitCamera
+from pyscenekit.scenekit3d.visualization.cpu_render import CPURasterizer
+
+
+def room_mesh(size: float = 4.0, subdivisions: int = 200):
+    # box subdivided to get a realistic face count, see orient_faces
+    grid = np.linspace(-size / 2, size / 2, subdivisions + 1)
+    u, v = np.meshgrid(grid, grid)
+    quad = np.stack([u.ravel(), v.ravel()], axis=-1)
+    index = np.arange(len(quad)).reshape(subdivisions + 1, subdivisions + 1)
+    a, b = index[:-1, :-1].ravel(), index[:-1, 1:].ravel()
+    c, d = index[1:, :-1].ravel(), index[1:, 1:].ravel()
+    quad_faces = np.concatenate([np.stack([a, b, c], 1), np.stack([b, d, c], 1)])
+
+    vertices, faces = [], []
+    half = size / 2
+    for axis in range(3):
+        for sign in (-1, 1):
+            wall = np.insert(quad, axis, sign * half, axis=1)
+            faces.append(quad_faces + len(vertices) * len(quad))
+            vertices.append(wall)
+    return np.concatenate(vertices), np.concatenate(faces)
+
+
+def orient_faces(vertices: np.ndarray, faces: np.ndarray, center: np.ndarray):
+    # make every face of the synthetic room point to its center
+    v0, v1, v2 = (vertices[faces[:, i]] for i in range(3))
+    normals = np.cross(v1 - v0, v2 - v0)
+    outward = np.einsum("ij,ij->i", normals, v0 - center) > 0
+    faces = faces.copy()
+    faces[outward] = faces[outward][:, ::-1]
+    return faces
+
+
+def random_cameras(num_views: int, center: np.ndarray, radius: float, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    intrinsics = np.array([[1200.0, 0, 959.5], [0, 1200.0, 719.5], [0, 0, 1]])
+    cameras = []
+    for i in range(num_views):
+        position = center + rng.uniform(-radius, radius, 3)
+        forward = rng.normal(size=3)
+        forward /= np.linalg.norm(forward)
+        right = np.cross(forward, [0.0, 0.0, 1.0])
+        right /= np.linalg.norm(right)
+        down = np.cross(forward, right)
+        pose = np.eye(4)
+        pose[:3, :3] = np.stack([right, down, forward], axis=1)
+        pose[:3, 3] = position
+        cameras.append(
+            SceneKitCamera(
+                intrinsics.copy(),
+                np.linalg.inv(pose),
+                name=f"frame_{i:06d}.jpg",
+                width=1920,
+                height=1440,
+            )
+        )
+    return cameras
+
+
+def to_numpy(values):
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return values
+
+
+def time_backend(renderer, cameras, resolution, batch_size):
+    start = time.perf_counter()
+    zbuf, pix_to_face = [], []
+    for i in range(0, len(cameras), batch_size):
+        renderer.set_cameras(cameras[i : i + batch_size])
+        fragments = renderer.rasterize(resolution)
+        faces = to_numpy(fragments.pix_to_face)
+        if hasattr(getattr(renderer, "mesh", None), "num_faces_per_mesh"):
+            # pytorch3d indexes the faces of the extended batch
+            num_faces = renderer.mesh.num_faces_per_mesh()[0].item()
+            offsets = np.arange(len(faces)).reshape(-1, 1, 1, 1) * num_faces
+            faces = np.where(faces >= 0, faces - offsets, -1)
+        zbuf.append(to_numpy(fragments.zbuf))
+        pix_to_face.append(faces)
+    seconds = time.perf_counter() - start
+    return seconds, np.concatenate(zbuf), np.concatenate(pix_to_face)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mesh", type=str, default=None)
+    parser.add_argument("--views", type=int, default=16)
+    parser.add_argument("--resolution", type=int, default=640)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--num-workers", type=int, default=None)
+    parser.add_argument("--device", type=str, default="cuda")
+    args = parser.parse_args()
+
+    cpu = CPURasterizer(num_workers=args.num_workers)
+    if args.mesh is not None:
+        cpu.load_ply(args.mesh)
+        center = (cpu.vertices.min(0) + cpu.vertices.max(0)) / 2
+        radius = 0.5
+    else:
+        vertices, faces = room_mesh()
+        center = np.zeros(3)
+        radius = 1.0
+        cpu.set_mesh((vertices, orient_faces(vertices, faces, center)))
+    print(f"mesh: {len(cpu.vertices)} vertices, {len(cpu.faces)} faces")
+
+    cameras = random_cameras(args.views, center, radius)
+    results = {}
+    with cpu:
+        # the first call starts the worker processes
+        cpu.set_cameras(cameras[:1])
+        cpu.rasterize(args.resolution)
+        results["cpu"] = time_backend(cpu, cameras, args.resolution, args.batch_size)
+
+    try:
+        import torch
+        from pytorch3d.structures import Meshes
+        from pyscenekit.scenekit3d.visualization.pytorch3d_render import (
+            PyTorch3DRenderer,
+        )
+    except ImportError as e:
+        print(f"pytorch3d backend skipped: {e}")
+    else:
+        device = args.device if torch.cuda.is_available() else "cpu"
+        renderer = PyTorch3DRenderer(device=device)
+        renderer.mesh = Meshes(
+            verts=[torch.from_numpy(cpu.vertices)], faces=[torch.from_numpy(cpu.faces)]
+        ).to(device)
+        renderer.set_cameras(cameras[:1])
+        renderer.rasterize(args.resolution)
+        results[f"pytorch3d ({device})"] = time_backend(
+            renderer, cameras, args.resolution, args.batch_size
+        )
+
+    reference = None
+    for name, (seconds, zbuf, pix_to_face) in results.items():
+        line = f"{name:<20} {1000 * seconds / len(cameras):8.1f} ms/view"
+        if reference is None:
+            reference = (zbuf, pix_to_face)
+        else:
+            agree = (pix_to_face == reference[1]).mean()
+            both = (pix_to_face >= 0) & (reference[1] >= 0)
+            depth_error = np.abs(zbuf - reference[0])[both]
+            line += f"  pix_to_face agreement {100 * agree:.2f}%"
+            if depth_error.size:
+                line += f"  median depth error {np.median(depth_error):.2e}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
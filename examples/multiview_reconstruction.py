@@ -32,7 +32,14 @@ def multiview_reconstruction_pipeline(cfg: DictConfig):
         f"Running multi-view reconstruction with {len(image_list)} images: {image_list}"
     )
 
-    result = multiview_reconstructor(image_list)
+    result = multiview_reconstructor(
+        image_list,
+        scene_graph=cfg.multiview_reconstruction.scene_graph,
+        batch_size=cfg.multiview_reconstruction.batch_size,
+        niter=cfg.multiview_reconstruction.niter,
+        image_size=cfg.multiview_reconstruction.image_size,
+        cache_dir=cfg.multiview_reconstruction.cache_dir,
+    )
     torch.save(result.to_dict(), cfg.output)
     log.info(f"Multi-view reconstruction saved to {cfg.output}")
     return result
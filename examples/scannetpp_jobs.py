@@ -0,0 +1,71 @@
+"""
+Process many ScanNet++ scenes with a pool of persistent workers.
+
+Replaces launching examples/scannetpp_dataset.py once per scene. Finished
+tasks are recorded per scene, so rerunning the same command resumes where it
+stopped. Split the scenes over nodes with --shard, e.g. on node 2 of 4:
+
+    python examples/scannetpp_jobs.py --data-dir /data/scannetpp/data \
+        --tasks extract_rgb extract_masks render_depth unproject \
+        --num-workers 10 --shard 2/4
+"""
+
+import argparse
+
+from pyscenekit import attach_to_log
+from pyscenekit.pipeline.scenes import SCENE_TASKS, SceneJobRunner
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--data-dir", required=True)
+    parser.add_argument("--tasks", nargs="+", required=True, choices=list(SCENE_TASKS))
+    parser.add_argument("--scenes", nargs="*", default=None, help="default: all")
+    parser.add_argument("--scene-list", default=None, help="file with one id per line")
+    parser.add_argument("--shard", default="0/1", help="i/N, process shard i of N")
+    parser.add_argument("--num-workers", type=int, default=1)
+    parser.add_argument(
+        "--task-workers", type=int, default=1, help="processes used inside a task"
+    )
+    parser.add_argument("--record-dir", default=None)
+    parser.add_argument("--backend", default="pytorch3d", choices=["pytorch3d", "cpu"])
+    parser.add_argument("--target-resolution", type=int, default=0)
+    parser.add_argument(
+        "--force", action="store_true", help="ignore the completion records"
+    )
+    parser.add_argument(
+        "--index", action="store_true", help="list and open scenes from a SceneIndex"
+    )
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.verbose:
+        attach_to_log()
+
+    scenes_ids = args.scenes
+    if args.scene_list is not None:
+        with open(args.scene_list) as f:
+            scenes_ids = [line.strip() for line in f if line.strip()]
+
+    runner = SceneJobRunner(
+        args.data_dir,
+        args.tasks,
+        scenes_ids=scenes_ids,
+        record_dir=args.record_dir,
+        num_workers=args.num_workers,
+        shard=args.shard,
+        force=args.force,
+        use_index=args.index,
+        task_workers=args.task_workers,
+        backend=args.backend,
+        target_resolution=args.target_resolution,
+    )
+    summary = runner.run()
+    if summary["failed"]:
+        raise SystemExit(f"{len(summary['failed'])} scenes failed: {summary['failed']}")
+
+
+if __name__ == "__main__":
+    main()
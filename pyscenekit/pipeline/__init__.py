@@ -0,0 +1,21 @@
+from pyscenekit.utils.lazy import lazy_attributes
+
+# the frame pipeline imports torch, the scene runner only needs it in its tasks
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "FrameInferencePipeline": "pyscenekit.pipeline.core",
+        "PipelineStats": "pyscenekit.pipeline.core",
+        "SceneJobRunner": "pyscenekit.pipeline.scenes",
+        "SceneJobRecords": "pyscenekit.pipeline.scenes",
+        "scene_task": "pyscenekit.pipeline.scenes",
+    },
+)
+
+__all__ = [
+    "FrameInferencePipeline",
+    "PipelineStats",
+    "SceneJobRunner",
+    "SceneJobRecords",
+    "scene_task",
+]
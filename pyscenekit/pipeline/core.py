@@ -0,0 +1,188 @@
+import os
+import time
+import queue
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from pyscenekit.utils.common import log
+from pyscenekit.scenekit2d.base import BaseImageModel
+
+
+@dataclass
+class StageStats:
+    name: str
+    num_frames: int = 0
+    seconds: float = 0.0
+    num_workers: int = 1
+
+    # frames per second the stage sustains with all of its workers busy
+    @property
+    def throughput(self) -> float:
+        if self.seconds <= 0:
+            return float("inf")
+        return self.num_frames * self.num_workers / self.seconds
+
+
+@dataclass
+class PipelineStats:
+    decode: StageStats = field(default_factory=lambda: StageStats("decode"))
+    predict: StageStats = field(default_factory=lambda: StageStats("predict"))
+    write: StageStats = field(default_factory=lambda: StageStats("write"))
+    wall_seconds: float = 0.0
+
+    @property
+    def stages(self) -> List[StageStats]:
+        return [self.decode, self.predict, self.write]
+
+    @property
+    def bottleneck(self) -> str:
+        return min(self.stages, key=lambda stage: stage.throughput).name
+
+    def summary(self) -> str:
+        lines = [
+            f"{stage.name:>8}: {stage.num_frames} frames in {stage.seconds:.2f}s "
+            f"({stage.throughput:.2f} frames/s)"
+            for stage in self.stages
+        ]
+        lines.append(f"{'wall':>8}: {self.wall_seconds:.2f}s")
+        lines.append(f"bottleneck: {self.bottleneck}")
+        return "\n".join(lines)
+
+
+def save_prediction_npy(
+    output_dir: str, name: str, prediction: np.ndarray, output: Dict
+):
+    np.save(os.path.join(output_dir, f"{name}.npy"), prediction)
+
+
+class FrameInferencePipeline:
+    """
+    Stream frames from a dataset through a 2D model.
+
+    Frames are decoded (and undistorted) by a bounded thread pool, grouped into
+    batches for BaseImageModel.predict_batch and handed to a background writer.
+    The dataset only needs `num_images`, `get_image_by_index` and optionally
+    `image_paths`, e.g. ScanNetPPDLSRDataset and ScanNetPPiPhoneDataset.
+
+    Stage seconds are summed over the worker threads of that stage, throughput
+    accounts for the number of workers so the stages can be compared directly.
+    """
+
+    def __init__(
+        self,
+        dataset,
+        model: BaseImageModel,
+        batch_size: int = 8,
+        num_workers: int = 4,
+        prefetch: int = 32,
+        max_pending_writes: int = 32,
+        write_fn: Callable = save_prediction_npy,
+    ):
+        self.dataset = dataset
+        self.model = model
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.prefetch = max(prefetch, batch_size)
+        self.max_pending_writes = max_pending_writes
+        self.write_fn = write_fn
+        self.stats = PipelineStats()
+
+    def get_frame_name(self, index: int) -> str:
+        image_paths = getattr(self.dataset, "image_paths", None)
+        if image_paths:
+            return os.path.splitext(os.path.basename(image_paths[index]))[0]
+        return f"frame_{index:06d}"
+
+    def _decode(self, index: int):
+        start = time.perf_counter()
+        image = self.dataset.get_image_by_index(index)
+        return image, time.perf_counter() - start
+
+    def _write_loop(self, write_queue: queue.Queue, output_dir: str, errors: list):
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            if errors:
+                continue
+            name, prediction, output = item
+            start = time.perf_counter()
+            try:
+                self.write_fn(output_dir, name, prediction, output)
+            except Exception as e:
+                errors.append(e)
+                continue
+            self.stats.write.seconds += time.perf_counter() - start
+            self.stats.write.num_frames += 1
+
+    def run(self, output_dir: str, indices: List[int] = None, **predict_kwargs):
+        if indices is None:
+            indices = list(range(self.dataset.num_images))
+        os.makedirs(output_dir, exist_ok=True)
+        self.stats = PipelineStats()
+        self.stats.decode.num_workers = self.num_workers
+
+        write_queue = queue.Queue(maxsize=self.max_pending_writes)
+        write_errors = []
+        writer = threading.Thread(
+            target=self._write_loop,
+            args=(write_queue, output_dir, write_errors),
+            daemon=True,
+        )
+        writer.start()
+
+        log.info(f"Running {type(self.model).__name__} on {len(indices)} frames")
+        wall_start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                index_iter = iter(indices)
+                pending = deque()
+
+                # keep at most `prefetch` decoded frames in flight
+                def fill():
+                    while len(pending) < self.prefetch:
+                        index = next(index_iter, None)
+                        if index is None:
+                            return
+                        pending.append((index, executor.submit(self._decode, index)))
+
+                fill()
+                while pending:
+                    batch_indices = []
+                    batch_images = []
+                    while pending and len(batch_images) < self.batch_size:
+                        index, future = pending.popleft()
+                        image, seconds = future.result()
+                        self.stats.decode.seconds += seconds
+                        self.stats.decode.num_frames += 1
+                        batch_indices.append(index)
+                        batch_images.append(image)
+                    fill()
+
+                    start = time.perf_counter()
+                    predictions, outputs = self.model.predict_batch(
+                        batch_images, batch_size=len(batch_images), **predict_kwargs
+                    )
+                    self.stats.predict.seconds += time.perf_counter() - start
+                    self.stats.predict.num_frames += len(batch_images)
+
+                    for index, prediction, output in zip(
+                        batch_indices, predictions, outputs
+                    ):
+                        write_queue.put((self.get_frame_name(index), prediction, output))
+                    if write_errors:
+                        raise write_errors[0]
+        finally:
+            write_queue.put(None)
+            writer.join()
+        if write_errors:
+            raise write_errors[0]
+
+        self.stats.wall_seconds = time.perf_counter() - wall_start
+        log.info(f"Pipeline throughput:\n{self.stats.summary()}")
+        return self.stats
@@ -0,0 +1,379 @@
+import os
+import time
+import uuid
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Tuple
+
+from tqdm import tqdm
+
+from pyscenekit.utils.common import log, read_json, write_json
+
+# task name -> function(dataset, options, state), see scene_task
+SCENE_TASKS: Dict[str, Callable] = {}
+
+# per process state of the scene workers, kept across scenes
+_WORKER_STATE = None
+
+
+def scene_task(name: str):
+    """
+    Register a function as a task of the scene job runner.
+
+    The function receives the ScanNetPPDataset set to the scene, the task
+    options and a dict that lives as long as the worker process, used to keep
+    models and renderers loaded between scenes.
+    """
+
+    def register(function: Callable):
+        SCENE_TASKS[name] = function
+        return function
+
+    return register
+
+
+@scene_task("extract_rgb")
+def extract_rgb(dataset, options: Dict, state: Dict):
+    dataset.iphone_dataset.extract_rgb(num_workers=options.get("task_workers", 1))
+
+
+@scene_task("extract_masks")
+def extract_masks(dataset, options: Dict, state: Dict):
+    dataset.iphone_dataset.extract_masks(num_workers=options.get("task_workers", 1))
+
+
+@scene_task("extract_depth")
+def extract_depth(dataset, options: Dict, state: Dict):
+    dataset.iphone_dataset.extract_depth(
+        num_workers=options.get("task_workers", 1),
+        output_format=options.get("depth_format", "png"),
+    )
+
+
+@scene_task("render_depth")
+def render_depth(dataset, options: Dict, state: Dict):
+    mesh_dataset = dataset.mesh_dataset
+    mesh_dataset.set_backend(options.get("backend", "pytorch3d"))
+    mesh_dataset.num_workers = options.get("task_workers", 1)
+    # the renderer holds the rasterizer and its worker processes, reuse it
+    renderer = state.get(("renderer", mesh_dataset.backend))
+    if renderer is None:
+        state[("renderer", mesh_dataset.backend)] = mesh_dataset.renderer
+    else:
+        mesh_dataset.set_renderer(renderer)
+
+    mesh_dataset.set_cameras(dataset.iphone_dataset.read_cameras())
+    mesh_dataset.export_all_depth(
+        output_dir=os.path.join(dataset.iphone_dataset.output_dir, "render_depth"),
+        target_resolution=options.get("target_resolution", 0),
+    )
+
+
+@scene_task("unproject")
+def unproject(dataset, options: Dict, state: Dict):
+    from pyscenekit.scenekit3d.geometry.unproject import (
+        RGBDUnprojector,
+        unproject_frames,
+    )
+
+    iphone_dataset = dataset.iphone_dataset
+    rgb_dir = os.path.join(iphone_dataset.output_dir, "rgb")
+    depth_dir = os.path.join(iphone_dataset.output_dir, "render_depth")
+    cameras = iphone_dataset.read_cameras()
+    names = [camera.name.split(".")[0] for camera in cameras]
+    # the unprojector caches the ray grids, keep it across scenes
+    unprojector = state.get("unprojector")
+    if unprojector is None:
+        unprojector = state["unprojector"] = RGBDUnprojector(
+            backend=options.get("unproject_backend", "numpy"),
+            chunk_size=options.get("unproject_chunk_size", 16),
+        )
+    unproject_frames(
+        [os.path.join(depth_dir, f"{name}.png") for name in names],
+        cameras,
+        [os.path.join(rgb_dir, f"{name}.jpg") for name in names],
+        output_dir=os.path.join(iphone_dataset.output_dir, "point_cloud"),
+        target_resolution=options.get("unproject_resolution", 640),
+        unprojector=unprojector,
+        num_workers=options.get("task_workers", 1),
+    )
+
+
+@scene_task("depth_to_normal")
+def depth_to_normal(dataset, options: Dict, state: Dict):
+    dataset.iphone_dataset.export_normals(
+        target_resolution=options.get("normal_resolution", 640),
+        rtol=options.get("normal_rtol", 0.05),
+    )
+
+
+@scene_task("fuse_tsdf")
+def fuse_tsdf(dataset, options: Dict, state: Dict):
+    from pyscenekit.scenekit3d.geometry.tsdf import TSDFVolume
+
+    iphone_dataset = dataset.iphone_dataset
+    rgb_dir = os.path.join(iphone_dataset.output_dir, "rgb")
+    depth_dir = os.path.join(iphone_dataset.output_dir, "render_depth")
+    cameras = iphone_dataset.read_cameras()
+    names = [camera.name.split(".")[0] for camera in cameras]
+    with TSDFVolume(
+        voxel_size=options.get("tsdf_voxel_size", 0.02),
+        depth_trunc=options.get("tsdf_depth_trunc", 5.0),
+        num_workers=options.get("task_workers", 1),
+    ) as volume:
+        volume.integrate_frames(
+            cameras,
+            [os.path.join(depth_dir, f"{name}.png") for name in names],
+            [os.path.join(rgb_dir, f"{name}.jpg") for name in names],
+            target_resolution=options.get("tsdf_resolution", 640),
+        )
+        volume.extract_mesh(
+            output_path=os.path.join(iphone_dataset.output_dir, "tsdf_mesh.ply")
+        )
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """
+    Parse "i/N" into (i, N), shard i of N with 0 <= i < N.
+    """
+    try:
+        index, count = (int(value) for value in shard.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {shard}")
+    if count <= 0 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in [0, {count}), got {shard}")
+    return index, count
+
+
+class SceneJobRecords:
+    """
+    Completion records of scene tasks, one json file per task and scene.
+
+    Separate files let workers on several nodes share a record directory
+    without locking, each file is written atomically.
+    """
+
+    def __init__(self, record_dir: str):
+        self.record_dir = record_dir
+
+    def path(self, task: str, scene_id: str) -> str:
+        return os.path.join(self.record_dir, task, f"{scene_id}.json")
+
+    def get(self, task: str, scene_id: str) -> Dict:
+        path = self.path(task, scene_id)
+        if not os.path.isfile(path):
+            return None
+        try:
+            return read_json(path)
+        except ValueError:
+            return None
+
+    def is_done(self, task: str, scene_id: str) -> bool:
+        record = self.get(task, scene_id)
+        return record is not None and record.get("status") == "done"
+
+    def write(self, task: str, scene_id: str, record: Dict):
+        path = self.path(task, scene_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        write_json(record, tmp_path, indent=2)
+        os.replace(tmp_path, path)
+
+
+def _init_scene_worker(data_dir: str, scenes_ids: List[str], options: Dict):
+    from pyscenekit.scenekit3d.datasets.scene_index import SceneIndex
+    from pyscenekit.scenekit3d.datasets.scannetpp.dataset import ScanNetPPDataset
+
+    # every worker opens its own connection, sqlite connections do not survive fork
+    index = SceneIndex(data_dir, "scannetpp") if options.get("use_index") else None
+    global _WORKER_STATE
+    _WORKER_STATE = {
+        "dataset": ScanNetPPDataset(data_dir, scenes_ids=scenes_ids, index=index),
+        "options": options,
+        "state": {},
+        "records": SceneJobRecords(options["record_dir"]),
+    }
+
+
+def _run_scene(scene_id: str, tasks: List[str]) -> Dict[str, Dict]:
+    worker = _WORKER_STATE
+    dataset, records = worker["dataset"], worker["records"]
+    results = {}
+    try:
+        dataset.set_scene_id(scene_id)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        return {task: {"status": "failed", "error": error} for task in tasks}
+
+    for i, task in enumerate(tasks):
+        start = time.time()
+        try:
+            SCENE_TASKS[task](dataset, worker["options"], worker["state"])
+        except Exception:
+            record = {"status": "failed", "error": traceback.format_exc()}
+        else:
+            record = {"status": "done"}
+        record.update(
+            scene_id=scene_id,
+            task=task,
+            pid=os.getpid(),
+            finished_at=time.time(),
+            seconds=time.time() - start,
+        )
+        records.write(task, scene_id, record)
+        results[task] = record
+        if record["status"] == "failed":
+            # later tasks usually consume the output of this one
+            for skipped in tasks[i + 1 :]:
+                results[skipped] = {"status": "skipped"}
+            break
+    return results
+
+
+class SceneJobRunner:
+    """
+    Run tasks such as extract_rgb or render_depth over many ScanNet++ scenes.
+
+    Scenes are split into shards with shard=(i, N), e.g. one shard per node,
+    and the scenes of a shard are processed by num_workers persistent worker
+    processes that keep models and renderers loaded across scenes. Every
+    finished task is recorded in record_dir, reruns skip recorded scenes unless
+    force is set, failed tasks are retried. With use_index the scenes are
+    listed and opened from the SceneIndex of data_dir, which is built for
+    missing scenes and refreshed for the processed ones.
+    """
+
+    def __init__(
+        self,
+        data_dir: str,
+        tasks: List[str],
+        scenes_ids: List[str] = None,
+        record_dir: str = None,
+        num_workers: int = 1,
+        shard: Tuple[int, int] = (0, 1),
+        force: bool = False,
+        use_index: bool = False,
+        **options,
+    ):
+        unknown = [task for task in tasks if task not in SCENE_TASKS]
+        if unknown:
+            raise ValueError(f"Unknown tasks {unknown}, expected {list(SCENE_TASKS)}")
+        if isinstance(shard, str):
+            shard = parse_shard(shard)
+
+        self.data_dir = data_dir
+        self.tasks = list(tasks)
+        self.record_dir = (
+            record_dir if record_dir is not None else os.path.join(data_dir, ".jobs")
+        )
+        self.records = SceneJobRecords(self.record_dir)
+        self.num_workers = num_workers
+        self.shard = shard
+        self.force = force
+        self.use_index = use_index
+        self.options = dict(options, record_dir=self.record_dir, use_index=use_index)
+
+        if use_index:
+            from pyscenekit.scenekit3d.datasets.scene_index import SceneIndex
+
+            with SceneIndex(data_dir, "scannetpp") as index:
+                index.build(scenes_ids)
+                if scenes_ids is None:
+                    scenes_ids = index.scenes()
+        elif scenes_ids is None:
+            from pyscenekit.scenekit3d.datasets.scannetpp.dataset import (
+                ScanNetPPDataset,
+            )
+
+            scenes_ids = ScanNetPPDataset(data_dir).scenes_ids
+        self.scenes_ids = list(scenes_ids)
+
+    @property
+    def shard_scenes_ids(self) -> List[str]:
+        index, count = self.shard
+        return self.scenes_ids[index::count]
+
+    def pending(self) -> Dict[str, List[str]]:
+        # scene -> tasks still to run, in the order given to the runner
+        pending = {}
+        for scene_id in self.shard_scenes_ids:
+            tasks = [
+                task
+                for task in self.tasks
+                if self.force or not self.records.is_done(task, scene_id)
+            ]
+            if tasks:
+                pending[scene_id] = tasks
+        return pending
+
+    def run(self) -> Dict[str, List[str]]:
+        """
+        Returns the scenes that finished all tasks, were already done, or failed.
+        """
+        pending = self.pending()
+        shard_scenes = self.shard_scenes_ids
+        summary = {
+            "done": [],
+            "skipped": [scene for scene in shard_scenes if scene not in pending],
+            "failed": [],
+        }
+        log.info(
+            f"Shard {self.shard[0]}/{self.shard[1]}: {len(pending)} of "
+            f"{len(shard_scenes)} scenes to process, {len(summary['skipped'])} done"
+        )
+        if not pending:
+            return summary
+
+        # workers only see the scenes they may be asked for
+        init_args = (self.data_dir, list(pending), self.options)
+        progress = tqdm(total=len(pending), desc="scenes")
+        if self.num_workers <= 1:
+            _init_scene_worker(*init_args)
+            results = (
+                (scene_id, _run_scene(scene_id, tasks))
+                for scene_id, tasks in pending.items()
+            )
+            self._collect(results, summary, progress)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                initializer=_init_scene_worker,
+                initargs=init_args,
+            ) as executor:
+                futures = {
+                    executor.submit(_run_scene, scene_id, tasks): scene_id
+                    for scene_id, tasks in pending.items()
+                }
+                results = (
+                    (futures[future], future.result())
+                    for future in as_completed(futures)
+                )
+                self._collect(results, summary, progress)
+        progress.close()
+
+        if self.use_index and summary["done"]:
+            from pyscenekit.scenekit3d.datasets.scene_index import SceneIndex
+
+            # tasks extract new frames, list them in the index
+            with SceneIndex(self.data_dir, "scannetpp") as index:
+                index.update_scenes(summary["done"])
+
+        log.info(
+            f"Finished {len(summary['done'])} scenes, {len(summary['failed'])} failed"
+        )
+        return summary
+
+    def _collect(self, results, summary: Dict[str, List[str]], progress: tqdm):
+        for scene_id, scene_results in results:
+            failed = [
+                task
+                for task, record in scene_results.items()
+                if record["status"] == "failed"
+            ]
+            if failed:
+                error = scene_results[failed[0]].get("error", "").strip()
+                log.error(f"Scene {scene_id} failed in {failed[0]}: {error}")
+                summary["failed"].append(scene_id)
+            else:
+                summary["done"].append(scene_id)
+            progress.update(1)
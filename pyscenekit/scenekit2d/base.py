@@ -1,20 +1,54 @@
 import abc
-from typing import Tuple
+from typing import Dict, List, Tuple
 
 import cv2
 import torch
 import numpy as np
 
+from pyscenekit.utils.registry import SharedModelMixin
 from pyscenekit.scenekit2d.utils import ImageInput
 from pyscenekit.scenekit2d.common import SceneKitImage
+from pyscenekit.scenekit2d.cache import PredictionCache, hash_values
 
 
-class BaseImageModel(abc.ABC):
+def tile_starts(length: int, tile: int, stride: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    # the last tile is aligned to the border so every pixel is covered
+    starts.append(length - tile)
+    return starts
+
+
+# separable weights that ramp up over the overlap so tiles blend without seams
+def feather_weights(height: int, width: int, overlap: int) -> np.ndarray:
+    def ramp(length):
+        distance = np.minimum(np.arange(length), np.arange(length)[::-1]) + 1
+        return np.minimum(distance / (overlap + 1), 1.0).astype(np.float32)
+
+    return ramp(height)[:, None] * ramp(width)[None, :]
+
+
+# least squares fit of pred * scale + shift to target on mask, as in Metric3D
+def align_scale_shift(
+    pred: np.ndarray, target: np.ndarray, mask: np.ndarray
+) -> Tuple[float, float]:
+    if np.sum(mask) <= 10:
+        return 1.0, 0.0
+    scale, shift = np.polyfit(pred[mask], target[mask], deg=1)
+    if scale < 0:
+        scale = np.median(target[mask]) / (np.median(pred[mask]) + 1e-8)
+        shift = 0.0
+    return float(scale), float(shift)
+
+
+class BaseImageModel(SharedModelMixin, abc.ABC):
     @abc.abstractmethod
     def __init__(self, model_name: str = None):
         self.model_path = model_name
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
+        self._registry_key = None
 
         # input and output are SceneKitImage objects
         self.input = None
@@ -27,6 +61,16 @@ class BaseImageModel(abc.ABC):
 
         self.resize_mode = cv2.INTER_LINEAR
 
+        # default number of images per forward pass in predict_batch
+        self.batch_size = 8
+
+        # relative predictions are only defined up to scale and shift, tiles
+        # of such models are aligned to each other in predict_tiled
+        self.relative_depth = False
+
+        # optional on-disk prediction cache, see enable_cache
+        self.cache = None
+
     @abc.abstractmethod
     def load_model(self):
         raise NotImplementedError
@@ -35,6 +79,34 @@ class BaseImageModel(abc.ABC):
     def _predict(self, image: np.ndarray, **kwargs) -> np.ndarray:
         raise NotImplementedError
 
+    def enable_cache(self, cache_dir: str, max_size_gb: float = 10.0):
+        self.cache = PredictionCache(cache_dir, int(max_size_gb * 1024**3))
+        return self.cache
+
+    def disable_cache(self):
+        self.cache = None
+
+    def cache_key(
+        self,
+        image: np.ndarray,
+        resolution: Tuple[int, int],
+        resize_to_input: bool,
+        **kwargs,
+    ) -> str:
+        resolution = resolution if resolution is not None else self.resolution_pred
+        return hash_values(
+            self.model_signature(),
+            None if resolution is None else tuple(resolution),
+            resize_to_input,
+            kwargs,
+            image,
+        )
+
+    # images in a batch share the same shape, subclasses override this to run
+    # a single forward pass over the stacked batch
+    def _predict_batch(self, images: List[np.ndarray], **kwargs) -> List[Dict]:
+        return [self._predict(image, **kwargs) for image in images]
+
     @torch.no_grad()
     def __call__(
         self,
@@ -43,21 +115,188 @@ class BaseImageModel(abc.ABC):
         resize_to_input: bool = True,
         **kwargs,
     ):
+        if isinstance(image, list):
+            return self.predict_batch(
+                image, resolution=resolution, resize_to_input=resize_to_input, **kwargs
+            )
+
+        self.input = SceneKitImage(image)
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache_key(
+                self.input.image, resolution, resize_to_input, **kwargs
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        self.ensure_model_loaded()
+        input_image = self._prepare_input(self.input.image, resolution)
+        output = self._predict(input_image, **kwargs)
+        output_depth = self._prepare_output(output["depth"], resize_to_input)
+
+        if cache_key is not None:
+            self.cache.put(cache_key, output_depth, output)
+        return output_depth, output
+
+    @torch.no_grad()
+    def predict_batch(
+        self,
+        images: ImageInput,
+        batch_size: int = None,
+        resolution: Tuple[int, int] = None,
+        resize_to_input: bool = True,
+        **kwargs,
+    ):
+        batch_size = batch_size if batch_size is not None else self.batch_size
+        assert batch_size > 0, "batch_size must be positive"
+
+        depth_list = []
+        output_list = []
+        for start in range(0, len(images), batch_size):
+            batch_images = [
+                SceneKitImage(image).image
+                for image in images[start : start + batch_size]
+            ]
+            batch_results = [None] * len(batch_images)
+
+            cache_keys = [None] * len(batch_images)
+            if self.cache is not None:
+                for i, image in enumerate(batch_images):
+                    cache_keys[i] = self.cache_key(
+                        image, resolution, resize_to_input, **kwargs
+                    )
+                    batch_results[i] = self.cache.get(cache_keys[i])
+
+            missing = [i for i, result in enumerate(batch_results) if result is None]
+            if missing:
+                self.ensure_model_loaded()
+            input_resolutions = {i: batch_images[i].shape[:2] for i in missing}
+            input_images = {
+                i: self._prepare_input(batch_images[i], resolution) for i in missing
+            }
+
+            # group images by shape so each group can be stacked into one tensor
+            shape_groups = {}
+            for i in missing:
+                shape_groups.setdefault(input_images[i].shape, []).append(i)
+            for indices in shape_groups.values():
+                group_outputs = self._predict_batch(
+                    [input_images[i] for i in indices], **kwargs
+                )
+                for i, output in zip(indices, group_outputs):
+                    self.resolution_input = input_resolutions[i]
+                    output_depth = self._prepare_output(
+                        output["depth"], resize_to_input
+                    )
+                    batch_results[i] = (output_depth, output)
+                    if cache_keys[i] is not None:
+                        self.cache.put(cache_keys[i], output_depth, output)
+
+            for output_depth, output in batch_results:
+                depth_list.append(output_depth)
+                output_list.append(output)
+
+        return depth_list, output_list
+
+    @torch.no_grad()
+    def predict_tiled(
+        self,
+        image: ImageInput,
+        tile_size: Tuple[int, int] = (512, 512),
+        overlap: int = 64,
+        batch_size: int = None,
+        align: bool = None,
+        **kwargs,
+    ):
+        """
+        Predict a large image as overlapping tiles of tile_size (height, width).
+
+        Tiles are batched through _predict_batch and blended with feathered
+        weights, so model memory depends on the tile size only. When align is
+        set (default: relative_depth), every tile is fitted with a scale and
+        shift to the blended prediction of the tiles before it.
+        """
+        batch_size = batch_size if batch_size is not None else self.batch_size
+        align = align if align is not None else self.relative_depth
+
         self.input = SceneKitImage(image)
+        image = self.input.image
+        height, width = image.shape[:2]
+        tile_h, tile_w = min(tile_size[0], height), min(tile_size[1], width)
+        overlap = max(0, min(overlap, tile_h - 1, tile_w - 1))
 
-        input_image = self.input.image
-        self.resolution_input = input_image.shape[:2]
+        boxes = [
+            (y, x)
+            for y in tile_starts(height, tile_h, tile_h - overlap)
+            for x in tile_starts(width, tile_w, tile_w - overlap)
+        ]
+        weights = feather_weights(tile_h, tile_w, overlap)
+
+        self.ensure_model_loaded()
+        accumulated = None
+        weight_sum = np.zeros((height, width), dtype=np.float32)
+        scales, shifts = [], []
+        for start in range(0, len(boxes), batch_size):
+            batch_boxes = boxes[start : start + batch_size]
+            tiles = [image[y : y + tile_h, x : x + tile_w] for y, x in batch_boxes]
+            outputs = self._predict_batch(tiles, **kwargs)
+
+            for (y, x), output in zip(batch_boxes, outputs):
+                tile_pred = np.asarray(output["depth"], dtype=np.float32)
+                if tile_pred.shape[:2] != (tile_h, tile_w):
+                    tile_pred = self.resize(
+                        tile_pred, (tile_h, tile_w), self.resize_mode
+                    )
+                if accumulated is None:
+                    accumulated = np.zeros(
+                        (height, width) + tile_pred.shape[2:], dtype=np.float32
+                    )
+
+                region = (slice(y, y + tile_h), slice(x, x + tile_w))
+                scale, shift = 1.0, 0.0
+                if align and tile_pred.ndim == 2:
+                    covered = weight_sum[region] > 0
+                    if covered.any():
+                        blended = accumulated[region] / np.maximum(
+                            weight_sum[region], 1e-8
+                        )
+                        scale, shift = align_scale_shift(tile_pred, blended, covered)
+                        tile_pred = tile_pred * scale + shift
+                scales.append(scale)
+                shifts.append(shift)
+
+                tile_weights = weights if tile_pred.ndim == 2 else weights[..., None]
+                accumulated[region] += tile_pred * tile_weights
+                weight_sum[region] += weights
+
+        if accumulated.ndim == 3:
+            weight_sum = weight_sum[..., None]
+        prediction = accumulated / np.maximum(weight_sum, 1e-8)
+        output = {
+            "depth": prediction,
+            "tile_boxes": [(y, x, tile_h, tile_w) for y, x in boxes],
+            "tile_scales": scales,
+            "tile_shifts": shifts,
+        }
+        return prediction, output
+
+    def _prepare_input(
+        self, image: np.ndarray, resolution: Tuple[int, int] = None
+    ) -> np.ndarray:
+        self.resolution_input = image.shape[:2]
         if resolution is not None:
             self.resolution_pred = resolution
 
         if self.resolution_pred is not None:
-            input_image = self.resize(
-                input_image, self.resolution_pred, cv2.INTER_LANCZOS4
-            )
+            image = self.resize(image, self.resolution_pred, cv2.INTER_LANCZOS4)
             self.resolution_output = self.resolution_pred
+        return image
 
-        output = self._predict(input_image, **kwargs)
-        output_depth = output["depth"]
+    def _prepare_output(
+        self, output_depth: np.ndarray, resize_to_input: bool = True
+    ) -> np.ndarray:
         if resize_to_input:
             self.resolution_output = self.resolution_input
 
@@ -65,8 +304,7 @@ class BaseImageModel(abc.ABC):
             output_depth = self.resize(
                 output_depth, self.resolution_output, self.resize_mode
             )
-
-        return output_depth, output
+        return output_depth
 
     # resize image to the given resolution
     def resize(
@@ -79,6 +317,11 @@ class BaseImageModel(abc.ABC):
         image = cv2.resize(image, (w, h), interpolation=resize_mode)
         return image
 
-    @abc.abstractmethod
-    def to(self, device: str):
-        raise NotImplementedError
+    # load the weights ahead of time, optionally running one prediction on image
+    @torch.no_grad()
+    def warmup(self, image: ImageInput = None):
+        self.ensure_model_loaded()
+        if image is not None:
+            input_image = self._prepare_input(SceneKitImage(image).image)
+            self._predict(input_image)
+        return self
@@ -0,0 +1,178 @@
+import os
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from pyscenekit.utils.common import log
+
+# keys used inside the npz file, prediction entries are stored under "output/<key>"
+_DEPTH_KEY = "__prediction__"
+_OUTPUT_KEY = "__output__"
+_OUTPUT_PREFIX = "output/"
+
+
+def _update_hash(hasher, value: Any):
+    if isinstance(value, np.ndarray):
+        value = np.ascontiguousarray(value)
+        hasher.update(f"ndarray{value.shape}{value.dtype.str}".encode())
+        hasher.update(value.data)
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            hasher.update(repr(key).encode())
+            _update_hash(hasher, value[key])
+    elif isinstance(value, (list, tuple)):
+        hasher.update(f"{type(value).__name__}{len(value)}".encode())
+        for item in value:
+            _update_hash(hasher, item)
+    else:
+        hasher.update(repr(value).encode())
+
+
+def hash_values(*values) -> str:
+    hasher = hashlib.sha1()
+    for value in values:
+        _update_hash(hasher, value)
+    return hasher.hexdigest()
+
+
+class PredictionCache:
+    """
+    Content-addressed on-disk cache for image model predictions.
+
+    Each prediction is stored as an uncompressed npz file named after the hash
+    of the input image and the model settings. Least recently used entries are
+    evicted once the cache grows beyond max_size_bytes.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int = 10 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # entries ordered from least to most recently used, by file mtime
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(".npz"):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, filename))
+            entries.append((stat.st_mtime_ns, filename[:-4], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self.size_bytes = sum(self._entries.values())
+        self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str):
+        return key in self._entries
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key: str) -> Tuple[np.ndarray, Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            try:
+                with np.load(self.path(key)) as data:
+                    result = self._unpack(data)
+                os.utime(self.path(key))
+            except (OSError, ValueError, KeyError) as e:
+                log.warning(f"Dropping unreadable cache entry {key}: {e}")
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: str, prediction: np.ndarray, output: Any):
+        arrays = self._pack(prediction, output)
+        if arrays is None:
+            return
+
+        # write to a temporary file first so readers never see a partial entry
+        tmp_path = os.path.join(self.cache_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            os.replace(tmp_path, self.path(key))
+            if key in self._entries:
+                self.size_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self.size_bytes += size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+        }
+
+    def _evict(self):
+        while self.size_bytes > self.max_size_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+
+    def _remove(self, key: str):
+        self.size_bytes -= self._entries.pop(key, 0)
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _to_array(value: Any) -> np.ndarray:
+        if hasattr(value, "detach"):
+            value = value.detach().cpu().numpy()
+        value = np.asarray(value)
+        if value.dtype == object:
+            raise TypeError(f"Cannot cache values of type {type(value)}")
+        return value
+
+    def _pack(self, prediction: np.ndarray, output: Any) -> Dict[str, np.ndarray]:
+        try:
+            arrays = {_DEPTH_KEY: self._to_array(prediction)}
+            if isinstance(output, dict):
+                for key, value in output.items():
+                    arrays[_OUTPUT_PREFIX + key] = self._to_array(value)
+            else:
+                arrays[_OUTPUT_KEY] = self._to_array(output)
+        except TypeError as e:
+            log.warning(f"Prediction not cached: {e}")
+            return None
+        return arrays
+
+    @staticmethod
+    def _unpack(data) -> Tuple[np.ndarray, Any]:
+        prediction = data[_DEPTH_KEY]
+        if _OUTPUT_KEY in data.files:
+            return prediction, data[_OUTPUT_KEY]
+
+        output = {}
+        for name in data.files:
+            if name.startswith(_OUTPUT_PREFIX):
+                value = data[name]
+                # scalars such as focal lengths come back as python numbers
+                output[name[len(_OUTPUT_PREFIX) :]] = (
+                    value.item() if value.ndim == 0 else value
+                )
+        return prediction, output
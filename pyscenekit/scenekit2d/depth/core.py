@@ -1,10 +1,22 @@
 from enum import Enum
 
-from pyscenekit.scenekit2d.depth.midas import MidasDepthEstimation
-from pyscenekit.scenekit2d.depth.depth_pro import DepthProDepthEstimation
-from pyscenekit.scenekit2d.depth.depth_anything_v2 import DepthAnythingV2DepthEstimation
-from pyscenekit.scenekit2d.depth.lotus import LotusDepthEstimation
-from pyscenekit.scenekit2d.depth.metric3d import Metric3DDepthEstimation
+from pyscenekit.utils.lazy import lazy_attributes
+
+# backends are imported when their method is selected, each of them pulls in
+# heavy dependencies such as transformers, diffusers or mmengine
+_import_backend = lazy_attributes(
+    __name__,
+    {
+        "MidasDepthEstimation": "pyscenekit.scenekit2d.depth.midas",
+        "DepthProDepthEstimation": "pyscenekit.scenekit2d.depth.depth_pro",
+        "DepthAnythingV2DepthEstimation": (
+            "pyscenekit.scenekit2d.depth.depth_anything_v2"
+        ),
+        "LotusDepthEstimation": "pyscenekit.scenekit2d.depth.lotus",
+        "Metric3DDepthEstimation": "pyscenekit.scenekit2d.depth.metric3d",
+    },
+)
+__getattr__ = _import_backend
 
 
 class DepthEstimationMethod(Enum):
@@ -21,16 +33,16 @@ class DepthEstimationModel:
             method = DepthEstimationMethod[method.upper()]
 
         if method == DepthEstimationMethod.MIDAS:
-            return MidasDepthEstimation(model_path)
+            return _import_backend("MidasDepthEstimation")(model_path)
         elif method == DepthEstimationMethod.DEPTH_ANYTHING_V2:
-            return DepthAnythingV2DepthEstimation(model_path)
+            return _import_backend("DepthAnythingV2DepthEstimation")(model_path)
         elif method == DepthEstimationMethod.DEPTH_PRO:
-            return DepthProDepthEstimation(model_path)
+            return _import_backend("DepthProDepthEstimation")(model_path)
         elif method == DepthEstimationMethod.LOTUS_DEPTH:
-            return LotusDepthEstimation(model_path)
+            return _import_backend("LotusDepthEstimation")(model_path)
         elif method == DepthEstimationMethod.METRIC3D:
             model_type = kwargs.get("model_type", "large")
-            return Metric3DDepthEstimation(model_path, model_type)
+            return _import_backend("Metric3DDepthEstimation")(model_path, model_type)
         else:
             raise NotImplementedError(
                 f"Depth estimation method {method} not implemented"
@@ -1,5 +1,6 @@
 import torch
 import numpy as np
+from typing import List
 from transformers import AutoImageProcessor, AutoModelForDepthEstimation
 
 from pyscenekit.scenekit2d.depth.base import BaseDepthEstimation
@@ -21,13 +22,15 @@ class DepthAnythingV2DepthEstimation(BaseDepthEstimation):
     }
     """
 
+    model_attributes = ("model", "image_processor")
+
     def __init__(self, model_path: str = None):
         super().__init__(model_path)
+        self.relative_depth = True
         if self.model_path is None:
             self.model_path = "depth-anything/Depth-Anything-V2-Large"
 
         self.image_processor = None
-        self.load_model()
 
     def load_model(self):
         self.image_processor = AutoImageProcessor.from_pretrained(self.model_path)
@@ -46,6 +49,16 @@ class DepthAnythingV2DepthEstimation(BaseDepthEstimation):
         depth = depth.detach().cpu().numpy()
         return {"depth": depth}
 
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
+    @torch.no_grad()
+    def _predict_batch(self, images: List[np.ndarray]) -> List[dict]:
+        self.to(self.device)
+        inputs = self.image_processor(images=images, return_tensors="pt")
+        inputs["pixel_values"] = inputs["pixel_values"].to(self.device)
+        outputs = self.model(**inputs)
+        post_processed_output = self.image_processor.post_process_depth_estimation(
+            outputs
+        )
+        return [
+            {"depth": output["predicted_depth"].detach().cpu().numpy()}
+            for output in post_processed_output
+        ]
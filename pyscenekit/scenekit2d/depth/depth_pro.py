@@ -1,5 +1,6 @@
 import torch
 import numpy as np
+from typing import List
 import huggingface_hub
 
 from pyscenekit.scenekit2d.depth.base import BaseDepthEstimation
@@ -29,20 +30,21 @@ class DepthProDepthEstimation(BaseDepthEstimation):
     }
     """
 
+    model_attributes = ("model", "image_processor")
+
     def __init__(self, model_path: str = None):
         super().__init__(model_path)
-        if self.model_path is None:
-            self.model_path = huggingface_hub.hf_hub_download(
-                "apple/DepthPro", filename="depth_pro.pt"
-            )
-
         self.default_config = DEFAULT_MONODEPTH_CONFIG_DICT
-        self.default_config.checkpoint_uri = self.model_path
-
         self.image_processor = None
-        self.load_model()
 
     def load_model(self):
+        # the default checkpoint is downloaded on first load, not at construction
+        checkpoint_path = self.model_path
+        if checkpoint_path is None:
+            checkpoint_path = huggingface_hub.hf_hub_download(
+                "apple/DepthPro", filename="depth_pro.pt"
+            )
+        self.default_config.checkpoint_uri = checkpoint_path
         self.model, self.image_processor = create_model_and_transforms(
             self.default_config, device=self.device
         )
@@ -58,6 +60,16 @@ class DepthProDepthEstimation(BaseDepthEstimation):
         depth = depth.detach().cpu().numpy()
         return {"depth": depth, "focallength_px": focallength_px}
 
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
+    @torch.no_grad()
+    def _predict_batch(self, images: List[np.ndarray]) -> List[dict]:
+        self.to(self.device)
+        batch = torch.stack([self.image_processor(image) for image in images])
+        prediction = self.model.infer(batch, f_px=None)
+        # infer squeezes the batch dimension away when there is a single image
+        depth = prediction["depth"].reshape(len(images), *batch.shape[-2:])
+        depth = depth.detach().cpu().numpy()
+        focallength_px = prediction["focallength_px"].reshape(-1)
+        return [
+            {"depth": depth_i, "focallength_px": focallength_px_i}
+            for depth_i, focallength_px_i in zip(depth, focallength_px)
+        ]
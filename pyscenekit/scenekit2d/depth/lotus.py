@@ -1,5 +1,6 @@
 import torch
 import numpy as np
+from typing import List
 from contextlib import nullcontext
 
 from pyscenekit.scenekit2d.depth.base import BaseDepthEstimation
@@ -26,13 +27,13 @@ class LotusDepthEstimation(BaseDepthEstimation):
 
     def __init__(self, model_path: str = None):
         super().__init__(model_path)
+        self.relative_depth = True
         if self.model_path is None:
             self.model_path = "jingheya/lotus-depth-g-v1-0"
 
         self.weight_dtype = torch.float16
 
         self.image_processor = None
-        self.load_model()
 
         self.seed = -1
         self.generator = None
@@ -84,6 +85,33 @@ class LotusDepthEstimation(BaseDepthEstimation):
             depth = pred.mean(axis=-1)
         return {"depth": depth}
 
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
+    @torch.no_grad()
+    def _predict_batch(self, images: List[np.ndarray]) -> List[dict]:
+        self.to(self.device)
+        if torch.backends.mps.is_available():
+            autocast_ctx = nullcontext()
+        else:
+            autocast_ctx = torch.autocast(self.model.device.type)
+        with autocast_ctx:
+            batch = np.stack(images).astype(np.float32)
+            batch = torch.from_numpy(batch).permute(0, 3, 1, 2)
+            batch = batch / 127.5 - 1.0
+            batch = batch.to(self.device)
+
+            task_emb = torch.tensor([1, 0]).float().unsqueeze(0).to(self.device)
+            task_emb = torch.cat(
+                [torch.sin(task_emb), torch.cos(task_emb)], dim=-1
+            ).repeat(len(images), 1)
+
+            pred = self.model(
+                rgb_in=batch,
+                prompt=[""] * len(images),
+                num_inference_steps=1,
+                generator=self.generator,
+                output_type="np",
+                timesteps=[self.timestep],
+                task_emb=task_emb,
+            ).images
+
+            depth = pred.mean(axis=-1)
+        return [{"depth": depth_i} for depth_i in depth]
@@ -1,5 +1,6 @@
 import torch
 import numpy as np
+from typing import List
 import huggingface_hub
 
 from pyscenekit.scenekit2d.depth.base import BaseDepthEstimation
@@ -38,29 +39,30 @@ class Metric3DDepthEstimation(BaseDepthEstimation):
 
     def __init__(self, model_path: str = None, model_type: str = "large"):
         super().__init__(model_path)
-        if self.model_path is None:
-            if model_type == "large":
-                self.model_path = huggingface_hub.hf_hub_download(
-                    "JUGGHM/Metric3D", filename="metric_depth_vit_large_800k.pth"
-                )
-            elif model_type == "giant":
-                self.model_path = huggingface_hub.hf_hub_download(
-                    "JUGGHM/Metric3D", filename="metric_depth_vit_giant2_800k.pth"
-                )
-            else:
-                raise ValueError(f"Invalid model type: {model_type}")
+        if model_type not in ("large", "giant"):
+            raise ValueError(f"Invalid model type: {model_type}")
+        self.model_type = model_type
 
-        self.load_model(model_type)
+    def model_signature(self):
+        return super().model_signature() + (self.model_type,)
 
-    def load_model(self, model_type: str):
-        if model_type == "large":
+    def load_model(self):
+        # the default checkpoint is downloaded on first load, not at construction
+        checkpoint_path = self.model_path
+        if self.model_type == "large":
             config_path = "configs/decoder/vit.raft5.large.py"
-        elif model_type == "giant":
-            config_path = "configs/decoder/vit.raft5.giant2.py"
+            if checkpoint_path is None:
+                checkpoint_path = huggingface_hub.hf_hub_download(
+                    "JUGGHM/Metric3D", filename="metric_depth_vit_large_800k.pth"
+                )
         else:
-            raise ValueError(f"Invalid model type: {model_type}")
+            config_path = "configs/decoder/vit.raft5.giant2.py"
+            if checkpoint_path is None:
+                checkpoint_path = huggingface_hub.hf_hub_download(
+                    "JUGGHM/Metric3D", filename="metric_depth_vit_giant2_800k.pth"
+                )
         self.model = Metric3D(config_path)
-        self.model.load_ckpt(self.model_path)
+        self.model.load_ckpt(checkpoint_path)
 
     @torch.no_grad()
     def _predict(
@@ -72,20 +74,42 @@ class Metric3DDepthEstimation(BaseDepthEstimation):
         cy: float = None,
     ):
         self.to(self.device)
+        intrinsic = self.get_intrinsic(image, fx, fy, cx, cy)
+        depth, normal = self.model.inference(image, intrinsic=intrinsic)
+        return {"depth": depth, "normal": normal}
+
+    @torch.no_grad()
+    def _predict_batch(
+        self,
+        images: List[np.ndarray],
+        fx: float = None,
+        fy: float = None,
+        cx: float = None,
+        cy: float = None,
+    ) -> List[dict]:
+        self.to(self.device)
+        intrinsics = [self.get_intrinsic(image, fx, fy, cx, cy) for image in images]
+        depth, normal = self.model.inference_batch(images, intrinsics)
+        return [
+            {"depth": depth_i, "normal": normal_i}
+            for depth_i, normal_i in zip(depth, normal)
+        ]
+
+    @staticmethod
+    def get_intrinsic(
+        image: np.ndarray,
+        fx: float = None,
+        fy: float = None,
+        cx: float = None,
+        cy: float = None,
+    ) -> List[float]:
         if fx is None or fy is None or cx is None or cy is None:
             fov = np.pi / 3
             focal_length = image.shape[1] / (2 * np.tan(fov / 2))
-            intrinsic = [
+            return [
                 focal_length,
                 focal_length,
                 image.shape[1] / 2,
                 image.shape[0] / 2,
             ]
-        else:
-            intrinsic = [fx, fy, cx, cy]
-        depth, normal = self.model.inference(image, intrinsic=intrinsic)
-        return {"depth": depth, "normal": normal}
-
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
+        return [fx, fy, cx, cy]
@@ -1,5 +1,6 @@
 import torch
 import numpy as np
+from typing import List
 from transformers import DPTImageProcessor
 from transformers import DPTForDepthEstimation
 
@@ -30,13 +31,15 @@ class MidasDepthEstimation(BaseDepthEstimation):
     }
     """
 
+    model_attributes = ("model", "image_processor")
+
     def __init__(self, model_path: str = None):
         super().__init__(model_path)
+        self.relative_depth = True
         if self.model_path is None:
             self.model_path = "Intel/dpt-hybrid-midas"
 
         self.image_processor = None
-        self.load_model()
 
     def load_model(self):
         self.image_processor = DPTImageProcessor.from_pretrained(self.model_path)
@@ -52,6 +55,11 @@ class MidasDepthEstimation(BaseDepthEstimation):
         depth = depth.squeeze().cpu().numpy()
         return {"depth": depth}
 
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
+    @torch.no_grad()
+    def _predict_batch(self, images: List[np.ndarray]) -> List[dict]:
+        self.to(self.device)
+        inputs = self.image_processor(images=images, return_tensors="pt")
+        inputs["pixel_values"] = inputs["pixel_values"].to(self.device)
+        outputs = self.model(**inputs)
+        depth = outputs.predicted_depth.cpu().numpy()
+        return [{"depth": depth_i} for depth_i in depth]
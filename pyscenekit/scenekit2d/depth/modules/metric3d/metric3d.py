@@ -8,6 +8,7 @@ from pyscenekit.scenekit2d.depth.modules.metric3d.models.monodepth_model import
 from pyscenekit.scenekit2d.depth.modules.metric3d.utils.running import load_ckpt
 from pyscenekit.scenekit2d.depth.modules.metric3d.utils.do_test import (
     do_scalecano_test_with_custom_data,
+    do_scalecano_test_with_custom_data_batch,
 )
 
 
@@ -28,10 +29,21 @@ class Metric3D:
         self.model.to(device)
 
     def inference(self, rgb, intrinsic=None):
+        device = next(self.model.parameters()).device
         depth, normal = do_scalecano_test_with_custom_data(
-            self.model, self.cfg, rgb, intrinsic
+            self.model, self.cfg, rgb, intrinsic, device
         )
 
         n_img_l2 = np.sqrt(np.sum(normal**2, axis=2, keepdims=True))
         n_img_norm = -normal / (n_img_l2 + 1e-8)
         return depth, n_img_norm
+
+    def inference_batch(self, rgbs, intrinsics):
+        device = next(self.model.parameters()).device
+        depth, normal = do_scalecano_test_with_custom_data_batch(
+            self.model, self.cfg, rgbs, intrinsics, device
+        )
+
+        n_img_l2 = np.sqrt(np.sum(normal**2, axis=-1, keepdims=True))
+        n_img_norm = -normal / (n_img_l2 + 1e-8)
+        return depth, n_img_norm
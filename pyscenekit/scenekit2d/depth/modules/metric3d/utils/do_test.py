@@ -171,13 +171,14 @@ def get_prediction(
     return pred_depth, output_dict
 
 
-def transform_test_data_scalecano(rgb, intrinsic, data_basic):
+def transform_test_data_scalecano(rgb, intrinsic, data_basic, device="cuda"):
     """
     Pre-process the input for forwarding. Employ `label scale canonical transformation.'
         Args:
             rgb: input rgb image. [H, W, 3]
             intrinsic: camera intrinsic parameter, [fx, fy, u0, v0]
             data_basic: predefined canonical space in configs.
+            device: device the network inputs are moved to.
     """
     canonical_space = data_basic["canonical_space"]
     forward_size = data_basic.crop_size
@@ -210,10 +211,10 @@ def transform_test_data_scalecano(rgb, intrinsic, data_basic):
 
     rgb = torch.from_numpy(rgb.transpose((2, 0, 1))).float()
     rgb = torch.div((rgb - mean), std)
-    rgb = rgb[None, :, :, :].cuda()
+    rgb = rgb[None, :, :, :].to(device)
 
     cam_model = torch.from_numpy(cam_model.transpose((2, 0, 1))).float()
-    cam_model = cam_model[None, :, :, :].cuda()
+    cam_model = cam_model[None, :, :, :].to(device)
     cam_model_stacks = [
         torch.nn.functional.interpolate(
             cam_model,
@@ -231,6 +232,7 @@ def do_scalecano_test_with_custom_data(
     cfg: dict,
     rgb: np.array,
     intrinsic: list = None,
+    device="cuda",
 ):
     normalize_scale = cfg.data_basic.depth_range[1]
 
@@ -255,7 +257,7 @@ def do_scalecano_test_with_custom_data(
         intrinsic[2] *= scale
         intrinsic[3] *= scale
     rgb_input, cam_models_stacks, pad, label_scale_factor = (
-        transform_test_data_scalecano(rgb_origin, intrinsic, cfg.data_basic)
+        transform_test_data_scalecano(rgb_origin, intrinsic, cfg.data_basic, device)
     )
 
     pred_depth, output = get_prediction(
@@ -281,3 +283,63 @@ def do_scalecano_test_with_custom_data(
     pred_normal = pred_normal.squeeze().permute(1, 2, 0).detach().cpu().numpy()
 
     return pred_depth, pred_normal
+
+
+def do_scalecano_test_with_custom_data_batch(
+    model: torch.nn.Module,
+    cfg: dict,
+    rgbs: list,
+    intrinsics: list,
+    device="cuda",
+):
+    """
+    Batched version of do_scalecano_test_with_custom_data, all rgb images must share the same shape.
+        Args:
+            rgbs: list of input rgb images. [H, W, 3]
+            intrinsics: list of camera intrinsic parameters, [fx, fy, u0, v0]
+    """
+    normalize_scale = cfg.data_basic.depth_range[1]
+
+    rgb_inputs = []
+    cam_models = []
+    label_scale_factors = []
+    for rgb, intrinsic in zip(rgbs, intrinsics):
+        intrinsic = list(intrinsic)
+        rgb_origin = rgb
+        # fractional scale image to 1024
+        max_side = 1024
+        if max(rgb_origin.shape[:2]) > max_side:
+            scale = max_side / max(rgb_origin.shape[:2])
+            rgb_origin = cv2.resize(rgb_origin, (0, 0), fx=scale, fy=scale)
+            intrinsic = [value * scale for value in intrinsic]
+        rgb_input, cam_models_stacks, pad, label_scale_factor = (
+            transform_test_data_scalecano(rgb_origin, intrinsic, cfg.data_basic, device)
+        )
+        rgb_inputs.append(rgb_input)
+        cam_models.append(cam_models_stacks)
+        label_scale_factors.append(label_scale_factor)
+    ori_shape = [rgb_origin.shape[0], rgb_origin.shape[1]]
+
+    data = dict(
+        input=torch.cat(rgb_inputs),
+        cam_model=[torch.cat(level) for level in zip(*cam_models)],
+    )
+    pred_depth, confidence, output = model.inference(data)
+    pred_depth = pred_depth * (confidence > 0)
+    H, W = pred_depth.shape[2:]
+    pred_depth = pred_depth[:, :, pad[0] : H - pad[1], pad[2] : W - pad[3]]
+    pred_depth = torch.nn.functional.interpolate(pred_depth, ori_shape, mode="nearest")
+    scale_info = torch.tensor(label_scale_factors, device=pred_depth.device)
+    pred_depth = pred_depth[:, 0] * normalize_scale / scale_info[:, None, None]
+
+    pred_depth = (pred_depth > 0) * (pred_depth < 300) * pred_depth
+    pred_depth = pred_depth.detach().cpu().numpy()
+
+    normal_out_list = output["normal_out_list"]
+    pred_normal = normal_out_list[0][:, :3, :, :]  # (B, 3, H, W)
+    H, W = pred_normal.shape[2:]
+    pred_normal = pred_normal[:, :, pad[0] : H - pad[1], pad[2] : W - pad[3]]
+    pred_normal = torch.nn.functional.interpolate(pred_normal, ori_shape, mode="bilinear")
+    pred_normal = pred_normal.permute(0, 2, 3, 1).detach().cpu().numpy()
+
+    return pred_depth, pred_normal
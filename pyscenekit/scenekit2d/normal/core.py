@@ -1,7 +1,16 @@
 from enum import Enum
 
-from pyscenekit.scenekit2d.normal.dsine import DsineNormalEstimation
-from pyscenekit.scenekit2d.normal.lotus import LotusNormalEstimation
+from pyscenekit.utils.lazy import lazy_attributes
+
+# backends are imported when their method is selected
+_import_backend = lazy_attributes(
+    __name__,
+    {
+        "DsineNormalEstimation": "pyscenekit.scenekit2d.normal.dsine",
+        "LotusNormalEstimation": "pyscenekit.scenekit2d.normal.lotus",
+    },
+)
+__getattr__ = _import_backend
 
 
 class NormalEstimationMethod(Enum):
@@ -16,9 +25,11 @@ class NormalEstimationModel:
 
         if method == NormalEstimationMethod.DSINE:
             efficientnet_path = kwargs.get("efficientnet_path", None)
-            return DsineNormalEstimation(model_path, efficientnet_path)
+            return _import_backend("DsineNormalEstimation")(
+                model_path, efficientnet_path
+            )
         elif method == NormalEstimationMethod.LOTUS_NORMAL:
-            return LotusNormalEstimation(model_path)
+            return _import_backend("LotusNormalEstimation")(model_path)
         else:
             raise NotImplementedError(
                 f"Normal estimation method {method} not implemented"
@@ -26,28 +26,32 @@ class DsineNormalEstimation(BaseNormalEstimation):
 
     def __init__(self, model_path: str = None, efficientnet_path: str = None):
         super().__init__(model_path)
-        if self.model_path is None:
-            self.model_path = huggingface_hub.hf_hub_download(
-                "ysmao/pyscenekit", subfolder="dsine", filename="dsine.pt"
-            )
         self.efficientnet_path = efficientnet_path
-        if self.efficientnet_path is None:
-            self.efficientnet_path = huggingface_hub.hf_hub_download(
-                "ysmao/pyscenekit",
-                subfolder="dsine",
-                filename="tf_efficientnet_b5_ap-9e82fae8.pth",
-            )
-
-        self.load_model()
 
         self.t_normalize = transforms.Normalize(
             mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]
         )
         self.intrinsics = None
 
+    def model_signature(self):
+        return super().model_signature() + (self.efficientnet_path,)
+
     def load_model(self):
-        self.model = DSINE(self.efficientnet_path)
-        self.model = dsine_utils.load_checkpoint(self.model_path, self.model)
+        # the default weights are downloaded on first load, not at construction
+        model_path = self.model_path
+        if model_path is None:
+            model_path = huggingface_hub.hf_hub_download(
+                "ysmao/pyscenekit", subfolder="dsine", filename="dsine.pt"
+            )
+        efficientnet_path = self.efficientnet_path
+        if efficientnet_path is None:
+            efficientnet_path = huggingface_hub.hf_hub_download(
+                "ysmao/pyscenekit",
+                subfolder="dsine",
+                filename="tf_efficientnet_b5_ap-9e82fae8.pth",
+            )
+        self.model = DSINE(efficientnet_path)
+        self.model = dsine_utils.load_checkpoint(model_path, self.model)
 
     def set_fov_intrinsics(self, height: int, width: int, fov: float = 60.0):
         self.fov = fov
@@ -79,7 +83,6 @@ class DsineNormalEstimation(BaseNormalEstimation):
 
         return normal
 
-    def to(self, device: str):
-        self.device = torch.device(device)
+    def _move_model(self):
         self.model.to(self.device)
         self.model.pixel_coords = self.model.pixel_coords.to(self.device)
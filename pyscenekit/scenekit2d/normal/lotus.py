@@ -32,7 +32,6 @@ class LotusNormalEstimation(BaseNormalEstimation):
         self.weight_dtype = torch.float16
 
         self.image_processor = None
-        self.load_model()
 
         self.seed = -1
         self.generator = None
@@ -83,7 +82,3 @@ class LotusNormalEstimation(BaseNormalEstimation):
 
             normal = (pred - 0.5) * 2.0
         return normal
-
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
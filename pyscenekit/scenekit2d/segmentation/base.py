@@ -2,6 +2,11 @@ import cv2
 import numpy as np
 
 from pyscenekit.scenekit2d.base import BaseImageModel
+from pyscenekit.scenekit2d.segmentation.labels import (
+    SCANNET20_IGNORE_LABEL,
+    colorize_labels,
+    remap_labels,
+)
 
 
 class BaseImageSegmentation(BaseImageModel):
@@ -162,8 +167,18 @@ class BaseImageSegmentation(BaseImageModel):
         [92, 0, 255],
     ]
 
-    def semantic_colorize(self, mask: np.ndarray) -> np.ndarray:
-        color_seg = np.zeros((mask.shape[0], mask.shape[1], 3), dtype=np.uint8)
-        for label, color in enumerate(self.ADE20K_PALETTE):
-            color_seg[mask == label, :] = color
-        return color_seg
+    # mask can be a single (H, W) label map or a batch (N, H, W), labels are
+    # optionally remapped first, e.g. with ADE20K_TO_SCANNET20 and SCANNET20_PALETTE,
+    # labels outside the table become ignore_label, which is outside the palette
+    def semantic_colorize(
+        self,
+        mask: np.ndarray,
+        palette: np.ndarray = None,
+        remap_table: np.ndarray = None,
+        ignore_label: int = SCANNET20_IGNORE_LABEL,
+    ) -> np.ndarray:
+        if remap_table is not None:
+            mask = remap_labels(mask, remap_table, ignore_label)
+        if palette is None:
+            palette = self.ADE20K_PALETTE
+        return colorize_labels(mask, palette)
@@ -1,6 +1,15 @@
 from enum import Enum
 
-from pyscenekit.scenekit2d.segmentation.upernet import UperNetSemanticSegmentation
+from pyscenekit.utils.lazy import lazy_attributes
+
+# backends are imported when their method is selected
+_import_backend = lazy_attributes(
+    __name__,
+    {
+        "UperNetSemanticSegmentation": "pyscenekit.scenekit2d.segmentation.upernet",
+    },
+)
+__getattr__ = _import_backend
 
 
 class SemanticSegmentationMethod(Enum):
@@ -15,7 +24,7 @@ class SemanticSegmentationModel:
             method = SemanticSegmentationMethod[method.upper()]
 
         if method == SemanticSegmentationMethod.UPERNET:
-            return UperNetSemanticSegmentation(model_path)
+            return _import_backend("UperNetSemanticSegmentation")(model_path)
         else:
             raise NotImplementedError(
                 f"Normal estimation method {method} not implemented"
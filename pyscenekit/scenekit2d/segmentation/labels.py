@@ -0,0 +1,289 @@
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+# ADE20K (SceneParsing 150) classes, in the order predicted by the ADE20K models
+# fmt: off
+ADE20K_CLASSES = [
+    "wall", "building", "sky", "floor", "tree", "ceiling", "road", "bed",
+    "windowpane", "grass", "cabinet", "sidewalk", "person", "earth", "door",
+    "table", "mountain", "plant", "curtain", "chair", "car", "water", "painting",
+    "sofa", "shelf", "house", "sea", "mirror", "rug", "field", "armchair", "seat",
+    "fence", "desk", "rock", "wardrobe", "lamp", "bathtub", "railing", "cushion",
+    "base", "box", "column", "signboard", "chest of drawers", "counter", "sand",
+    "sink", "skyscraper", "fireplace", "refrigerator", "grandstand", "path",
+    "stairs", "runway", "case", "pool table", "pillow", "screen door", "stairway",
+    "river", "bridge", "bookcase", "blind", "coffee table", "toilet", "flower",
+    "book", "hill", "bench", "countertop", "stove", "palm", "kitchen island",
+    "computer", "swivel chair", "boat", "bar", "arcade machine", "hovel", "bus",
+    "towel", "light", "truck", "tower", "chandelier", "awning", "streetlight",
+    "booth", "television receiver", "airplane", "dirt track", "apparel", "pole",
+    "land", "bannister", "escalator", "ottoman", "bottle", "buffet", "poster",
+    "stage", "van", "ship", "fountain", "conveyer belt", "canopy", "washer",
+    "plaything", "swimming pool", "stool", "barrel", "basket", "waterfall", "tent",
+    "bag", "minibike", "cradle", "oven", "ball", "food", "step", "tank",
+    "trade name", "microwave", "pot", "animal", "bicycle", "lake", "dishwasher",
+    "screen", "blanket", "sculpture", "hood", "sconce", "vase", "traffic light",
+    "tray", "ashcan", "fan", "pier", "crt screen", "plate", "monitor",
+    "bulletin board", "shower", "radiator", "glass", "clock", "flag",
+]
+
+# NYU40 classes use labels 1..40, 0 is unlabeled
+NYU40_CLASSES = [
+    "unlabeled", "wall", "floor", "cabinet", "bed", "chair", "sofa", "table",
+    "door", "window", "bookshelf", "picture", "counter", "blinds", "desk",
+    "shelves", "curtain", "dresser", "pillow", "mirror", "floor mat", "clothes",
+    "ceiling", "books", "refrigerator", "television", "paper", "towel",
+    "shower curtain", "box", "whiteboard", "person", "night stand", "toilet",
+    "sink", "lamp", "bathtub", "bag", "otherstructure", "otherfurniture",
+    "otherprop",
+]
+# fmt: on
+
+# reference: https://github.com/ScanNet/ScanNet/blob/master/BenchmarkScripts/util.py
+NYU40_PALETTE = [
+    [0, 0, 0],
+    [174, 199, 232],
+    [152, 223, 138],
+    [31, 119, 180],
+    [255, 187, 120],
+    [188, 189, 34],
+    [140, 86, 75],
+    [255, 152, 150],
+    [214, 39, 40],
+    [197, 176, 213],
+    [148, 103, 189],
+    [196, 156, 148],
+    [23, 190, 207],
+    [178, 76, 76],
+    [247, 182, 210],
+    [66, 188, 102],
+    [219, 219, 141],
+    [140, 57, 197],
+    [202, 185, 52],
+    [51, 176, 203],
+    [200, 54, 131],
+    [92, 193, 61],
+    [78, 71, 183],
+    [172, 114, 82],
+    [255, 127, 14],
+    [91, 163, 138],
+    [153, 98, 156],
+    [140, 153, 101],
+    [158, 218, 229],
+    [100, 125, 154],
+    [178, 127, 135],
+    [120, 185, 128],
+    [146, 111, 194],
+    [44, 160, 44],
+    [112, 128, 144],
+    [96, 207, 209],
+    [227, 119, 194],
+    [213, 92, 176],
+    [94, 106, 211],
+    [82, 84, 163],
+    [100, 85, 144],
+]
+
+# ScanNet benchmark classes use labels 0..19, other NYU40 classes are ignored
+SCANNET20_NYU40_IDS = [
+    1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 14, 16, 24, 28, 33, 34, 36, 39
+]  # fmt: skip
+SCANNET20_CLASSES = [NYU40_CLASSES[i] for i in SCANNET20_NYU40_IDS]
+SCANNET20_PALETTE = [NYU40_PALETTE[i] for i in SCANNET20_NYU40_IDS]
+SCANNET20_IGNORE_LABEL = 255
+
+# approximate name based correspondence, ADE20K classes without an indoor
+# counterpart are left unlabeled
+ADE20K_TO_NYU40_NAMES = {
+    "wall": "wall",
+    "floor": "floor",
+    "rug": "floor mat",
+    "cabinet": "cabinet",
+    "wardrobe": "cabinet",
+    "chest of drawers": "dresser",
+    "bed": "bed",
+    "chair": "chair",
+    "armchair": "chair",
+    "swivel chair": "chair",
+    "seat": "chair",
+    "stool": "chair",
+    "sofa": "sofa",
+    "table": "table",
+    "coffee table": "table",
+    "pool table": "table",
+    "door": "door",
+    "screen door": "door",
+    "windowpane": "window",
+    "bookcase": "bookshelf",
+    "painting": "picture",
+    "poster": "picture",
+    "counter": "counter",
+    "countertop": "counter",
+    "kitchen island": "counter",
+    "blind": "blinds",
+    "desk": "desk",
+    "shelf": "shelves",
+    "curtain": "curtain",
+    "pillow": "pillow",
+    "cushion": "pillow",
+    "mirror": "mirror",
+    "apparel": "clothes",
+    "ceiling": "ceiling",
+    "book": "books",
+    "refrigerator": "refrigerator",
+    "television receiver": "television",
+    "crt screen": "television",
+    "towel": "towel",
+    "box": "box",
+    "bulletin board": "whiteboard",
+    "person": "person",
+    "toilet": "toilet",
+    "sink": "sink",
+    "lamp": "lamp",
+    "chandelier": "lamp",
+    "sconce": "lamp",
+    "bathtub": "bathtub",
+    "bag": "bag",
+    "column": "otherstructure",
+    "stairs": "otherstructure",
+    "stairway": "otherstructure",
+    "step": "otherstructure",
+    "railing": "otherstructure",
+    "bannister": "otherstructure",
+    "fireplace": "otherstructure",
+    "shower": "otherstructure",
+    "ottoman": "otherfurniture",
+    "bench": "otherfurniture",
+    "buffet": "otherfurniture",
+    "bar": "otherfurniture",
+    "booth": "otherfurniture",
+    "stove": "otherfurniture",
+    "oven": "otherfurniture",
+    "dishwasher": "otherfurniture",
+    "washer": "otherfurniture",
+    "radiator": "otherfurniture",
+    "plant": "otherprop",
+    "flower": "otherprop",
+    "vase": "otherprop",
+    "bottle": "otherprop",
+    "basket": "otherprop",
+    "clock": "otherprop",
+    "fan": "otherprop",
+    "tray": "otherprop",
+    "plate": "otherprop",
+    "glass": "otherprop",
+    "pot": "otherprop",
+    "ashcan": "otherprop",
+    "microwave": "otherprop",
+    "computer": "otherprop",
+    "monitor": "otherprop",
+    "screen": "otherprop",
+    "blanket": "otherprop",
+    "plaything": "otherprop",
+    "sculpture": "otherprop",
+    "light": "otherprop",
+}
+
+# lookup tables are cached per palette and label dtype
+_LUT_CACHE: Dict[Tuple, np.ndarray] = {}
+
+
+def _full_range(dtype: np.dtype) -> int:
+    # labels of these types index a table covering every representable value
+    if dtype in (np.uint8, np.uint16):
+        return np.iinfo(dtype).max + 1
+    return 0
+
+
+def build_remap_table(
+    mapping: Dict[int, int], num_labels: int, ignore_label: int = 0
+) -> np.ndarray:
+    table = np.full(num_labels, ignore_label, dtype=np.int64)
+    for source, target in mapping.items():
+        table[source] = target
+    return table
+
+
+def compose_remap_tables(
+    first: np.ndarray, second: np.ndarray, ignore_label: int
+) -> np.ndarray:
+    # labels outside the second table are kept as ignore_label
+    valid = (first >= 0) & (first < len(second))
+    return np.where(valid, second[np.clip(first, 0, len(second) - 1)], ignore_label)
+
+
+def _gather(
+    labels: np.ndarray, table: np.ndarray, fill: np.ndarray, cache_key: Tuple
+) -> np.ndarray:
+    labels = np.asarray(labels)
+    size = _full_range(labels.dtype)
+    if size >= len(table):
+        # pad the table to the whole label range so the gather needs no bounds check
+        key = (cache_key, labels.dtype.str)
+        lut = _LUT_CACHE.get(key)
+        if lut is None:
+            lut = np.empty((size,) + table.shape[1:], dtype=table.dtype)
+            lut[: len(table)] = table
+            lut[len(table) :] = fill
+            _LUT_CACHE[key] = lut
+        return lut[labels]
+
+    # the last entry holds the fill value for out of range labels
+    lut = np.concatenate([table, np.asarray(fill, dtype=table.dtype)[None]])
+    valid = (labels >= 0) & (labels < len(table))
+    return lut[np.where(valid, labels, len(table))]
+
+
+def remap_labels(
+    labels: np.ndarray, table: Sequence[int], ignore_label: int = 0
+) -> np.ndarray:
+    """
+    Map labels of any shape through table, labels without an entry become
+    ignore_label. The output keeps the input dtype when the table fits in it.
+    """
+    labels = np.asarray(labels)
+    table = np.asarray(table)
+    dtype = labels.dtype
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        if table.min() < info.min or table.max() > info.max or not (
+            info.min <= ignore_label <= info.max
+        ):
+            dtype = np.int64
+    table = table.astype(dtype)
+    cache_key = ("remap", table.tobytes(), ignore_label)
+    return _gather(labels, table, np.asarray(ignore_label, dtype=dtype), cache_key)
+
+
+def colorize_labels(
+    labels: np.ndarray,
+    palette: Sequence[Sequence[int]],
+    ignore_color: Sequence[int] = (0, 0, 0),
+) -> np.ndarray:
+    """
+    Colorize a label map of shape (H, W) or a batch (N, H, W) with one gather.
+    Labels outside the palette get ignore_color. Returns uint8 RGB (..., 3).
+    """
+    palette = np.asarray(palette, dtype=np.uint8)
+    ignore_color = np.asarray(ignore_color, dtype=np.uint8)
+    cache_key = ("color", palette.tobytes(), ignore_color.tobytes())
+    return _gather(labels, palette, ignore_color, cache_key)
+
+
+ADE20K_TO_NYU40 = build_remap_table(
+    {
+        ADE20K_CLASSES.index(ade): NYU40_CLASSES.index(nyu)
+        for ade, nyu in ADE20K_TO_NYU40_NAMES.items()
+    },
+    len(ADE20K_CLASSES),
+    ignore_label=0,
+)
+NYU40_TO_SCANNET20 = build_remap_table(
+    {nyu: i for i, nyu in enumerate(SCANNET20_NYU40_IDS)},
+    len(NYU40_CLASSES),
+    ignore_label=SCANNET20_IGNORE_LABEL,
+)
+ADE20K_TO_SCANNET20 = compose_remap_tables(
+    ADE20K_TO_NYU40, NYU40_TO_SCANNET20, SCANNET20_IGNORE_LABEL
+)
@@ -6,13 +6,14 @@ from pyscenekit.scenekit2d.segmentation.base import BaseImageSegmentation
 
 
 class UperNetSemanticSegmentation(BaseImageSegmentation):
+    model_attributes = ("model", "image_processor")
+
     def __init__(self, model_path: str = None):
         super().__init__(model_path)
         if self.model_path is None:
             self.model_path = "openmmlab/upernet-convnext-large"
 
         self.image_processor = None
-        self.load_model()
 
     def load_model(self):
         self.image_processor = AutoImageProcessor.from_pretrained(self.model_path)
@@ -31,7 +32,3 @@ class UperNetSemanticSegmentation(BaseImageSegmentation):
         )[0]
         semantic_image = semantic_image.detach().cpu().numpy().astype(np.uint16)
         return semantic_image
-
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
@@ -1,16 +1,20 @@
+from __future__ import annotations
+
 import abc
 from typing import Union, Literal
 
 import cv2
-import trimesh
 import numpy as np
-import open3d as o3d
-import matplotlib.pyplot as plt
 from scipy.spatial import ConvexHull
 
 from pyscenekit.utils.common import log
+from pyscenekit.utils.lazy import lazy_import
 from pyscenekit.scenekit3d.utils import intersect_lines, rotation_from2vectors
 
+# loaded on first use, importing them eagerly dominates the package import time
+o3d = lazy_import("open3d")
+trimesh = lazy_import("trimesh")
+
 
 class SceneKitCamera:
     def __init__(
@@ -118,6 +122,9 @@ class SceneKitGeometry(abc.ABC):
         std_ratio=3.0,
         visualize=False,
     ) -> o3d.geometry.OrientedBoundingBox:
+        if visualize:
+            import matplotlib.pyplot as plt
+
         vertices = self.get_vertices()
         pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(vertices))
         pcd, _ = pcd.remove_statistical_outlier(nb_neighbors, std_ratio)
@@ -740,6 +747,21 @@ class SceneKitStructuredPointCloud:
             depth_trunc=depth_trunc,
         )
 
+    def depth_to_normals(
+        self, mask: np.ndarray = None, world: bool = False, rtol: float = 0.05
+    ):
+        """
+        Normals (H, W, 3) of the depth image from the image grid and the mask of
+        valid normals, in camera space or in world space with world=True.
+        """
+        from pyscenekit.scenekit3d.geometry.normals import depth_to_normals
+
+        depth = np.asarray(self.depth_image)
+        intrinsics = np.array(self.camera.intrinsics, dtype=np.float64)
+        intrinsics[:2] *= depth.shape[1] / self.camera.width
+        extrinsics = self.camera.extrinsics if world else None
+        return depth_to_normals(depth, intrinsics, mask, extrinsics, rtol=rtol)
+
     def colormap_depth(self):
         from pyscenekit.scenekit2d.depth.base import BaseDepthEstimation
 
@@ -1,2 +1,13 @@
-from .scannet.dataset import ScanNetDataset
-from .scannetpp.dataset import ScanNetPPDataset
+from pyscenekit.utils.lazy import lazy_attributes
+
+# each dataset pulls in its own readers and renderers, import them on first access
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "ScanNetDataset": "pyscenekit.scenekit3d.datasets.scannet.dataset",
+        "ScanNetPPDataset": "pyscenekit.scenekit3d.datasets.scannetpp.dataset",
+        "SceneIndex": "pyscenekit.scenekit3d.datasets.scene_index",
+    },
+)
+
+__all__ = ["ScanNetDataset", "ScanNetPPDataset", "SceneIndex"]
@@ -0,0 +1,353 @@
+import os
+import uuid
+import struct
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+from pyscenekit.utils.common import log
+from pyscenekit.scenekit3d.utils import qvecs2rotmats
+from pyscenekit.scenekit3d.datasets.undistort import Undistorter
+
+# reference: https://github.com/colmap/colmap/blob/main/scripts/python/read_write_model.py
+# model id -> (model name, number of params)
+CAMERA_MODELS = {
+    0: ("SIMPLE_PINHOLE", 3),
+    1: ("PINHOLE", 4),
+    2: ("SIMPLE_RADIAL", 4),
+    3: ("RADIAL", 5),
+    4: ("OPENCV", 8),
+    5: ("OPENCV_FISHEYE", 8),
+    6: ("FULL_OPENCV", 12),
+    7: ("FOV", 5),
+    8: ("SIMPLE_RADIAL_FISHEYE", 4),
+    9: ("RADIAL_FISHEYE", 5),
+    10: ("THIN_PRISM_FISHEYE", 12),
+}
+CAMERA_MODEL_IDS = {name: model_id for model_id, (name, _) in CAMERA_MODELS.items()}
+MAX_CAMERA_PARAMS = 12
+
+CAMERA_DTYPE = np.dtype(
+    [
+        ("camera_id", np.int64),
+        ("model_id", np.int64),
+        ("width", np.int64),
+        ("height", np.int64),
+        ("params", np.float64, (MAX_CAMERA_PARAMS,)),
+    ]
+)
+IMAGE_DTYPE = np.dtype(
+    [
+        ("image_id", np.int64),
+        ("qvec", np.float64, (4,)),
+        ("tvec", np.float64, (3,)),
+        ("camera_id", np.int64),
+    ]
+)
+
+# bump when the layout of the cached arrays changes
+CACHE_VERSION = 1
+
+# image_id, qvec, tvec and camera_id of a binary image record
+_IMAGE_HEADER = struct.Struct("<I4d3dI")
+# x, y and point3D_id of a 2D point of a binary image record
+_POINT2D_SIZE = 24
+
+
+def _read_text_lines(path: str):
+    with open(path, "r") as f:
+        return [line for line in f.read().split("\n") if not line.startswith("#")]
+
+
+def read_cameras_text(path: str) -> np.ndarray:
+    lines = [line.split() for line in _read_text_lines(path) if line.strip()]
+    cameras = np.zeros(len(lines), dtype=CAMERA_DTYPE)
+    for i, elems in enumerate(lines):
+        params = np.array(elems[4:], dtype=np.float64)
+        cameras[i]["camera_id"] = int(elems[0])
+        cameras[i]["model_id"] = CAMERA_MODEL_IDS[elems[1]]
+        cameras[i]["width"] = int(elems[2])
+        cameras[i]["height"] = int(elems[3])
+        cameras[i]["params"][: len(params)] = params
+    return cameras
+
+
+def read_cameras_binary(path: str) -> np.ndarray:
+    with open(path, "rb") as f:
+        data = f.read()
+    (num_cameras,) = struct.unpack_from("<Q", data, 0)
+    cameras = np.zeros(num_cameras, dtype=CAMERA_DTYPE)
+    offset = 8
+    for i in range(num_cameras):
+        camera_id, model_id, width, height = struct.unpack_from("<iiQQ", data, offset)
+        offset += 24
+        num_params = CAMERA_MODELS[model_id][1]
+        params = np.frombuffer(data, np.float64, num_params, offset)
+        offset += 8 * num_params
+        cameras[i]["camera_id"] = camera_id
+        cameras[i]["model_id"] = model_id
+        cameras[i]["width"] = width
+        cameras[i]["height"] = height
+        cameras[i]["params"][:num_params] = params
+    return cameras
+
+
+def read_images_text(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Read images.txt into an IMAGE_DTYPE array and the image names.
+    Every image takes two lines, the second one holds its 2D points and is
+    skipped, it is empty for images without points.
+    """
+    lines = _read_text_lines(path)
+    # an image line is never empty, a trailing newline leaves one empty line
+    image_lines = [line for line in lines[0::2] if line.strip()]
+    elems = [line.split(maxsplit=9) for line in image_lines]
+    images = np.zeros(len(elems), dtype=IMAGE_DTYPE)
+    if len(elems) == 0:
+        return images, np.array([], dtype=str)
+
+    values = np.array([row[:9] for row in elems], dtype=np.float64)
+    images["image_id"] = values[:, 0].astype(np.int64)
+    images["qvec"] = values[:, 1:5]
+    images["tvec"] = values[:, 5:8]
+    images["camera_id"] = values[:, 8].astype(np.int64)
+    names = np.array([row[9].strip() for row in elems])
+    return images, names
+
+
+def read_images_binary(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    with open(path, "rb") as f:
+        data = f.read()
+    (num_images,) = struct.unpack_from("<Q", data, 0)
+    images = np.zeros(num_images, dtype=IMAGE_DTYPE)
+    names = []
+    offset = 8
+    for i in range(num_images):
+        values = _IMAGE_HEADER.unpack_from(data, offset)
+        offset += _IMAGE_HEADER.size
+        images[i] = (values[0], values[1:5], values[5:8], values[8])
+        end = data.index(b"\x00", offset)
+        names.append(data[offset:end].decode("utf-8"))
+        (num_points,) = struct.unpack_from("<Q", data, end + 1)
+        offset = end + 9 + num_points * _POINT2D_SIZE
+    return images, np.array(names, dtype=str)
+
+
+def _source_path(colmap_dir: str, name: str) -> str:
+    # the binary model is what colmap writes by default, prefer it
+    for ext in (".bin", ".txt"):
+        path = os.path.join(colmap_dir, f"{name}{ext}")
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"No {name}.bin or {name}.txt in {colmap_dir}")
+
+
+def _cache_path(source_path: str) -> str:
+    return os.path.join(
+        os.path.dirname(source_path), f".{os.path.basename(source_path)}.npz"
+    )
+
+
+def _source_signature(source_path: str) -> np.ndarray:
+    stat = os.stat(source_path)
+    return np.array([CACHE_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def _load_cached(source_path: str, reader, cache: bool) -> Dict[str, np.ndarray]:
+    """
+    Parse source_path with reader, or load the arrays cached next to it by an
+    earlier call. The cache is invalidated when the source file changes.
+    """
+    signature = _source_signature(source_path)
+    cache_path = _cache_path(source_path)
+    if cache and os.path.isfile(cache_path):
+        try:
+            with np.load(cache_path, allow_pickle=False) as cached:
+                if np.array_equal(cached["signature"], signature):
+                    return {
+                        key: cached[key] for key in cached.files if key != "signature"
+                    }
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"Ignoring unreadable colmap cache {cache_path}: {e}")
+
+    arrays = reader(source_path)
+    if cache:
+        tmp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, signature=signature, **arrays)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            # read only datasets are parsed every time
+            log.warning(f"Could not write colmap cache {cache_path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return arrays
+
+
+def read_cameras(colmap_dir: str, cache: bool = True) -> np.ndarray:
+    def reader(path):
+        if path.endswith(".bin"):
+            return {"cameras": read_cameras_binary(path)}
+        return {"cameras": read_cameras_text(path)}
+
+    return _load_cached(_source_path(colmap_dir, "cameras"), reader, cache)["cameras"]
+
+
+def read_images(colmap_dir: str, cache: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    def reader(path):
+        if path.endswith(".bin"):
+            images, names = read_images_binary(path)
+        else:
+            images, names = read_images_text(path)
+        return {"images": images, "names": names}
+
+    arrays = _load_cached(_source_path(colmap_dir, "images"), reader, cache)
+    return arrays["images"], arrays["names"]
+
+
+def extrinsics_matrices(images: np.ndarray) -> np.ndarray:
+    # world to camera matrices (N, 4, 4) of an IMAGE_DTYPE array
+    extrinsics = np.zeros((len(images), 4, 4), dtype=np.float64)
+    extrinsics[:, :3, :3] = qvecs2rotmats(images["qvec"])
+    extrinsics[:, :3, 3] = images["tvec"]
+    extrinsics[:, 3, 3] = 1
+    return extrinsics
+
+
+def camera_matrices(camera: np.void) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Intrinsic matrix and OpenCV distortion coefficients of a CAMERA_DTYPE
+    record. Fisheye models return the four cv2.fisheye coefficients.
+    """
+    model = CAMERA_MODELS[int(camera["model_id"])][0]
+    params = camera["params"]
+    if model in ("SIMPLE_PINHOLE", "SIMPLE_RADIAL", "RADIAL"):
+        fx = fy = params[0]
+        cx, cy = params[1], params[2]
+    else:
+        fx, fy, cx, cy = params[:4]
+    K = np.array([[fx, 0, cx], [0, fy, cy], [0, 0, 1]], dtype=np.float64)
+
+    if model in ("SIMPLE_PINHOLE", "PINHOLE"):
+        distortion_params = np.zeros(4)
+    elif model == "SIMPLE_RADIAL":
+        distortion_params = np.array([params[3], 0, 0, 0])
+    elif model == "RADIAL":
+        distortion_params = np.array([params[3], params[4], 0, 0])
+    elif model in ("OPENCV", "OPENCV_FISHEYE"):
+        distortion_params = params[4:8].copy()
+    elif model == "FULL_OPENCV":
+        distortion_params = params[4:12].copy()
+    else:
+        raise ValueError(f"Unsupported camera model {model}")
+    return K, distortion_params
+
+
+def is_fisheye(camera: np.void) -> bool:
+    return CAMERA_MODELS[int(camera["model_id"])][0] == "OPENCV_FISHEYE"
+
+
+class ColmapModel:
+    """
+    Cameras and registered images of a colmap model directory.
+
+    Both the text and the binary formats are read into structured arrays,
+    cached as npz next to the source files, and the world to camera matrices
+    of all images are computed at once. Undistorted intrinsics and
+    undistorters are built the first time a camera asks for them.
+    """
+
+    def __init__(self, colmap_dir: str, cache: bool = True):
+        self.colmap_dir = colmap_dir
+        self.cameras = read_cameras(colmap_dir, cache=cache)
+        self.images, self.image_names = read_images(colmap_dir, cache=cache)
+        self._set_images()
+
+    @classmethod
+    def from_arrays(
+        cls,
+        cameras: np.ndarray,
+        images: np.ndarray,
+        image_names: np.ndarray,
+        colmap_dir: str = None,
+    ):
+        # model read elsewhere, e.g. from a SceneIndex
+        model = cls.__new__(cls)
+        model.colmap_dir = colmap_dir
+        model.cameras = cameras
+        model.images = images
+        model.image_names = image_names
+        model._set_images()
+        return model
+
+    def _set_images(self):
+        self.extrinsics = extrinsics_matrices(self.images)
+
+        self._camera_index = {
+            int(camera_id): i for i, camera_id in enumerate(self.cameras["camera_id"])
+        }
+        self._new_intrinsics = {}
+        self._undistorters = {}
+
+    def __len__(self):
+        return len(self.images)
+
+    def camera(self, camera_id: int) -> np.void:
+        return self.cameras[self._camera_index[int(camera_id)]]
+
+    def camera_model(self, camera_id: int) -> str:
+        return CAMERA_MODELS[int(self.camera(camera_id)["model_id"])][0]
+
+    def intrinsics(self, camera_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        return camera_matrices(self.camera(camera_id))
+
+    def new_intrinsics(self, camera_id: int) -> np.ndarray:
+        """
+        Intrinsic matrix of the undistorted images of a camera.
+        """
+        camera_id = int(camera_id)
+        if camera_id not in self._new_intrinsics:
+            camera = self.camera(camera_id)
+            K, distortion_params = camera_matrices(camera)
+            size = (int(camera["width"]), int(camera["height"]))
+            if is_fisheye(camera):
+                new_K = cv2.fisheye.estimateNewCameraMatrixForUndistortRectify(
+                    K, distortion_params, size, np.eye(3), balance=0.0
+                )
+                new_K[0, 2] = size[0] / 2.0
+                new_K[1, 2] = size[1] / 2.0
+            else:
+                new_K, _ = cv2.getOptimalNewCameraMatrix(
+                    K, distortion_params, size, 1, size, True
+                )
+            self._new_intrinsics[camera_id] = new_K
+        return self._new_intrinsics[camera_id]
+
+    def undistorter(
+        self,
+        camera_id: int,
+        target_resolution: int = 0,
+        cache_dir: str = None,
+        num_workers: int = 4,
+    ) -> Undistorter:
+        """
+        Undistorter of a camera to new_intrinsics, created on first use.
+        """
+        key = (int(camera_id), target_resolution, cache_dir)
+        if key not in self._undistorters:
+            camera = self.camera(camera_id)
+            K, distortion_params = camera_matrices(camera)
+            self._undistorters[key] = Undistorter(
+                K,
+                distortion_params,
+                int(camera["width"]),
+                int(camera["height"]),
+                self.new_intrinsics(camera_id),
+                fisheye=is_fisheye(camera),
+                target_resolution=target_resolution,
+                cache_dir=cache_dir,
+                num_workers=num_workers,
+            )
+        return self._undistorters[key]
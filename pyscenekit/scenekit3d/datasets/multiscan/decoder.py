@@ -1,18 +1,41 @@
 import os
+import sys
 import zlib
 import json
+import shutil
+import struct
+import weakref
+import tempfile
 import numpy as np
 import multiprocessing
 from enum import Enum
 
 from pyscenekit.scenekit3d.datasets.multiscan.utils import Camera, get_suffix
 from pyscenekit.scenekit3d.datasets.multiscan.export import (
-    export_frames,
-    export_cameras,
+    FrameExporter,
+    export_frame,
+    export_camera,
 )
 from pyscenekit.utils.common import log
 
 
+# fixed size npy header, so the shape can be written once the frame count is known
+_NPY_HEADER_SIZE = 128
+
+
+def _npy_header(dtype: np.dtype, shape: tuple) -> bytes:
+    header = repr(
+        {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": tuple(int(size) for size in shape),
+        }
+    )
+    length = _NPY_HEADER_SIZE - 10
+    header = (header.ljust(length - 1) + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", length) + header
+
+
 class DecoderType(Enum):
     RGB = "rgb"
     DEPTH = "depth"
@@ -62,10 +85,21 @@ class DecoderBase:
         self.frame_indices = np.arange(start_frame, stop_frame, step)
         return self.frame_indices
 
+    def frame_chunks(self, chunk_size: int):
+        # chunks of frame_indices, decoded and exported one after the other
+        if len(self.frame_indices) == 0:
+            raise ValueError("Please set up the export frame indices first")
+        chunk_size = min(chunk_size, len(self.frame_indices))
+        num_chunks = len(self.frame_indices) // chunk_size
+        return np.array_split(self.frame_indices, num_chunks)
+
     def export(self, output: str, format: str, frame_param: dict, num_workers: int = 0):
+        """
+        Decode the frames in frame_indices chunk by chunk in this process while
+        a pool of num_workers processes, kept for the whole export, encodes them.
+        """
         log.info(f"Decoding stream {self.input} to {output}")
-        if len(self.frame_indices) == 0:
-            raise "Please set up the export frame indices first"
+        frame_indices_chunks = self.frame_chunks(self.chunk_size)
         os.makedirs(output, exist_ok=True)
         total_workers = multiprocessing.cpu_count()
         self.num_workers = (
@@ -77,17 +111,23 @@ class DecoderBase:
             frame_param["width"] = self.width
         if not frame_param["height"]:
             frame_param["height"] = self.height
-        chunk_size = min(self.chunk_size, len(self.frame_indices))
-        num_chunks = len(self.frame_indices) // chunk_size
-        frame_indices_chunks = np.array_split(self.frame_indices, num_chunks)
 
-        for i, frame_indices in enumerate(frame_indices_chunks):
-            log.info(f"Processing chunk {i} / {num_chunks}")
-            self._export_impl(output, format, frame_param, frame_indices)
-
-    def _export_impl(
-        self, output: str, format: str, frame_param: dict, frame_indices: list
-    ):
+        with FrameExporter(
+            self.export_function,
+            output,
+            frame_param,
+            format,
+            num_workers=self.num_workers,
+        ) as exporter:
+            for i, frame_indices in enumerate(frame_indices_chunks):
+                log.info(f"Processing chunk {i}")
+                self._export_impl(exporter, frame_indices)
+
+    @property
+    def export_function(self):
+        return export_frame
+
+    def _export_impl(self, exporter: FrameExporter, frame_indices: list):
         pass
 
 
@@ -108,19 +148,88 @@ class DecoderRGB(DecoderBase):
     def total_frames(self):
         return len(self.video_reader)
 
-    def _export_impl(
-        self, output: str, format: str, frame_param: dict, frame_indices: list
-    ):
+    def _export_impl(self, exporter: FrameExporter, frame_indices: list):
         frames = self.video_reader.get_batch(frame_indices).asnumpy()
-        export_frames(
-            frames, output, frame_param, frame_indices, format, self.num_workers
-        )
+        exporter.submit_frames(frames, frame_indices)
+
+
+class InflateStream:
+    """
+    Sequential reader over a raw deflate compressed file.
+
+    Data is inflated chunk by chunk as it is read, reading before the current
+    position restarts from the beginning of the file. The inflated size is
+    known once a read reached the end of the stream.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 16):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.total_size = None
+        self._file = None
+        self.reset()
+
+    def reset(self):
+        self.close()
+        self._file = open(self.path, "rb")
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        self._pending = bytearray()
+        self._eof = False
+        self.position = 0
+
+    def _fill(self, size: int):
+        while len(self._pending) < size and not self._eof:
+            chunk = self._file.read(self.chunk_size)
+            if chunk:
+                self._pending += self._decompressor.decompress(chunk)
+            else:
+                self._pending += self._decompressor.flush()
+                self._eof = True
+                self.total_size = self.position + len(self._pending)
+
+    def read(self, size: int) -> bytearray:
+        self._fill(size)
+        data = self._pending[:size]
+        del self._pending[:size]
+        self.position += len(data)
+        return data
+
+    def seek(self, position: int):
+        if position < self.position:
+            self.reset()
+        while self.position < position:
+            if not self.read(min(position - self.position, 1 << 24)):
+                break
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
 
 
 class DecoderDepth(DecoderBase):
+    """
+    Decoder of the zlib compressed depth (and confidence) streams.
+
+    mode "stream" inflates frames on demand without writing anything to disk,
+    exporting frames in increasing order inflates the stream once. The frame
+    count is only known at the end of the stream, so exports run up to the stop
+    frame or the end of the stream instead of counting the frames first.
+    mode "memmap" inflates the stream once into a memory-mapped npy array of
+    scaled output frames at array_path, or in a private folder under tmp_dir
+    that is removed by close(). Use the decoder as a context manager to release
+    it deterministically.
+    """
+
+    MODES = ("stream", "memmap")
+
     def __init__(self, input: str, *args, **kwargs):
         super().__init__(input, *args, **kwargs)
-        self._uncompressed_input = self._uncompress(kwargs.get("tmp_dir", "tmp"))
+        self.mode = kwargs.get("mode", "stream")
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown mode {self.mode}, expected one of {self.MODES}")
+        self.tmp_dir = kwargs.get("tmp_dir", "tmp")
+        self.array_path = kwargs.get("array_path", None)
         self.input_dtype = np.float16
         self.output_dtype = np.uint16
         self.pixel_scale = 1000.0
@@ -129,54 +238,180 @@ class DecoderDepth(DecoderBase):
         self.pixel_size = self.get_pixel_size()
         self.frame_size = self.get_frame_size()
 
-    def _uncompress(self, outupt_dir):
-        d = zlib.decompressobj(-zlib.MAX_WBITS)
-        chuck_size = 4096 * 4
-        tempfile = os.path.basename(self.input) + ".tmp"
-        os.makedirs(outupt_dir, exist_ok=True)
-        output_filepath = os.path.join(outupt_dir, tempfile)
-
-        tmp = open(output_filepath, "wb+")
-        with open(self.input, "rb") as f:
-            buffer = f.read(chuck_size)
-            while buffer:
-                outstr = d.decompress(buffer)
-                tmp.write(outstr)
-                buffer = f.read(chuck_size)
-
-            tmp.write(d.flush())
-        tmp.close()
-        return output_filepath
+        # created on first use, so subclasses can change the frame layout first
+        self._stream = None
+        self._array = None
+        self._num_frames = None
+        self._frame_range = None
+        self._cleanup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        self._array = None
+        if self._cleanup is not None:
+            self._cleanup()
+            self._cleanup = None
+
+    @property
+    def stream(self) -> InflateStream:
+        if self._stream is None:
+            self._stream = InflateStream(self.input)
+        return self._stream
+
+    def _update_num_frames(self):
+        if self._num_frames is None and self.stream.total_size is not None:
+            self._num_frames = self.stream.total_size // self.frame_size
 
     def total_frames(self):
-        file_size = os.stat(self._uncompressed_input).st_size
-        return int(file_size / self.frame_size)
+        if self.mode == "memmap":
+            return len(self.frames_array())
+        if self._num_frames is None:
+            # inflates up to the end of the stream, unless a read already did
+            self.stream.seek(sys.maxsize)
+            self._update_num_frames()
+        return self._num_frames
+
+    def set_frame_indices(self, start: int, stop: int, step=1):
+        if self.mode == "memmap" or self._num_frames is not None:
+            self._frame_range = None
+            return super().set_frame_indices(start, stop, step)
+        # open ended until the export reaches the end of the stream
+        assert 0 <= start, "Start frame index out of range"
+        self._frame_range = (start, stop if stop > 0 else None, step)
+        self.frame_indices = []
+        return self.frame_indices
+
+    def frame_chunks(self, chunk_size: int):
+        if self._frame_range is None:
+            return super().frame_chunks(chunk_size)
+        return self._open_frame_chunks(chunk_size)
+
+    def _open_frame_chunks(self, chunk_size: int):
+        start, stop, step = self._frame_range
+        chunk_start = start
+        while stop is None or chunk_start < stop:
+            chunk_stop = chunk_start + chunk_size * step
+            if stop is not None:
+                chunk_stop = min(chunk_stop, stop)
+            frame_indices = np.arange(chunk_start, chunk_stop, step)
+            if self._num_frames is not None:
+                frame_indices = frame_indices[frame_indices < self._num_frames]
+            if len(frame_indices) == 0:
+                break
+            yield frame_indices
+            chunk_start = chunk_stop
+
+    def convert_frames(self, frames: np.ndarray) -> np.ndarray:
+        # scale and cast a whole batch at once, float32 keeps millimeter precision
+        if self.pixel_scale != 1:
+            frames = np.multiply(frames, self.pixel_scale, dtype=np.float32)
+        return frames.astype(self.output_dtype, copy=False)
+
+    def read_frames(self, frame_indices: list, truncate: bool = False) -> np.ndarray:
+        """
+        Raw frames of the stream, in input dtype. Reading in increasing order
+        never inflates the same data twice. With truncate, increasing
+        frame_indices past the end of the stream are dropped instead of raising.
+        """
+        frame_indices = np.asarray(frame_indices, dtype=np.int64)
+        frames = np.empty(
+            (len(frame_indices), self.height, self.width), dtype=self.input_dtype
+        )
+        for n, i in enumerate(np.argsort(frame_indices, kind="stable")):
+            self.stream.seek(int(frame_indices[i]) * self.frame_size)
+            data = self.stream.read(self.frame_size)
+            if len(data) < self.frame_size:
+                self._update_num_frames()
+                if truncate:
+                    return frames[:n]
+                raise IndexError(f"Frame {frame_indices[i]} is out of range")
+            frames[i] = np.frombuffer(data, dtype=self.input_dtype).reshape(
+                self.height, self.width
+            )
+        return frames
+
+    def frames_array(self) -> np.ndarray:
+        """
+        All output frames as a read-only memory map, inflated on first use.
+        """
+        if self._array is not None:
+            return self._array
+
+        array_path = self.array_path
+        if array_path is None:
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            folder = tempfile.mkdtemp(dir=self.tmp_dir)
+            # removed by close, or when the decoder is garbage collected
+            self._cleanup = weakref.finalize(self, shutil.rmtree, folder, True)
+            array_path = os.path.join(folder, os.path.basename(self.input) + ".npy")
+
+        # single pass, the array grows while inflating and is truncated at the end
+        # of the stream, where the npy header gets the final frame count
+        frame_shape = (self.height, self.width)
+        frame_bytes = self.height * self.width * np.dtype(self.output_dtype).itemsize
+        with open(array_path, "wb") as f:
+            f.write(_npy_header(self.output_dtype, (0,) + frame_shape))
+        output = None
+        capacity = num_frames = 0
+        batch_bytes = max(self.chunk_size, 1) * self.frame_size
+        self.stream.seek(0)
+        while True:
+            data = self.stream.read(batch_bytes)
+            count = len(data) // self.frame_size
+            if count > 0:
+                if num_frames + count > capacity:
+                    if output is not None:
+                        output.flush()
+                    capacity = max(2 * capacity, num_frames + count)
+                    os.truncate(array_path, _NPY_HEADER_SIZE + capacity * frame_bytes)
+                    output = np.memmap(
+                        array_path,
+                        dtype=self.output_dtype,
+                        mode="r+",
+                        offset=_NPY_HEADER_SIZE,
+                        shape=(capacity,) + frame_shape,
+                    )
+                frames = np.frombuffer(
+                    data, dtype=self.input_dtype, count=count * self.height * self.width
+                )
+                output[num_frames : num_frames + count] = self.convert_frames(
+                    frames.reshape((count,) + frame_shape)
+                )
+                num_frames += count
+            if len(data) < batch_bytes:
+                break
+        if output is not None:
+            output.flush()
+            del output
+        os.truncate(array_path, _NPY_HEADER_SIZE + num_frames * frame_bytes)
+        with open(array_path, "r+b") as f:
+            f.write(_npy_header(self.output_dtype, (num_frames,) + frame_shape))
+        self.stream.close()
+        self._stream = None
+
+        self._array = np.load(array_path, mmap_mode="r")
+        self._num_frames = len(self._array)
+        return self._array
 
     def get_batch_frames(self, frame_indices: list):
-        frames = []
-        for i in frame_indices:
-            fp = np.memmap(
-                self._uncompressed_input,
-                dtype=self.input_dtype,
-                mode="r",
-                shape=(self.height, self.width),
-                offset=self.frame_size * i,
-            ).copy()
-            if self.pixel_scale != 1:
-                fp *= self.pixel_scale
-            if self.output_dtype == self.input_dtype:
-                fp = fp.astype(self.output_dtype)
-            frames.append(fp)
-        return np.asarray(frames)
-
-    def _export_impl(
-        self, output: str, format: str, frame_param: dict, frame_indices: list
-    ):
-        frames = self.get_batch_frames(frame_indices)
-        export_frames(
-            frames, output, frame_param, frame_indices, format, self.num_workers
+        if self.mode == "memmap":
+            return np.asarray(self.frames_array()[np.asarray(frame_indices)])
+        return self.convert_frames(
+            self.read_frames(frame_indices, truncate=self._frame_range is not None)
         )
 
+    def _export_impl(self, exporter: FrameExporter, frame_indices: list):
+        frames = self.get_batch_frames(frame_indices)
+        exporter.submit_frames(frames, frame_indices[: len(frames)])
+
 
 class DecoderConfidence(DecoderDepth):
     def __init__(self, input: str, *args, **kwargs):
@@ -208,13 +443,12 @@ class DecoderCamera(DecoderBase):
         cameras = np.asarray(cameras)
         return cameras
 
-    def _export_impl(
-        self, output: str, format: str, frame_param: dict, frame_indices: list
-    ):
-        cameras = self.get_cameras(frame_indices)
-        export_cameras(
-            cameras, output, frame_param, frame_indices, format, self.num_workers
-        )
+    @property
+    def export_function(self):
+        return export_camera
+
+    def _export_impl(self, exporter: FrameExporter, frame_indices: list):
+        exporter.submit_items(self.get_cameras(frame_indices), frame_indices)
 
 
 class Decoder(object):
@@ -3,9 +3,14 @@ from __future__ import annotations
 import os
 import numpy as np
 from PIL import Image
+from collections import deque
 from dataclasses import dataclass, field
 from functools import partial
-from tqdm.contrib.concurrent import process_map
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+
+# shared memory and export settings of an exporter worker process
+_WORKER = None
 
 
 @dataclass
@@ -66,62 +71,153 @@ def export_camera(
     camera_data.export(output_path)
 
 
-def export_frames(
-    frames: list,
-    output_dir: str,
-    frame_param: dict,
-    frame_indices: list,
-    format: str,
-    num_workers: int,
+def _init_exporter_worker(
+    shm_name: str, func, output_dir: str, frame_param: dict, format: str
 ):
-    export_data(
-        export_frame,
-        frames,
-        output_dir,
-        frame_param,
-        frame_indices,
-        format,
-        num_workers,
-    )
-
-
-def export_cameras(
-    cameras: list,
-    output_dir: str,
-    frame_param: dict,
-    frame_indices: list,
-    format: str,
-    num_workers: int,
-):
-    export_data(
-        export_camera,
-        cameras,
-        output_dir,
-        frame_param,
-        frame_indices,
-        format,
-        num_workers,
-    )
-
-
-def export_data(
-    func,
-    data: list,
-    output_dir: str,
-    frame_param: dict,
-    frame_indices: list,
-    format: str,
-    num_workers: int,
-):
-    if num_workers != 1:
-        process_map(
-            partial(
-                func, output_dir=output_dir, frame_param=frame_param, format=format
+    global _WORKER
+    shm = shared_memory.SharedMemory(name=shm_name) if shm_name else None
+    _WORKER = {
+        "shm": shm,
+        "func": partial(
+            func, output_dir=output_dir, frame_param=frame_param, format=format
+        ),
+    }
+
+
+def _export_shared_frame(offset: int, shape: tuple, dtype: str, frame_index: int):
+    frame = np.ndarray(shape, dtype=dtype, buffer=_WORKER["shm"].buf, offset=offset)
+    _WORKER["func"]((frame, frame_index))
+
+
+def _export_item(item: tuple):
+    _WORKER["func"](item)
+
+
+class FrameExporter:
+    """
+    Producer/consumer exporter that encodes frames on a persistent process pool.
+
+    The caller decodes frames and submits them in order. Frame arrays are copied
+    into slots of one shared memory block instead of being pickled, at most
+    max_in_flight frames are queued, submitting blocks until the oldest one is
+    written. Other items, e.g. cameras, are pickled to the workers.
+    """
+
+    def __init__(
+        self,
+        func,
+        output_dir: str,
+        frame_param: dict,
+        format: str,
+        num_workers: int = 1,
+        max_in_flight: int = None,
+    ):
+        self.func = func
+        self.output_dir = output_dir
+        self.frame_param = frame_param
+        self.format = format
+        self.num_workers = num_workers
+        self.max_in_flight = (
+            max_in_flight if max_in_flight is not None else 4 * max(num_workers, 1)
+        )
+        self._executor = None
+        self._shm = None
+        self._slot_size = 0
+        self._free_slots = deque()
+        # (future, slot) in submission order
+        self._pending = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _start(self, frame: np.ndarray = None):
+        shm_name = None
+        if frame is not None:
+            self._slot_size = frame.nbytes
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=max(self._slot_size * self.max_in_flight, 1)
+            )
+            self._free_slots.extend(range(self.max_in_flight))
+            shm_name = self._shm.name
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            initializer=_init_exporter_worker,
+            initargs=(
+                shm_name,
+                self.func,
+                self.output_dir,
+                self.frame_param,
+                self.format,
             ),
-            zip(data, frame_indices),
-            disable=True,
-            max_workers=num_workers,
         )
-    else:
-        for data_i in zip(data, frame_indices):
-            func(data_i, output_dir, frame_param, format)
+
+    def _wait_oldest(self):
+        future, slot = self._pending.popleft()
+        future.result()
+        if slot is not None:
+            self._free_slots.append(slot)
+
+    def submit_frame(self, frame: np.ndarray, frame_index: int):
+        if self.num_workers <= 1:
+            self.submit_item((frame, frame_index))
+            return
+        frame = np.ascontiguousarray(frame)
+        if self._executor is None:
+            self._start(frame)
+        if self._shm is None or frame.nbytes > self._slot_size:
+            # frames of an other size than the first one are pickled
+            self.submit_item((frame, frame_index))
+            return
+
+        while not self._free_slots:
+            self._wait_oldest()
+        slot = self._free_slots.popleft()
+        offset = slot * self._slot_size
+        shared = np.ndarray(
+            frame.shape, frame.dtype, buffer=self._shm.buf, offset=offset
+        )
+        shared[...] = frame
+        del shared
+        future = self._executor.submit(
+            _export_shared_frame, offset, frame.shape, frame.dtype.str, frame_index
+        )
+        self._pending.append((future, slot))
+
+    def submit_item(self, item: tuple):
+        if self.num_workers <= 1:
+            self.func(item, self.output_dir, self.frame_param, self.format)
+            return
+        if self._executor is None:
+            self._start()
+        while len(self._pending) >= self.max_in_flight:
+            self._wait_oldest()
+        self._pending.append((self._executor.submit(_export_item, item), None))
+
+    def submit_frames(self, frames, frame_indices: list):
+        for frame, frame_index in zip(frames, frame_indices):
+            self.submit_frame(frame, frame_index)
+
+    def submit_items(self, items, frame_indices: list):
+        for item, frame_index in zip(items, frame_indices):
+            self.submit_item((item, frame_index))
+
+    def join(self):
+        while self._pending:
+            self._wait_oldest()
+
+    def close(self):
+        try:
+            self.join()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+                self._shm = None
+            self._free_slots.clear()
+            self._pending.clear()
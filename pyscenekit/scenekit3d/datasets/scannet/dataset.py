@@ -1,5 +1,6 @@
 import os
 from natsort import natsorted
+from pyscenekit.scenekit3d.datasets.scene_index import SceneIndex
 from pyscenekit.scenekit3d.datasets.scannet.frame import ScanNetFrameDataset
 
 
@@ -36,19 +37,35 @@ class ScanNetDataset:
         `-- scan_id_vh_clean_2.ply
     """
 
-    def __init__(self, data_dir: str):
+    def __init__(self, data_dir: str, index: SceneIndex = None):
         self.data_dir = data_dir
+        # with an index scenes are listed and opened without touching data_dir
+        self.index = index
         self.scenes_ids = self.get_scenes_ids()
         self.current_scene_id = None
+        self.current_record = None
         self.frame_dataset = None
         self.mesh_dataset = None
 
     def _update(self):
         self.frame_dataset = ScanNetFrameDataset(
-            self.current_scene_id, self.current_scene_path
+            self.current_scene_id, self.current_scene_path, record=self.current_record
         )
 
+    def query_scenes(
+        self, modality: str, min_frames: int = None, max_frames: int = None
+    ):
+        """
+        Scenes with a modality such as "sens" or "color" and a frame count in
+        [min_frames, max_frames], answered by the index.
+        """
+        if self.index is None:
+            raise ValueError("query_scenes needs a SceneIndex, pass index=")
+        return self.index.scenes(modality, min_frames, max_frames)
+
     def get_scenes_ids(self):
+        if self.index is not None:
+            return self.index.scenes()
         folders = os.listdir(self.data_dir)
         return natsorted(
             [
@@ -61,13 +78,15 @@ class ScanNetDataset:
     def set_scene_id_by_index(self, index: int):
         assert index < len(self.scenes_ids), "Index out of scenes ids range"
         self.set_scene_id(self.scenes_ids[index])
-        self._update()
 
     def set_scene_id(self, scene_id: str):
         # check if scene_id is in scenes_ids
         if scene_id not in self.scenes_ids:
             raise ValueError(f"Scene {scene_id} not found in {self.data_dir}")
         self.current_scene_id = scene_id
+        self.current_record = (
+            self.index.record(scene_id) if self.index is not None else None
+        )
         self._update()
 
     @property
@@ -1,11 +1,14 @@
 import os
 import cv2
+import mmap
 import struct
 import numpy as np
 import zlib
 import imageio
-import png
 from tqdm import tqdm
+from functools import partial
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from pyscenekit.utils.common import log, read_json
 
@@ -17,6 +20,20 @@ COMPRESSION_TYPE_DEPTH = {
     2: "occi_ushort",
 }
 
+# per frame header: camera_to_world (16 float32), timestamp_color, timestamp_depth,
+# color_size_bytes and depth_size_bytes (uint64), followed by the color and depth data
+FRAME_HEADER_STRUCT = struct.Struct("<16f4Q")
+FRAME_INDEX_DTYPE = np.dtype(
+    [
+        ("camera_to_world", "<f4", (16,)),
+        ("timestamp_color", "<u8"),
+        ("timestamp_depth", "<u8"),
+        ("color_size_bytes", "<u8"),
+        ("depth_size_bytes", "<u8"),
+        ("color_offset", "<u8"),
+    ]
+)
+
 
 # reference: https://github.com/ScanNet/ScanNet/blob/master/SensReader/python/SensorData.py
 class RGBDFrame:
@@ -28,16 +45,22 @@ class RGBDFrame:
         self.timestamp_depth = struct.unpack("Q", file_handle.read(8))[0]
         self.color_size_bytes = struct.unpack("Q", file_handle.read(8))[0]
         self.depth_size_bytes = struct.unpack("Q", file_handle.read(8))[0]
-        self.color_data = b"".join(
-            struct.unpack(
-                "c" * self.color_size_bytes, file_handle.read(self.color_size_bytes)
-            )
-        )
-        self.depth_data = b"".join(
-            struct.unpack(
-                "c" * self.depth_size_bytes, file_handle.read(self.depth_size_bytes)
-            )
-        )
+        self.color_data = file_handle.read(self.color_size_bytes)
+        self.depth_data = file_handle.read(self.depth_size_bytes)
+
+    @classmethod
+    def from_buffer(cls, buffer, entry: np.void):
+        frame = cls()
+        frame.camera_to_world = entry["camera_to_world"].reshape(4, 4).copy()
+        frame.timestamp_color = int(entry["timestamp_color"])
+        frame.timestamp_depth = int(entry["timestamp_depth"])
+        frame.color_size_bytes = int(entry["color_size_bytes"])
+        frame.depth_size_bytes = int(entry["depth_size_bytes"])
+        color_offset = int(entry["color_offset"])
+        depth_offset = color_offset + frame.color_size_bytes
+        frame.color_data = buffer[color_offset:depth_offset]
+        frame.depth_data = buffer[depth_offset : depth_offset + frame.depth_size_bytes]
+        return frame
 
     def decompress_depth(self, compression_type):
         if compression_type == "zlib_ushort":
@@ -58,91 +81,333 @@ class RGBDFrame:
         return imageio.imread(self.color_data)
 
 
+class SensorFrames:
+    """
+    Random-access list of RGBDFrame backed by a memory-mapped .sens file.
+
+    Only the frames that are indexed are read from disk. The object can be
+    pickled, the memory map is reopened lazily in the new process.
+    """
+
+    def __init__(self, filename: str, index: np.ndarray):
+        self.filename = filename
+        self.index = index
+        self._file = None
+        self._buffer = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> RGBDFrame:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return RGBDFrame.from_buffer(self.buffer, self.index[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def buffer(self) -> mmap.mmap:
+        if self._buffer is None:
+            self._file = open(self.filename, "rb")
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._buffer
+
+    @property
+    def camera_to_world(self) -> np.ndarray:
+        return self.index["camera_to_world"].reshape(-1, 4, 4)
+
+    def close(self):
+        if self._buffer is not None:
+            self._buffer.close()
+            self._file.close()
+        self._buffer = None
+        self._file = None
+
+    def __getstate__(self):
+        return {"filename": self.filename, "index": self.index}
+
+    def __setstate__(self, state):
+        self.__init__(state["filename"], state["index"])
+
+    def __del__(self):
+        self.close()
+
+
+_worker_frames = None
+
+
+def _init_export_worker(frames):
+    global _worker_frames
+    _worker_frames = frames
+
+
+def _run_export_task(task, frame_index):
+    return task(_worker_frames, frame_index)
+
+
+def export_depth_frame(
+    frames, frame_index, output_path, compression_type, depth_shape, image_size=None
+):
+    depth_data = frames[frame_index].decompress_depth(compression_type)
+    depth = np.frombuffer(depth_data, dtype=np.uint16).reshape(depth_shape)
+    if image_size is not None:
+        depth = cv2.resize(
+            depth,
+            (image_size[1], image_size[0]),
+            interpolation=cv2.INTER_NEAREST,
+        )
+    # cv2 writes 16-bit png directly from the uint16 array
+    cv2.imwrite(os.path.join(output_path, str(frame_index) + ".png"), depth)
+
+
+def export_color_frame(
+    frames, frame_index, output_path, compression_type, image_size=None
+):
+    frame = frames[frame_index]
+    output_file = os.path.join(output_path, str(frame_index) + ".jpg")
+    if image_size is None and compression_type == "jpeg":
+        # the stream already holds jpeg data, write it without re-encoding
+        with open(output_file, "wb") as f:
+            f.write(frame.color_data)
+        return
+
+    color = frame.decompress_color(compression_type)
+    if image_size is not None:
+        color = cv2.resize(
+            color,
+            (image_size[1], image_size[0]),
+            interpolation=cv2.INTER_NEAREST,
+        )
+    cv2.imwrite(output_file, cv2.cvtColor(color, cv2.COLOR_RGB2BGR))
+
+
+def hdf5_compression_kwargs(compression, compression_level=4):
+    if compression in (None, "none"):
+        return {}
+    if compression == "lzf":
+        return {"compression": "lzf"}
+    if compression == "gzip":
+        return {"compression": "gzip", "compression_opts": compression_level}
+    if compression == "blosc":
+        try:
+            import hdf5plugin
+        except ImportError:
+            log.warning("hdf5plugin is not installed, falling back to lzf compression")
+            return {"compression": "lzf"}
+        return dict(
+            hdf5plugin.Blosc(
+                cname="lz4",
+                clevel=compression_level,
+                shuffle=hdf5plugin.Blosc.SHUFFLE,
+            )
+        )
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def encode_hdf5_chunk(
+    frames,
+    frame_indices,
+    color_compression_type,
+    depth_compression_type,
+    depth_shape,
+    chunk_frames,
+    compression_level=None,
+):
+    color = []
+    depth = []
+    for frame_index in frame_indices:
+        frame = frames[frame_index]
+        color.append(frame.decompress_color(color_compression_type))
+        depth_data = frame.decompress_depth(depth_compression_type)
+        depth.append(np.frombuffer(depth_data, dtype=np.uint16).reshape(depth_shape))
+    color = np.stack(color)
+    depth = np.stack(depth)
+    if compression_level is None:
+        return color, depth
+
+    # hdf5 stores edge chunks at full size, pad them before deflating
+    pad = chunk_frames - len(frame_indices)
+    if pad > 0:
+        color = np.concatenate([color, np.zeros((pad, *color.shape[1:]), color.dtype)])
+        depth = np.concatenate([depth, np.zeros((pad, *depth.shape[1:]), depth.dtype)])
+    return (
+        zlib.compress(np.ascontiguousarray(color).tobytes(), compression_level),
+        zlib.compress(np.ascontiguousarray(depth).tobytes(), compression_level),
+    )
+
+
 # reference: https://github.com/ScanNet/ScanNet/blob/master/SensReader/python/SensorData.py
+def read_sens_header(filename):
+    # header of a .sens file, everything before the frames
+    header = {}
+    with open(filename, "rb") as f:
+        header["version"] = struct.unpack("I", f.read(4))[0]
+        strlen = struct.unpack("Q", f.read(8))[0]
+        header["sensor_name"] = b"".join(struct.unpack("c" * strlen, f.read(strlen)))
+        for key in (
+            "intrinsic_color",
+            "extrinsic_color",
+            "intrinsic_depth",
+            "extrinsic_depth",
+        ):
+            header[key] = np.asarray(
+                struct.unpack("f" * 16, f.read(16 * 4)), dtype=np.float32
+            ).reshape(4, 4)
+        header["color_compression_type"] = COMPRESSION_TYPE_COLOR[
+            struct.unpack("i", f.read(4))[0]
+        ]
+        header["depth_compression_type"] = COMPRESSION_TYPE_DEPTH[
+            struct.unpack("i", f.read(4))[0]
+        ]
+        header["color_width"] = struct.unpack("I", f.read(4))[0]
+        header["color_height"] = struct.unpack("I", f.read(4))[0]
+        header["depth_width"] = struct.unpack("I", f.read(4))[0]
+        header["depth_height"] = struct.unpack("I", f.read(4))[0]
+        header["depth_shift"] = struct.unpack("f", f.read(4))[0]
+        header["num_frames"] = struct.unpack("Q", f.read(8))[0]
+        header["frames_offset"] = f.tell()
+    return header
+
+
 class SensorData:
-    def __init__(self, filename):
+    def __init__(self, filename, cache_index=True):
         self.version = 4
+        self.filename = filename
         self.scene_id = os.path.basename(filename).split(".")[0]
+        self.cache_index = cache_index
         self.load(filename)
 
+    @property
+    def index_path(self):
+        return self.filename + ".index.npz"
+
+    def close(self):
+        self.frames.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def load(self, filename):
+        header = read_sens_header(filename)
+        assert self.version == header["version"]
+        self.sensor_name = header["sensor_name"]
+        self.intrinsic_color = header["intrinsic_color"]
+        self.extrinsic_color = header["extrinsic_color"]
+        self.intrinsic_depth = header["intrinsic_depth"]
+        self.extrinsic_depth = header["extrinsic_depth"]
+        self.color_compression_type = header["color_compression_type"]
+        self.depth_compression_type = header["depth_compression_type"]
+        self.color_width = header["color_width"]
+        self.color_height = header["color_height"]
+        self.depth_width = header["depth_width"]
+        self.depth_height = header["depth_height"]
+        self.depth_shift = header["depth_shift"]
+        num_frames = header["num_frames"]
+        frames_offset = header["frames_offset"]
+
+        index = self.load_frame_index(num_frames) if self.cache_index else None
+        if index is None:
+            index = self.build_frame_index(filename, frames_offset, num_frames)
+            if self.cache_index:
+                self.save_frame_index(index)
+        self.frames = SensorFrames(filename, index)
+
+    @staticmethod
+    def build_frame_index(filename, frames_offset, num_frames):
+        # walk the frame headers only, the compressed images are skipped over
+        index = np.zeros(num_frames, dtype=FRAME_INDEX_DTYPE)
         with open(filename, "rb") as f:
-            version = struct.unpack("I", f.read(4))[0]
-            assert self.version == version
-            strlen = struct.unpack("Q", f.read(8))[0]
-            self.sensor_name = b"".join(struct.unpack("c" * strlen, f.read(strlen)))
-            self.intrinsic_color = np.asarray(
-                struct.unpack("f" * 16, f.read(16 * 4)), dtype=np.float32
-            ).reshape(4, 4)
-            self.extrinsic_color = np.asarray(
-                struct.unpack("f" * 16, f.read(16 * 4)), dtype=np.float32
-            ).reshape(4, 4)
-            self.intrinsic_depth = np.asarray(
-                struct.unpack("f" * 16, f.read(16 * 4)), dtype=np.float32
-            ).reshape(4, 4)
-            self.extrinsic_depth = np.asarray(
-                struct.unpack("f" * 16, f.read(16 * 4)), dtype=np.float32
-            ).reshape(4, 4)
-            self.color_compression_type = COMPRESSION_TYPE_COLOR[
-                struct.unpack("i", f.read(4))[0]
-            ]
-            self.depth_compression_type = COMPRESSION_TYPE_DEPTH[
-                struct.unpack("i", f.read(4))[0]
-            ]
-            self.color_width = struct.unpack("I", f.read(4))[0]
-            self.color_height = struct.unpack("I", f.read(4))[0]
-            self.depth_width = struct.unpack("I", f.read(4))[0]
-            self.depth_height = struct.unpack("I", f.read(4))[0]
-            self.depth_shift = struct.unpack("f", f.read(4))[0]
-            num_frames = struct.unpack("Q", f.read(8))[0]
-            self.frames = []
-            for i in range(num_frames):
-                frame = RGBDFrame()
-                frame.load(f)
-                self.frames.append(frame)
-
-    def export_depth_images(self, output_path, image_size=None, frame_skip=1):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                offset = frames_offset
+                for i in range(num_frames):
+                    header = FRAME_HEADER_STRUCT.unpack_from(buffer, offset)
+                    offset += FRAME_HEADER_STRUCT.size
+                    index[i]["camera_to_world"] = header[:16]
+                    index[i]["timestamp_color"] = header[16]
+                    index[i]["timestamp_depth"] = header[17]
+                    index[i]["color_size_bytes"] = header[18]
+                    index[i]["depth_size_bytes"] = header[19]
+                    index[i]["color_offset"] = offset
+                    offset += header[18] + header[19]
+        return index
+
+    def _file_signature(self):
+        stat = os.stat(self.filename)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def load_frame_index(self, num_frames):
+        if not os.path.isfile(self.index_path):
+            return None
+        with np.load(self.index_path) as data:
+            if not np.array_equal(data["signature"], self._file_signature()):
+                return None
+            index = data["index"]
+        if len(index) != num_frames:
+            return None
+        return index
+
+    def save_frame_index(self, index):
+        try:
+            np.savez(
+                self.index_path, index=index, signature=self._file_signature()
+            )
+        except OSError as e:
+            log.warning(f"Could not cache frame index to {self.index_path}: {e}")
+
+    def _run_export(self, task, frame_indices, num_workers=1, desc="export"):
+        if num_workers <= 1:
+            for f in tqdm(frame_indices, desc=desc):
+                task(self.frames, f)
+            return
+
+        # workers receive the lazy frame index once and memory-map the .sens file themselves
+        chunksize = max(1, len(frame_indices) // (num_workers * 8))
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_export_worker,
+            initargs=(self.frames,),
+        ) as executor:
+            results = executor.map(
+                partial(_run_export_task, task), frame_indices, chunksize=chunksize
+            )
+            for _ in tqdm(results, total=len(frame_indices), desc=desc):
+                pass
+
+    def export_depth_images(
+        self, output_path, image_size=None, frame_skip=1, num_workers=1
+    ):
         if not os.path.exists(output_path):
             os.makedirs(output_path)
-        print(
-            "exporting", len(self.frames) // frame_skip, " depth frames to", output_path
+        frame_indices = range(0, len(self.frames), frame_skip)
+        print("exporting", len(frame_indices), " depth frames to", output_path)
+        task = partial(
+            export_depth_frame,
+            output_path=output_path,
+            compression_type=self.depth_compression_type,
+            depth_shape=(self.depth_height, self.depth_width),
+            image_size=image_size,
         )
-        for f in range(0, len(self.frames), frame_skip):
-            depth_data = self.frames[f].decompress_depth(self.depth_compression_type)
-            depth = np.fromstring(depth_data, dtype=np.uint16).reshape(
-                self.depth_height, self.depth_width
-            )
-            if image_size is not None:
-                depth = cv2.resize(
-                    depth,
-                    (image_size[1], image_size[0]),
-                    interpolation=cv2.INTER_NEAREST,
-                )
-            # imageio.imwrite(os.path.join(output_path, str(f) + '.png'), depth)
-            with open(
-                os.path.join(output_path, str(f) + ".png"), "wb"
-            ) as f:  # write 16-bit
-                writer = png.Writer(
-                    width=depth.shape[1], height=depth.shape[0], bitdepth=16
-                )
-                depth = depth.reshape(-1, depth.shape[1]).tolist()
-                writer.write(f, depth)
-
-    def export_color_images(self, output_path, image_size=None, frame_skip=1):
+        self._run_export(task, frame_indices, num_workers, desc="export_depth")
+
+    def export_color_images(
+        self, output_path, image_size=None, frame_skip=1, num_workers=1
+    ):
         if not os.path.exists(output_path):
             os.makedirs(output_path)
-        print(
-            "exporting", len(self.frames) // frame_skip, "color frames to", output_path
+        frame_indices = range(0, len(self.frames), frame_skip)
+        print("exporting", len(frame_indices), "color frames to", output_path)
+        task = partial(
+            export_color_frame,
+            output_path=output_path,
+            compression_type=self.color_compression_type,
+            image_size=image_size,
         )
-        for f in range(0, len(self.frames), frame_skip):
-            color = self.frames[f].decompress_color(self.color_compression_type)
-            if image_size is not None:
-                color = cv2.resize(
-                    color,
-                    (image_size[1], image_size[0]),
-                    interpolation=cv2.INTER_NEAREST,
-                )
-            imageio.imwrite(os.path.join(output_path, str(f) + ".jpg"), color)
+        self._run_export(task, frame_indices, num_workers, desc="export_color")
 
     def save_mat_to_file(self, matrix, filename):
         with open(filename, "w") as f:
@@ -152,13 +417,13 @@ class SensorData:
     def export_poses(self, output_path, frame_skip=1):
         if not os.path.exists(output_path):
             os.makedirs(output_path)
-        print(
-            "exporting", len(self.frames) // frame_skip, "camera poses to", output_path
-        )
-        for f in range(0, len(self.frames), frame_skip):
+        frame_indices = range(0, len(self.frames), frame_skip)
+        print("exporting", len(frame_indices), "camera poses to", output_path)
+        # poses are stored in the frame index, no frame data is read
+        camera_to_world = self.frames.camera_to_world
+        for f in frame_indices:
             self.save_mat_to_file(
-                self.frames[f].camera_to_world,
-                os.path.join(output_path, str(f) + ".txt"),
+                camera_to_world[f], os.path.join(output_path, str(f) + ".txt")
             )
 
     def export_intrinsics(self, output_path):
@@ -178,10 +443,48 @@ class SensorData:
             self.extrinsic_depth, os.path.join(output_path, "extrinsic_depth.txt")
         )
 
-    def export_as_hdf5(self, output_path, skip_step=10):
+    def _imap_frames(self, task, items, num_workers=1):
+        if num_workers <= 1:
+            for item in items:
+                yield task(self.frames, item)
+            return
+
+        # keep a bounded number of tasks in flight so results are written as they arrive
+        max_pending = num_workers * 2
+        with ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_export_worker,
+            initargs=(self.frames,),
+        ) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(_run_export_task, task, item))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def export_as_hdf5(
+        self,
+        output_path,
+        skip_step=10,
+        compression="gzip",
+        compression_level=4,
+        chunk_frames=4,
+        num_workers=1,
+    ):
         import h5py
 
+        compression_kwargs = hdf5_compression_kwargs(compression, compression_level)
+        # gzip chunks are deflated in the workers and written past the filter
+        direct_gzip = compression == "gzip"
+
         num_frames = len(self.frames)
+        f_indices = np.arange(0, num_frames, skip_step).astype(np.int32)
+        color_shape = (self.color_height, self.color_width, 3)
+        depth_shape = (self.depth_height, self.depth_width)
+        chunk_frames = max(1, min(chunk_frames, len(f_indices)))
+
         with h5py.File(output_path, "w") as f:
             f.attrs["scene_id"] = self.scene_id
             f.attrs["total_frames"] = num_frames
@@ -189,77 +492,157 @@ class SensorData:
             f.attrs["color_height"] = self.color_height
             f.attrs["depth_width"] = self.depth_width
             f.attrs["depth_height"] = self.depth_height
+            f.attrs["depth_shift"] = self.depth_shift
             f.attrs["skip_step"] = skip_step
-            f.create_dataset(
-                "color_intrinsic",
-                data=self.intrinsic_color,
-                shape=self.intrinsic_color.shape,
-            )
-            f.create_dataset(
-                "color_extrinsic",
-                data=self.extrinsic_color,
-                shape=self.extrinsic_color.shape,
-            )
-            f.create_dataset(
-                "depth_intrinsic",
-                data=self.intrinsic_depth,
-                shape=self.intrinsic_depth.shape,
+            f.attrs["num_frames"] = len(f_indices)
+            f.attrs["compression"] = str(compression)
+            f.create_dataset("color_intrinsic", data=self.intrinsic_color)
+            f.create_dataset("color_extrinsic", data=self.extrinsic_color)
+            f.create_dataset("depth_intrinsic", data=self.intrinsic_depth)
+            f.create_dataset("depth_extrinsic", data=self.extrinsic_depth)
+            f.create_dataset("frame_indices", data=f_indices)
+            f.create_dataset("pose", data=self.frames.camera_to_world[f_indices])
+
+            color_dset = f.create_dataset(
+                "color",
+                shape=(len(f_indices), *color_shape),
+                dtype=np.uint8,
+                chunks=(chunk_frames, *color_shape),
+                **compression_kwargs,
             )
-            f.create_dataset(
-                "depth_extrinsic",
-                data=self.extrinsic_depth,
-                shape=self.extrinsic_depth.shape,
+            depth_dset = f.create_dataset(
+                "depth",
+                shape=(len(f_indices), *depth_shape),
+                dtype=np.uint16,
+                chunks=(chunk_frames, *depth_shape),
+                **compression_kwargs,
             )
 
-            f_indices = np.arange(0, num_frames, skip_step).astype(np.int32)
-            f.create_dataset(
-                "frame_indices",
-                data=f_indices,
-                shape=f_indices.shape,
-                compression="gzip",
+            task = partial(
+                encode_hdf5_chunk,
+                color_compression_type=self.color_compression_type,
+                depth_compression_type=self.depth_compression_type,
+                depth_shape=depth_shape,
+                chunk_frames=chunk_frames,
+                compression_level=compression_level if direct_gzip else None,
             )
-            f.attrs["num_frames"] = len(f_indices)
-
-            log.info(f"Exporting {len(f_indices)} frames to {output_path}")
-            for i in tqdm(f_indices):
-                frame = self.frames[i]
-                h5group = f.create_group(f"frame_{i}")
-
-                color = frame.decompress_color(self.color_compression_type)
-                depth_data = frame.decompress_depth(self.depth_compression_type)
-                depth = np.fromstring(depth_data, dtype=np.uint16).reshape(
-                    self.depth_height, self.depth_width
-                )
+            chunks = [
+                f_indices[i : i + chunk_frames]
+                for i in range(0, len(f_indices), chunk_frames)
+            ]
 
-                pose = frame.camera_to_world
+            log.info(
+                f"Exporting {len(f_indices)} frames to {output_path} "
+                f"with {compression} compression"
+            )
+            start = 0
+            for color, depth in tqdm(
+                self._imap_frames(task, chunks, num_workers), total=len(chunks)
+            ):
+                if direct_gzip:
+                    color_dset.id.write_direct_chunk((start, 0, 0, 0), color)
+                    depth_dset.id.write_direct_chunk((start, 0, 0), depth)
+                    start += chunk_frames
+                else:
+                    color_dset[start : start + len(color)] = color
+                    depth_dset[start : start + len(depth)] = depth
+                    start += len(color)
+
+
+class SensorDataHDF5:
+    """
+    Reader for the stacked HDF5 layout written by SensorData.export_as_hdf5.
+
+    Indexing with an int returns a single frame, indexing with a contiguous
+    slice reads the whole frame window with one read per dataset.
+    """
+
+    def __init__(self, filename: str):
+        import h5py
 
-                h5group.create_dataset(
-                    "color", data=color, shape=color.shape, compression="gzip"
-                )
-                h5group.create_dataset(
-                    "depth", data=depth, shape=depth.shape, compression="gzip"
-                )
-                h5group.create_dataset(
-                    "pose", data=pose, shape=pose.shape, compression="gzip"
-                )
+        try:
+            # registers the blosc filter if the file was written with it
+            import hdf5plugin  # noqa: F401
+        except ImportError:
+            pass
+
+        self.filename = filename
+        self.file = h5py.File(filename, "r")
+        self.scene_id = self.file.attrs["scene_id"]
+        self.depth_shift = float(self.file.attrs.get("depth_shift", 1000.0))
+        self.color = self.file["color"]
+        self.depth = self.file["depth"]
+        self.pose = self.file["pose"][()]
+        self.frame_indices = self.file["frame_indices"][()]
+        self.intrinsic_color = self.file["color_intrinsic"][()]
+        self.extrinsic_color = self.file["color_extrinsic"][()]
+        self.intrinsic_depth = self.file["depth_intrinsic"][()]
+        self.extrinsic_depth = self.file["depth_extrinsic"][()]
+
+    def __len__(self):
+        return len(self.frame_indices)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                raise ValueError("Only contiguous slices are supported")
+            return self.read(start, stop)
+        if i < 0:
+            i += len(self)
+        frames = self.read(i, i + 1)
+        return {key: value[0] for key, value in frames.items()}
+
+    def read(self, start: int, stop: int):
+        return {
+            "color": self.color[start:stop],
+            "depth": self.depth[start:stop],
+            "pose": self.pose[start:stop],
+            "frame_index": self.frame_indices[start:stop],
+        }
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 # reference: https://github.com/scannetpp/scannetpp/blob/main/dslr/undistort.py
 class ScanNetFrameDataset:
     def __init__(
-        self, scene_id: str, data_dir: str, output_dir: str = None, read_sens=False
+        self,
+        scene_id: str,
+        data_dir: str,
+        output_dir: str = None,
+        read_sens=False,
+        record=None,
     ):
         self.scene_id = scene_id
         self.data_dir = data_dir
         self.output_dir = output_dir if output_dir is not None else data_dir
         self.image_paths = []
         self.num_images = 0
-        assert os.path.isfile(
-            self.sensfile_path
-        ), f"File {self.sensfile_path} not found"
-        self.sensor_data = None
+        # a SceneIndex record already knows whether the .sens file exists
+        exists = (
+            record.has("sens")
+            if record is not None
+            else os.path.isfile(self.sensfile_path)
+        )
+        assert exists, f"File {self.sensfile_path} not found"
+        self._sensor_data = None
         if read_sens:
-            self.sensor_data = SensorData(self.sensfile_path)
+            self._sensor_data = SensorData(self.sensfile_path)
+
+    # frames are memory-mapped on demand, opening the .sens file only reads the frame index
+    @property
+    def sensor_data(self):
+        if self._sensor_data is None:
+            self._sensor_data = SensorData(self.sensfile_path)
+        return self._sensor_data
 
     @property
     def sensfile_path(self):
@@ -285,19 +668,19 @@ class ScanNetFrameDataset:
     def intrinsics_folder(self):
         return os.path.join(self.output_dir, "intrinsic")
 
-    def extract_rgb(self, output_dir: str = None):
+    def extract_rgb(self, output_dir: str = None, num_workers: int = 4):
         if output_dir is None:
             output_dir = self.rgb_folder
         os.makedirs(output_dir, exist_ok=True)
         log.info(f"Extracting RGB images to {output_dir}")
-        self.sensor_data.export_color_images(output_dir)
+        self.sensor_data.export_color_images(output_dir, num_workers=num_workers)
 
-    def extract_depth(self, output_dir: str = None):
+    def extract_depth(self, output_dir: str = None, num_workers: int = 4):
         if output_dir is None:
             output_dir = self.depth_folder
         os.makedirs(output_dir, exist_ok=True)
         log.info(f"Extracting depth images to {output_dir}")
-        self.sensor_data.export_depth_images(output_dir)
+        self.sensor_data.export_depth_images(output_dir, num_workers=num_workers)
 
     def extract_poses(self, output_dir: str = None):
         if output_dir is None:
@@ -313,6 +696,21 @@ class ScanNetFrameDataset:
         log.info(f"Extracting intrinsics to {output_dir}")
         self.sensor_data.export_intrinsics(output_dir)
 
-    def export_as_hdf5(self):
+    def export_as_hdf5(
+        self,
+        skip_step: int = 10,
+        compression: str = "gzip",
+        compression_level: int = 4,
+        num_workers: int = 4,
+    ):
         log.info(f"Exporting {self.scene_id} to {self.hdf5_path}")
-        self.sensor_data.export_as_hdf5(self.hdf5_path)
+        self.sensor_data.export_as_hdf5(
+            self.hdf5_path,
+            skip_step=skip_step,
+            compression=compression,
+            compression_level=compression_level,
+            num_workers=num_workers,
+        )
+
+    def load_hdf5(self):
+        return SensorDataHDF5(self.hdf5_path)
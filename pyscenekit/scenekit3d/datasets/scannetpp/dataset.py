@@ -1,5 +1,7 @@
 import os
+from typing import List
 from natsort import natsorted
+from pyscenekit.scenekit3d.datasets.scene_index import SceneIndex
 from pyscenekit.scenekit3d.datasets.scannetpp.dlsr import ScanNetPPDLSRDataset
 from pyscenekit.scenekit3d.datasets.scannetpp.iphone import ScanNetPPiPhoneDataset
 from pyscenekit.scenekit3d.datasets.scannetpp.mesh import ScanNetPPMeshDataset
@@ -28,39 +30,70 @@ class ScanNetPPDataset:
         └── scans
     """
 
-    def __init__(self, data_dir: str):
+    def __init__(
+        self, data_dir: str, scenes_ids: List[str] = None, index: SceneIndex = None
+    ):
         self.data_dir = data_dir
-        self.scenes_ids = self.get_scenes_ids()
+        # with an index scenes are listed and opened without touching data_dir
+        self.index = index
+        # listing a large data dir is slow, callers that know the scenes pass them
+        self.scenes_ids = (
+            list(scenes_ids) if scenes_ids is not None else self.get_scenes_ids()
+        )
         self.current_scene_id = None
+        self.current_record = None
         self.dlsr_dataset = None
         self.iphone_dataset = None
         self.mesh_dataset = None
 
     def _update(self):
-        self.dlsr_dataset = ScanNetPPDLSRDataset(self.current_scene_dslr_path)
-        self.iphone_dataset = ScanNetPPiPhoneDataset(self.current_scene_iphone_path)
+        record = self.current_record
+        self.dlsr_dataset = ScanNetPPDLSRDataset(
+            self.current_scene_dslr_path, record=record
+        )
+        self.iphone_dataset = ScanNetPPiPhoneDataset(
+            self.current_scene_iphone_path, record=record
+        )
         self.mesh_dataset = ScanNetPPMeshDataset(self.current_scene_scans_path)
 
+    def query_scenes(
+        self, modality: str, min_frames: int = None, max_frames: int = None
+    ) -> List[str]:
+        """
+        Scenes of this dataset with a modality such as "iphone" or "dslr_images"
+        and a frame count in [min_frames, max_frames], answered by the index.
+        """
+        if self.index is None:
+            raise ValueError("query_scenes needs a SceneIndex, pass index=")
+        selected = set(self.index.scenes(modality, min_frames, max_frames))
+        return [scene_id for scene_id in self.scenes_ids if scene_id in selected]
+
     def get_scenes_ids(self):
+        if self.index is not None:
+            return self.index.scenes()
         folders = os.listdir(self.data_dir)
         return natsorted(
             [
                 folder
                 for folder in folders
-                if os.path.isdir(os.path.join(self.data_dir, folder))
+                # hidden folders hold bookkeeping such as job records
+                if not folder.startswith(".")
+                and os.path.isdir(os.path.join(self.data_dir, folder))
             ]
         )
 
     def set_scene_id_by_index(self, index: int):
         assert index < len(self.scenes_ids), "Index out of scenes ids range"
         self.set_scene_id(self.scenes_ids[index])
-        self._update()
 
     def set_scene_id(self, scene_id: str):
         # check if scene_id is in scenes_ids
         if scene_id not in self.scenes_ids:
             raise ValueError(f"Scene {scene_id} not found in {self.data_dir}")
         self.current_scene_id = scene_id
+        self.current_record = (
+            self.index.record(scene_id) if self.index is not None else None
+        )
         self._update()
 
     @property
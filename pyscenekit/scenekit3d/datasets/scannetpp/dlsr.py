@@ -3,11 +3,14 @@ import cv2
 import numpy as np
 from glob import glob
 from natsort import natsorted
+from typing import List
 from dataclasses import dataclass, field
 
 from pyscenekit.utils.common import read_json
 from pyscenekit.scenekit3d.common import SceneKitCamera
-from pyscenekit.scenekit3d.utils import qvec2rotmat
+from pyscenekit.scenekit3d.datasets.colmap import extrinsics_matrices, read_images
+from pyscenekit.scenekit3d.datasets.scene_index import SceneRecord
+from pyscenekit.scenekit3d.datasets.undistort import Undistorter
 
 
 @dataclass
@@ -25,8 +28,6 @@ class DistortionParams:
     K: np.ndarray = field(init=False)
     distortion_params: np.ndarray = field(init=False)
     new_K: np.ndarray = field(init=False)
-    map1: np.ndarray = field(init=False)
-    map2: np.ndarray = field(init=False)
 
     def compute_undistort_intrinsic(self):
         assert len(self.distortion_params.shape) == 1
@@ -48,22 +49,28 @@ class DistortionParams:
         self.K = np.array([[self.fx, 0, self.cx], [0, self.fy, self.cy], [0, 0, 1]])
         self.distortion_params = np.array([self.k1, self.k2, self.k3, self.k4])
         self.new_K = self.compute_undistort_intrinsic()
-        self.map1, self.map2 = cv2.fisheye.initUndistortRectifyMap(
-            self.K,
-            self.distortion_params,
-            np.eye(3),
-            self.new_K,
-            (self.width, self.height),
-            cv2.CV_32FC1,
-        )
 
 
 # reference: https://github.com/scannetpp/scannetpp/blob/main/dslr/undistort.py
 class ScanNetPPDLSRDataset:
-    def __init__(self, data_dir: str, output_dir: str = None, undistort=True):
+    def __init__(
+        self,
+        data_dir: str,
+        output_dir: str = None,
+        undistort=True,
+        record: SceneRecord = None,
+        target_resolution: int = 0,
+        num_workers: int = 4,
+    ):
         self.data_dir = data_dir
         self.output_dir = output_dir if output_dir is not None else data_dir
+        # SceneIndex record of the scene, replaces the globs and colmap parsing
+        self.record = record
         self.undistort = undistort
+        # width of the undistorted images, 0 keeps the DSLR resolution
+        self.target_resolution = target_resolution
+        self.num_workers = num_workers
+        self._undistorter = None
         self.image_paths = self.get_image_paths()
         self.mask_paths = self.get_mask_paths()
         self.num_images = len(self.image_paths)
@@ -92,14 +99,21 @@ class ScanNetPPDLSRDataset:
         return os.path.join(self.data_dir, "nerfstudio", "transforms.json")
 
     def get_transforms(self):
-        return read_json(self.transforms_path)
+        transforms = None
+        if self.record is not None:
+            transforms = self.record.metadata("dslr").get("transforms")
+        return transforms if transforms is not None else read_json(self.transforms_path)
 
     def get_image_paths(self):
+        if self.record is not None:
+            return self.record.frame_paths("dslr_images")
         if not os.path.exists(self.image_dir):
             return []
         return natsorted(glob(os.path.join(self.image_dir, "*.JPG")))
 
     def get_mask_paths(self):
+        if self.record is not None:
+            return self.record.frame_paths("dslr_masks")
         if not os.path.exists(self.mask_dir):
             return []
         return natsorted(glob(os.path.join(self.mask_dir, "*.png")))
@@ -130,33 +144,39 @@ class ScanNetPPDLSRDataset:
             mask = self.undistort_mask(mask)
         return mask
 
+    def get_images_by_indices(self, indices: List[int]) -> List[np.ndarray]:
+        # frames are read and undistorted on the persistent undistorter thread pool,
+        # without undistortion there are no distortion params to build it from
+        if not self.undistort:
+            return [self.get_image_by_index(index) for index in indices]
+        return self.undistorter.map(self.get_image_by_index, indices)
+
+    @property
+    def undistort_cache_dir(self):
+        return os.path.join(self.output_dir, ".undistort")
+
+    @property
+    def undistorter(self) -> Undistorter:
+        if self._undistorter is None:
+            params = self.distortion_params
+            self._undistorter = Undistorter(
+                params.K,
+                params.distortion_params,
+                params.width,
+                params.height,
+                params.new_K,
+                fisheye=True,
+                target_resolution=self.target_resolution,
+                cache_dir=self.undistort_cache_dir,
+                num_workers=self.num_workers,
+            )
+        return self._undistorter
+
     def undistort_image(self, image: np.ndarray):
-        map1, map2 = self.distortion_params.map1, self.distortion_params.map2
-        return cv2.remap(
-            image,
-            map1,
-            map2,
-            interpolation=cv2.INTER_LINEAR,
-            borderMode=cv2.BORDER_REFLECT_101,
-        )
+        return self.undistorter.undistort(image)
 
     def undistort_mask(self, mask: np.ndarray):
-        height, width = self.distortion_params.height, self.distortion_params.width
-        if np.all(mask > 0):
-            # No invalid pixels
-            return np.zeros((height, width), dtype=np.uint8) + 255
-
-        map1, map2 = self.distortion_params.map1, self.distortion_params.map2
-        undistorted_mask = cv2.remap(
-            mask,
-            map1,
-            map2,
-            interpolation=cv2.INTER_LINEAR,
-            borderMode=cv2.BORDER_CONSTANT,
-            borderValue=255,
-        )
-        undistorted_mask[undistorted_mask < 255] = 0
-        return undistorted_mask
+        return self.undistorter.undistort_mask(mask)
 
     def get_distortion_params(self):
         height = int(self.transforms["h"])
@@ -191,41 +211,36 @@ class ScanNetPPDLSRDataset:
         for image_name, extrinsics_data in self._extrinsics.items():
             extrinsics = extrinsics_data["extrinsics"]
             if self.undistort:
-                intrinsics = self.distortion_params.new_K
+                intrinsics = self.undistorter.new_K
+                width, height = self.undistorter.width, self.undistorter.height
             else:
                 intrinsics = self.distortion_params.K
+                width = self.distortion_params.width
+                height = self.distortion_params.height
             camera = SceneKitCamera(
                 name=image_name,
                 intrinsics=intrinsics,
                 extrinsics=extrinsics,
-                width=self.distortion_params.width,
-                height=self.distortion_params.height,
+                width=width,
+                height=height,
             )
             cameras.append(camera)
         return cameras
 
     def _read_cameras(self):
-        extrinsics_file = os.path.join(self.colmap_path, "images.txt")
-        with open(extrinsics_file, "r") as fid:
-            while True:
-                line = fid.readline()
-                if not line:
-                    break
-                line = line.strip()
-                if len(line) > 0 and line[0] != "#":
-                    elems = line.split()
-                    image_id = int(elems[0])
-                    qvec = np.array(tuple(map(float, elems[1:5])))
-                    tvec = np.array(tuple(map(float, elems[5:8])))
-                    camera_id = int(elems[8])
-                    image_name = elems[9]
-                    elems = fid.readline().split()
-                    extrinsics_matrix = np.eye(4)
-                    extrinsics_matrix[:3, :3] = qvec2rotmat(qvec)
-                    extrinsics_matrix[:3, 3] = tvec
-
-                    self._extrinsics[image_name] = {
-                        "image_id": image_id,
-                        "camera_id": camera_id,
-                        "extrinsics": extrinsics_matrix,
-                    }
+        # the intrinsics come from the nerfstudio transforms, see DistortionParams
+        indexed = self.record.colmap_images("dslr") if self.record is not None else None
+        images, image_names = (
+            indexed if indexed is not None else read_images(self.colmap_path)
+        )
+        for image_name, image_id, camera_id, extrinsics_matrix in zip(
+            image_names.tolist(),
+            images["image_id"].tolist(),
+            images["camera_id"].tolist(),
+            extrinsics_matrices(images),
+        ):
+            self._extrinsics[image_name] = {
+                "image_id": image_id,
+                "camera_id": camera_id,
+                "extrinsics": extrinsics_matrix,
+            }
@@ -4,9 +4,11 @@ import sys
 import zlib
 import subprocess
 import lz4.block
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Set, Tuple
 
 import numpy as np
-import imageio as iio
 from glob import glob
 from tqdm import tqdm
 from natsort import natsorted
@@ -14,7 +16,8 @@ from dataclasses import dataclass, field
 
 from pyscenekit.utils.common import log, read_json
 from pyscenekit.scenekit3d.common import SceneKitCamera
-from pyscenekit.scenekit3d.utils import qvec2rotmat
+from pyscenekit.scenekit3d.datasets.colmap import ColmapModel
+from pyscenekit.scenekit3d.datasets.scene_index import SceneRecord
 
 
 def run_command(cmd: str, verbose=False, exit_on_error=True):
@@ -37,19 +40,205 @@ def run_command(cmd: str, verbose=False, exit_on_error=True):
     return out
 
 
+# iPhone depth frames of depth.bin
+DEPTH_HEIGHT, DEPTH_WIDTH = 192, 256
+
+
+def _depth_frame_offsets(infile, file_size: int) -> List[Tuple[int, int]]:
+    """
+    Offsets and sizes of the frames of a per frame compressed depth.bin, where
+    every frame is prefixed by its 32-bit size. Returns None when the sizes do
+    not chain up to the end of the file, i.e. for a globally compressed stream.
+    """
+    offsets = []
+    position = 0
+    while position < file_size:
+        infile.seek(position)
+        size = infile.read(4)
+        if len(size) < 4:
+            return None
+        size = int.from_bytes(size, byteorder="little")
+        if size == 0 or position + 4 + size > file_size:
+            return None
+        offsets.append((position + 4, size))
+        position += 4 + size
+    return offsets
+
+
+def read_depth_stream(
+    depth_path: str,
+    frame_ids: Set[int] = None,
+    height: int = DEPTH_HEIGHT,
+    width: int = DEPTH_WIDTH,
+    chunk_size: int = 1 << 16,
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Decode depth.bin incrementally, yielding (frame_id, depth) for the frames
+    in frame_ids (all frames if None) in increasing order. depth is uint16 in
+    millimeters and reuses one buffer, copy it to keep it past the next frame.
+
+    Both layouts are supported: one zlib stream of float32 meters, and frames
+    compressed one by one with lz4 (uint16 millimeters) or zlib (float32).
+    """
+    depth = np.empty((height, width), dtype=np.uint16)
+    meters = np.empty((height, width), dtype=np.float32)
+    last_frame = max(frame_ids) if frame_ids else None
+
+    def convert(data: bytes) -> np.ndarray:
+        np.multiply(
+            np.frombuffer(data, dtype=np.float32, count=height * width).reshape(
+                height, width
+            ),
+            1000,
+            out=meters,
+        )
+        np.copyto(depth, meters, casting="unsafe")
+        return depth
+
+    with open(depth_path, "rb") as infile:
+        offsets = _depth_frame_offsets(infile, os.fstat(infile.fileno()).st_size)
+        if offsets is not None:
+            for frame_id, (offset, size) in enumerate(offsets):
+                if frame_ids is not None and frame_id not in frame_ids:
+                    continue
+                infile.seek(offset)
+                data = infile.read(size)
+                try:
+                    data = lz4.block.decompress(
+                        data, uncompressed_size=height * width * 2
+                    )  # UInt16 = 2bytes
+                    depth[:] = np.frombuffer(data, dtype=np.uint16).reshape(
+                        height, width
+                    )
+                except Exception:
+                    convert(zlib.decompress(data, wbits=-zlib.MAX_WBITS))
+                yield frame_id, depth
+                if last_frame is not None and frame_id >= last_frame:
+                    return
+            return
+
+        # a single raw deflate stream, inflate it chunk by chunk
+        infile.seek(0)
+        decompressor = zlib.decompressobj(wbits=-zlib.MAX_WBITS)
+        frame_bytes = height * width * 4
+        pending = bytearray()
+        frame_id = 0
+        while True:
+            chunk = infile.read(chunk_size)
+            pending += decompressor.decompress(chunk) if chunk else decompressor.flush()
+            while len(pending) >= frame_bytes:
+                if frame_ids is None or frame_id in frame_ids:
+                    yield frame_id, convert(pending)
+                del pending[:frame_bytes]
+                if last_frame is not None and frame_id >= last_frame:
+                    return
+                frame_id += 1
+            if not chunk:
+                return
+
+
+def write_depth_pngs(
+    frames: Iterator[Tuple[int, np.ndarray]],
+    output_dir: str,
+    num_workers: int = 4,
+    total: int = None,
+):
+    """
+    Write depth frames as frame_XXXXXX.png on a thread pool, png encoding in
+    OpenCV runs without the GIL. Frames are copied into a ring of buffers that
+    bounds the number of frames in flight.
+    """
+    num_workers = max(num_workers, 1)
+    buffers = None
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for i, (frame_id, depth) in enumerate(
+            tqdm(frames, total=total, desc="decode_depth")
+        ):
+            if buffers is None:
+                buffers = np.empty((2 * num_workers,) + depth.shape, dtype=depth.dtype)
+            if len(pending) == len(buffers):
+                # the oldest write still owns the buffer we are about to reuse
+                pending.popleft().result()
+            buffer = buffers[i % len(buffers)]
+            np.copyto(buffer, depth)
+            # 6 digit frame id = 277 minute video at 60 fps
+            path = os.path.join(output_dir, f"frame_{frame_id:06}.png")
+            pending.append(executor.submit(cv2.imwrite, path, buffer))
+        for future in pending:
+            future.result()
+
+
+def write_depth_array(
+    frames: Iterator[Tuple[int, np.ndarray]],
+    frame_ids: List[int],
+    array_path: str,
+    frame_ids_path: str,
+):
+    """
+    Write depth frames into one uint16 npy file of shape (N, H, W) that can be
+    opened with np.load(mmap_mode="r"). frame_ids are the expected frames in
+    order, the ids actually found are saved to frame_ids_path.
+    """
+    output = None
+    found = []
+    for frame_id, depth in tqdm(frames, total=len(frame_ids), desc="decode_depth"):
+        if output is None:
+            shape = (len(frame_ids),) + depth.shape
+            output = np.lib.format.open_memmap(
+                array_path, mode="w+", dtype=depth.dtype, shape=shape
+            )
+        output[len(found)] = depth
+        found.append(frame_id)
+
+    if output is None:
+        raise ValueError(f"No depth frames of {frame_ids} found")
+    if len(found) < len(frame_ids):
+        log.warning(f"{len(frame_ids) - len(found)} depth frames missing in the stream")
+        # shrink the array, the header stores the number of frames
+        tmp_path = array_path + ".tmp.npy"
+        shape = (len(found),) + output.shape[1:]
+        shrunk = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=output.dtype, shape=shape
+        )
+        shrunk[:] = output[: len(found)]
+        shrunk.flush()
+        del shrunk
+        del output
+        os.replace(tmp_path, array_path)
+    else:
+        output.flush()
+        del output
+    np.save(frame_ids_path, np.asarray(found, dtype=np.int64))
+
+
 # reference: https://github.com/scannetpp/scannetpp/blob/main/iphone/prepare_iphone_data.py
 class ScanNetPPiPhoneDataset:
-    def __init__(self, data_dir: str, output_dir: str = None, undistort: bool = True):
+    def __init__(
+        self,
+        data_dir: str,
+        output_dir: str = None,
+        undistort: bool = True,
+        record: SceneRecord = None,
+        target_resolution: int = 0,
+        num_workers: int = 4,
+    ):
         self.data_dir = data_dir
         self.output_dir = output_dir if output_dir is not None else data_dir
+        # SceneIndex record of the scene, replaces the globs and colmap parsing
+        self.record = record
         self.image_paths = self.get_image_paths()
         self.mask_paths = self.get_mask_paths()
         self.depth_paths = self.get_depth_paths()
         self.num_images = len(self.image_paths)
         self.undistort = undistort
+        # width of the undistorted images, 0 keeps the camera resolution
+        self.target_resolution = target_resolution
+        self.num_workers = num_workers
 
         self._intrinsics = {}
         self._extrinsics = {}
+        self._colmap = None
         self._read_cameras()
 
     @property
@@ -119,78 +308,127 @@ class ScanNetPPiPhoneDataset:
             num_workers=num_workers,
         )
 
-    def extract_depth(self):
-        # global compression with zlib
-        height, width = 192, 256
-        frame_indices = list(self._extrinsics.keys())
-        frame_indices = [
+    @property
+    def normal_folder(self):
+        return os.path.join(self.output_dir, "normal")
+
+    def export_normals(
+        self,
+        depth_folder: str = None,
+        output_folder: str = None,
+        target_resolution: int = 640,
+        batch_size: int = 16,
+        rtol: float = 0.05,
+    ):
+        """
+        Write camera space normal images of the depth of every camera, the
+        rendered depth by default, estimated from the image grid batch_size
+        frames at a time. Pixels without a valid normal are black.
+        """
+        from pyscenekit.scenekit3d.geometry.unproject import (
+            cameras_to_arrays,
+            iter_rgbd_chunks,
+        )
+        from pyscenekit.scenekit3d.geometry.normals import (
+            depth_to_normals,
+            normals_to_image,
+        )
+
+        if depth_folder is None:
+            depth_folder = os.path.join(self.output_dir, "render_depth")
+        output_folder = output_folder if output_folder else self.normal_folder
+        os.makedirs(output_folder, exist_ok=True)
+        cameras = self.read_cameras()
+        names = [camera.name.split(".")[0] for camera in cameras]
+
+        def write(item):
+            name, image = item
+            path = os.path.join(output_folder, f"{name}.png")
+            cv2.imwrite(path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+
+        log.info(f"Exporting normals to {output_folder}")
+        with ThreadPoolExecutor(max_workers=max(self.num_workers, 1)) as executor:
+            for start, depths, _ in iter_rgbd_chunks(
+                [os.path.join(depth_folder, f"{name}.png") for name in names],
+                target_resolution=target_resolution,
+                chunk_size=batch_size,
+                num_workers=self.num_workers,
+            ):
+                batch_cameras = cameras[start : start + len(depths)]
+                intrinsics, _ = cameras_to_arrays(batch_cameras, depths.shape[2])
+                normals, valid = depth_to_normals(depths, intrinsics, rtol=rtol)
+                images = normals_to_image(normals, valid)
+                list(executor.map(write, zip(names[start:], images)))
+
+    @property
+    def depth_array_path(self):
+        return os.path.join(self.output_dir, "depth.npy")
+
+    @property
+    def depth_frame_ids_path(self):
+        return os.path.join(self.output_dir, "depth_frame_ids.npy")
+
+    def extract_depth(self, num_workers: int = 4, output_format: str = "png"):
+        """
+        Decode the selected depth frames of depth.bin as uint16 millimeters.
+
+        output_format "png" writes one png per frame on num_workers threads,
+        "npy" writes all frames into the memory-mappable depth.npy with the
+        matching frame ids in depth_frame_ids.npy.
+        """
+        if output_format not in ("png", "npy"):
+            raise ValueError(f"Unknown depth output format {output_format}")
+        frame_ids = set(
             int(os.path.basename(frame_index).split("_")[1].split(".")[0])
-            for frame_index in frame_indices
-        ]
+            for frame_index in self._extrinsics.keys()
+        )
+        frames = read_depth_stream(self.depth_path, frame_ids)
+
+        if output_format == "npy":
+            log.info(f"Extracting depth frames to {self.depth_array_path}")
+            write_depth_array(
+                frames,
+                sorted(frame_ids),
+                self.depth_array_path,
+                self.depth_frame_ids_path,
+            )
+            return
+
         log.info(f"Extracting depth images to {self.depth_folder}")
         os.makedirs(self.depth_folder, exist_ok=True)
+        write_depth_pngs(frames, self.depth_folder, num_workers, total=len(frame_ids))
 
-        try:
-            with open(self.depth_path, "rb") as infile:
-                data = infile.read()
-                data = zlib.decompress(data, wbits=-zlib.MAX_WBITS)
-                depth = np.frombuffer(data, dtype=np.float32).reshape(-1, height, width)
+    def load_depth_array(self):
+        """
+        Frame ids and a read-only memory map of the depth frames written by
+        extract_depth(output_format="npy"), in millimeters.
+        """
+        frame_ids = np.load(self.depth_frame_ids_path)
+        depth = np.load(self.depth_array_path, mmap_mode="r")
+        return frame_ids, depth
 
-            for frame_id in tqdm(frame_indices, desc="decode_depth"):
-                iio.imwrite(
-                    os.path.join(self.depth_folder, f"frame_{frame_id:06}.png"),
-                    (depth * 1000).astype(np.uint16),
-                )
-        # per frame compression with lz4/zlib
-        except:
-            frame_id = 0
-            with open(self.depth_path, "rb") as infile:
-                while True:
-                    size = infile.read(4)  # 32-bit integer
-                    if len(size) == 0:
-                        break
-                    size = int.from_bytes(size, byteorder="little")
-                    if frame_id not in frame_indices:
-                        infile.seek(size, 1)
-                        frame_id += 1
-                        continue
-
-                    # read the whole file
-                    data = infile.read(size)
-                    try:
-                        # try using lz4
-                        data = lz4.block.decompress(
-                            data, uncompressed_size=height * width * 2
-                        )  # UInt16 = 2bytes
-                        depth = np.frombuffer(data, dtype=np.uint16).reshape(
-                            height, width
-                        )
-                    except:
-                        # try using zlib
-                        data = zlib.decompress(data, wbits=-zlib.MAX_WBITS)
-                        depth = np.frombuffer(data, dtype=np.float32).reshape(
-                            height, width
-                        )
-                        depth = (depth * 1000).astype(np.uint16)
-
-                    # 6 digit frame id = 277 minute video at 60 fps
-                    iio.imwrite(
-                        os.path.join(self.depth_folder, f"frame_{frame_id:06}.png"),
-                        depth,
-                    )
-                    frame_id += 1
+    @property
+    def _indexed_frames(self):
+        # the index lists the frames extracted next to the raw data
+        return self.record is not None and self.output_dir == self.data_dir
 
     def get_image_paths(self):
+        if self._indexed_frames:
+            return self.record.frame_paths("iphone_rgb")
         if not os.path.exists(self.rgb_folder):
             return []
         return natsorted(glob(os.path.join(self.rgb_folder, "*.jpg")))
 
     def get_mask_paths(self):
+        if self._indexed_frames:
+            return self.record.frame_paths("iphone_mask")
         if not os.path.exists(self.mask_folder):
             return []
         return natsorted(glob(os.path.join(self.mask_folder, "*.png")))
 
     def get_depth_paths(self):
+        if self._indexed_frames:
+            return self.record.frame_paths("iphone_depth")
         if not os.path.exists(self.depth_folder):
             return []
         return natsorted(glob(os.path.join(self.depth_folder, "*.png")))
@@ -211,29 +449,28 @@ class ScanNetPPiPhoneDataset:
             image_name = os.path.basename(image_path)
             camera_id = self._extrinsics.get(image_name, {}).get("camera_id", None)
             if camera_id is not None:
-                image = cv2.remap(
-                    image,
-                    self._intrinsics[camera_id]["map1"],
-                    self._intrinsics[camera_id]["map2"],
-                    interpolation=cv2.INTER_LINEAR,
-                    borderMode=cv2.BORDER_REFLECT_101,
-                )
+                image = self.get_undistorter(camera_id).undistort(image)
         image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         return image
 
+    def get_images_by_indices(self, indices: List[int]) -> List[np.ndarray]:
+        # frames are read and undistorted on the persistent thread pool of the
+        # camera's undistorter, all frames of an iPhone scan share one camera
+        camera_id = None
+        if len(indices) > 0:
+            image_name = os.path.basename(self.get_image_path_by_index(indices[0]))
+            camera_id = self._extrinsics.get(image_name, {}).get("camera_id", None)
+        if camera_id is None:
+            return [self.get_image_by_index(index) for index in indices]
+        return self.get_undistorter(camera_id).map(self.get_image_by_index, indices)
+
     def get_image_by_path(self, image_path: str):
         image = cv2.imread(image_path)
         if self.undistort:
             image_name = os.path.basename(image_path)
             camera_id = self._extrinsics.get(image_name, {}).get("camera_id", None)
             if camera_id is not None:
-                image = cv2.remap(
-                    image,
-                    self._intrinsics[camera_id]["map1"],
-                    self._intrinsics[camera_id]["map2"],
-                    interpolation=cv2.INTER_LINEAR,
-                    borderMode=cv2.BORDER_REFLECT_101,
-                )
+                image = self.get_undistorter(camera_id).undistort(image)
         image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         return image
 
@@ -244,13 +481,8 @@ class ScanNetPPiPhoneDataset:
             image_name = os.path.basename(mask_path).replace(".png", ".jpg")
             camera_id = self._extrinsics.get(image_name, {}).get("camera_id", None)
             if camera_id is not None:
-                mask = cv2.remap(
-                    mask,
-                    self._intrinsics[camera_id]["map1"],
-                    self._intrinsics[camera_id]["map2"],
-                    interpolation=cv2.INTER_LINEAR,
-                    borderMode=cv2.BORDER_CONSTANT,
-                    borderValue=255,
+                mask = self.get_undistorter(camera_id).undistort(
+                    mask, border_mode=cv2.BORDER_CONSTANT, border_value=255
                 )
         return mask
 
@@ -271,91 +503,61 @@ class ScanNetPPiPhoneDataset:
             intrinsics_data = self._intrinsics[extrinsics_data["camera_id"]]
             extrinsics = extrinsics_data["extrinsics"]
             if self.undistort:
-                intrinsics = intrinsics_data["new_K"]
+                undistorter = self.get_undistorter(extrinsics_data["camera_id"])
+                intrinsics = undistorter.new_K
+                width, height = undistorter.width, undistorter.height
             else:
                 intrinsics = intrinsics_data["K"]
+                width, height = intrinsics_data["width"], intrinsics_data["height"]
             camera = SceneKitCamera(
                 name=image_name,
                 intrinsics=intrinsics,
                 extrinsics=extrinsics,
-                width=intrinsics_data["width"],
-                height=intrinsics_data["height"],
+                width=width,
+                height=height,
             )
             cameras.append(camera)
         return cameras
 
     def _read_cameras(self):
-        intrinsics_file = os.path.join(self.colmap_path, "cameras.txt")
-        with open(intrinsics_file, "r") as fid:
-            while True:
-                line = fid.readline()
-                if not line:
-                    break
-                line = line.strip()
-                if len(line) > 0 and line[0] != "#":
-                    elems = line.split()
-                    camera_id = int(elems[0])
-                    model = elems[1]
-                    width = int(elems[2])
-                    height = int(elems[3])
-                    params = np.array(tuple(map(float, elems[4:])))
-                    intrinsics_matrix = np.eye(3)
-                    intrinsics_matrix[0, 0] = params[0]
-                    intrinsics_matrix[1, 1] = params[1]
-                    intrinsics_matrix[0, 2] = params[2]
-                    intrinsics_matrix[1, 2] = params[3]
-                    distortion_params = np.array(tuple(map(float, params[4:])))
-
-                    new_K, _ = cv2.getOptimalNewCameraMatrix(
-                        intrinsics_matrix,
-                        distortion_params,
-                        (width, height),
-                        1,
-                        (width, height),
-                        True,
-                    )
-                    map1, map2 = cv2.initUndistortRectifyMap(
-                        intrinsics_matrix,
-                        distortion_params,
-                        np.eye(3),
-                        new_K,
-                        (width, height),
-                        cv2.CV_32FC1,
-                    )
+        if self.record is not None and self.record.has("iphone"):
+            self._colmap = self.record.colmap("iphone")
+        else:
+            self._colmap = ColmapModel(self.colmap_path)
+        for camera in self._colmap.cameras:
+            camera_id = int(camera["camera_id"])
+            intrinsics_matrix, distortion_params = self._colmap.intrinsics(camera_id)
+            self._intrinsics[camera_id] = {
+                "model": self._colmap.camera_model(camera_id),
+                "width": int(camera["width"]),
+                "height": int(camera["height"]),
+                "K": intrinsics_matrix,
+                "distortion_params": distortion_params,
+                "new_K": self._colmap.new_intrinsics(camera_id),
+            }
+
+        images = self._colmap.images
+        for image_name, image_id, camera_id, extrinsics_matrix in zip(
+            self._colmap.image_names.tolist(),
+            images["image_id"].tolist(),
+            images["camera_id"].tolist(),
+            self._colmap.extrinsics,
+        ):
+            self._extrinsics[image_name] = {
+                "image_id": image_id,
+                "camera_id": camera_id,
+                "extrinsics": extrinsics_matrix,
+            }
 
-                    self._intrinsics[camera_id] = {
-                        "model": model,
-                        "width": width,
-                        "height": height,
-                        "K": intrinsics_matrix,
-                        "distortion_params": distortion_params,
-                        "new_K": new_K,
-                        "map1": map1,
-                        "map2": map2,
-                    }
-
-        extrinsics_file = os.path.join(self.colmap_path, "images.txt")
-        with open(extrinsics_file, "r") as fid:
-            while True:
-                line = fid.readline()
-                if not line:
-                    break
-                line = line.strip()
-                if len(line) > 0 and line[0] != "#":
-                    elems = line.split()
-                    image_id = int(elems[0])
-                    qvec = np.array(tuple(map(float, elems[1:5])))
-                    tvec = np.array(tuple(map(float, elems[5:8])))
-                    camera_id = int(elems[8])
-                    image_name = elems[9]
-                    elems = fid.readline().split()
-                    intrinsics_matrix = self._intrinsics[camera_id]["K"]
-                    extrinsics_matrix = np.eye(4)
-                    extrinsics_matrix[:3, :3] = qvec2rotmat(qvec)
-                    extrinsics_matrix[:3, 3] = tvec
-
-                    self._extrinsics[image_name] = {
-                        "image_id": image_id,
-                        "camera_id": camera_id,
-                        "extrinsics": extrinsics_matrix,
-                    }
+    @property
+    def undistort_cache_dir(self):
+        return os.path.join(self.output_dir, ".undistort")
+
+    def get_undistorter(self, camera_id: int):
+        # built on first use, most tasks never undistort
+        return self._colmap.undistorter(
+            camera_id,
+            target_resolution=self.target_resolution,
+            cache_dir=self.undistort_cache_dir,
+            num_workers=self.num_workers,
+        )
@@ -1,26 +1,65 @@
 import os
 import cv2
-from typing import List
+from typing import Callable, List
 import numpy as np
 from tqdm import tqdm
 from dataclasses import dataclass, field
 
 from pyscenekit.utils.common import log, read_json
-from pyscenekit.scenekit3d.visualization.pytorch3d_render import PyTorch3DRenderer
 from pyscenekit.scenekit3d.common import SceneKitCamera
+from pyscenekit.scenekit3d.datasets.scannetpp.render_cache import RenderManifest
 
 
 class ScanNetPPMeshDataset:
-    def __init__(self, data_dir: str, output_dir: str = None):
+    """
+    Renders depth and triangle ids of the ScanNet++ mesh for a list of cameras.
+
+    backend selects the rasterizer, "pytorch3d" runs on the GPU and "cpu" uses
+    a multi-process NumPy rasterizer with num_workers processes.
+    """
+
+    BACKENDS = ("pytorch3d", "cpu")
+
+    def __init__(
+        self,
+        data_dir: str,
+        output_dir: str = None,
+        backend: str = "pytorch3d",
+        num_workers: int = None,
+    ):
         self.data_dir = data_dir
         self.output_dir = output_dir if output_dir is not None else data_dir
-        self.renderer = PyTorch3DRenderer()
+        self.backend = self._check_backend(backend)
+        self.num_workers = num_workers
+        self._renderer = None
+        self._loaded_mesh_path = None
         self.batch_size = 8
         self.cameras = []
 
         self.start_idx = 0
         self.end_idx = -1
 
+    # pytorch3d is only imported once something is rendered
+    @property
+    def renderer(self):
+        if self._renderer is None and self.backend == "cpu":
+            from pyscenekit.scenekit3d.visualization.cpu_render import CPURasterizer
+
+            self._renderer = CPURasterizer(num_workers=self.num_workers)
+        elif self._renderer is None:
+            from pyscenekit.scenekit3d.visualization.pytorch3d_render import (
+                PyTorch3DRenderer,
+            )
+
+            self._renderer = PyTorch3DRenderer()
+        return self._renderer
+
+    # share one renderer across scenes, e.g. in a long running worker
+    def set_renderer(self, renderer):
+        if renderer is not self._renderer:
+            self._loaded_mesh_path = None
+        self._renderer = renderer
+
     @property
     def mesh_path(self):
         return os.path.join(self.data_dir, "mesh_aligned_0.05.ply")
@@ -28,76 +67,143 @@ class ScanNetPPMeshDataset:
     def set_cameras(self, cameras: dict):
         self.cameras = cameras
 
-    def export_all_depth(self, output_dir: str, target_resolution: int = 0):
-        num_cameras = len(self.cameras)
-        start_idx = self.start_idx
-        batch_size = self.batch_size
-        end_idx = self.end_idx if self.end_idx != -1 else num_cameras
+    def _check_backend(self, backend: str) -> str:
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, expected {self.BACKENDS}")
+        return backend
 
-        if target_resolution <= 0:
-            target_resolution = self.cameras[0].width
+    def set_backend(self, backend: str):
+        if self._check_backend(backend) != self.backend:
+            self.close()
+            self.backend = backend
 
-        os.makedirs(output_dir, exist_ok=True)
-        self.load_mesh()
-        for i in range(start_idx, end_idx, batch_size):
-            batch_cameras = self.cameras[i : i + batch_size]
-            from time import time
-
-            start = time()
-            depth = self.render_depth(batch_cameras, target_resolution)
-            end = time()
-            print(f"Time taken: {end - start} seconds")
-
-            for i in range(len(depth)):
-                camera = batch_cameras[i]
-                depth_i = depth[i, :, :, 0]
-                # min max normalize
-                mask = depth_i < 0
-                depth_i[mask] = 0
-
-                depth_i = (depth_i * 1000).astype(np.uint16)
-                file_name = camera.name.split(".")[0] + ".png"
-                cv2.imwrite(os.path.join(output_dir, file_name), depth_i)
-
-    def export_all_triangles(self, output_dir: str, target_resolution: int = 0):
+    def close(self):
+        if self._renderer is not None and hasattr(self._renderer, "close"):
+            self._renderer.close()
+        self._renderer = None
+        self._loaded_mesh_path = None
+
+    def export_all_depth(
+        self, output_dir: str, target_resolution: int = 0, overwrite: bool = False
+    ):
+        """
+        Render depth in millimeters as uint16 png files. Frames whose camera,
+        mesh and resolution match the manifest of output_dir are skipped unless
+        overwrite is set.
+        """
+
+        def save_depth(depth: np.ndarray, file_path: str):
+            depth = depth[:, :, 0]
+            depth[depth < 0] = 0
+            cv2.imwrite(file_path, (depth * 1000).astype(np.uint16))
+
+        self._export_all(
+            output_dir,
+            target_resolution,
+            "depth",
+            ".png",
+            self.render_depth,
+            save_depth,
+            overwrite,
+        )
+
+    def export_all_triangles(
+        self, output_dir: str, target_resolution: int = 0, overwrite: bool = False
+    ):
+        """
+        Save the visible face index per pixel as npy files, see export_all_depth
+        for the skipping of up to date frames.
+        """
+
+        def save_triangles(triangles: np.ndarray, file_path: str):
+            np.save(file_path, triangles[:, :, 0])
+
+        self._export_all(
+            output_dir,
+            target_resolution,
+            "triangles",
+            ".npy",
+            self.rasterize_triangles,
+            save_triangles,
+            overwrite,
+        )
+
+    def _export_all(
+        self,
+        output_dir: str,
+        target_resolution: int,
+        kind: str,
+        extension: str,
+        render: Callable,
+        save: Callable,
+        overwrite: bool,
+    ):
         num_cameras = len(self.cameras)
-        start_idx = self.start_idx
-        batch_size = self.batch_size
         end_idx = self.end_idx if self.end_idx != -1 else num_cameras
+        cameras = self.cameras[self.start_idx : end_idx]
+        if len(cameras) == 0:
+            return
 
         if target_resolution <= 0:
             target_resolution = self.cameras[0].width
 
         os.makedirs(output_dir, exist_ok=True)
-        self.load_mesh()
-        for i in range(start_idx, end_idx, batch_size):
-            batch_cameras = self.cameras[i : i + batch_size]
-            from time import time
-
-            start = time()
-            triangles = self.rasterize_triangles(batch_cameras, target_resolution)
-            end = time()
-            print(f"Time taken: {end - start} seconds")
-
-            for i in range(len(triangles)):
-                camera = batch_cameras[i]
-                triangles_i = triangles[i, :, :, 0]
-                file_name = camera.name.split(".")[0] + ".npy"
-                np.save(os.path.join(output_dir, file_name), triangles_i)
+        manifest = RenderManifest(output_dir, kind)
+        manifest.bind(self.mesh_path, {"target_resolution": target_resolution})
+        file_names = [camera.name.split(".")[0] + extension for camera in cameras]
+        if overwrite:
+            pending = list(zip(cameras, file_names))
+        else:
+            pending = manifest.pending(cameras, file_names)
+        log.info(
+            f"Rendering {kind} for {len(pending)} of {len(cameras)} cameras, "
+            f"{len(cameras) - len(pending)} are up to date"
+        )
+        if len(pending) == 0:
+            manifest.save()
+            return
 
+        self.load_mesh()
+        for i in tqdm(range(0, len(pending), self.batch_size), desc=f"Render {kind}"):
+            batch = pending[i : i + self.batch_size]
+            batch_cameras = [camera for camera, _ in batch]
+            results = render(batch_cameras, target_resolution)
+            for result, (camera, file_name) in zip(results, batch):
+                save(result, os.path.join(output_dir, file_name))
+                manifest.mark(file_name, camera)
+            # record progress after every batch so an interrupted export resumes
+            manifest.save()
+
+    # the mesh is static, keep it in the renderer across export calls
     def load_mesh(self):
-        self.renderer.load_ply(self.mesh_path)
+        if self._loaded_mesh_path != self.mesh_path:
+            self.renderer.load_ply(self.mesh_path)
+            self._loaded_mesh_path = self.mesh_path
 
     def render_depth(self, cameras: List[SceneKitCamera], target_resolution: int = 640):
         self.renderer.set_cameras(cameras)
         fragments = self.renderer.rasterize(target_resolution)
-        depth = fragments.zbuf.cpu().numpy()
-        return depth
+        return _to_numpy(fragments.zbuf)
 
     def rasterize_triangles(
         self, cameras: List[SceneKitCamera], target_resolution: int = 640
     ):
+        """
+        Index of the visible face per pixel with shape (N, H, W, 1), -1 where
+        no face is hit. Indices refer to the faces of the loaded mesh.
+        """
         self.renderer.set_cameras(cameras)
         fragments = self.renderer.rasterize(target_resolution)
-        pix_to_face = fragments.pix_to_face.cpu().numpy()
+        pix_to_face = _to_numpy(fragments.pix_to_face)
+        if self.backend == "pytorch3d":
+            # pytorch3d indexes the faces of the extended batch, one mesh per view
+            num_faces = self.renderer.mesh.num_faces_per_mesh()[0].item()
+            offsets = np.arange(len(pix_to_face)).reshape(-1, 1, 1, 1) * num_faces
+            pix_to_face = np.where(pix_to_face >= 0, pix_to_face - offsets, -1)
         return pix_to_face
+
+
+def _to_numpy(values):
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return values
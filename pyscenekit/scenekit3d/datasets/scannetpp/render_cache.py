@@ -0,0 +1,98 @@
+import os
+import uuid
+import hashlib
+from typing import Dict, List
+
+from pyscenekit.utils.common import log, read_json, write_json
+from pyscenekit.scenekit2d.cache import hash_values
+from pyscenekit.scenekit3d.common import SceneKitCamera
+
+MANIFEST_VERSION = 1
+
+
+def file_hash(filepath: str, chunk_size: int = 1 << 20) -> str:
+    hasher = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def camera_hash(camera: SceneKitCamera) -> str:
+    return hash_values(
+        camera.intrinsics.astype("float64"),
+        camera.extrinsics.astype("float64"),
+        camera.width,
+        camera.height,
+    )
+
+
+class RenderManifest:
+    """
+    Record of the frames rendered into an output directory.
+
+    The manifest stores the hash of the mesh file, the render settings and the
+    hash of every camera that was rendered. Frames are up to date when all of
+    them match and the output file exists, a different mesh or setting
+    invalidates every frame of the directory.
+    """
+
+    def __init__(self, output_dir: str, kind: str):
+        self.output_dir = output_dir
+        self.kind = kind
+        self.path = os.path.join(output_dir, f".{kind}_manifest.json")
+        self.data = {"version": MANIFEST_VERSION, "frames": {}}
+        if os.path.isfile(self.path):
+            try:
+                data = read_json(self.path)
+            except ValueError as e:
+                log.warning(f"Ignoring unreadable render manifest {self.path}: {e}")
+            else:
+                if data.get("version") == MANIFEST_VERSION:
+                    self.data = data
+
+    @property
+    def frames(self) -> Dict[str, str]:
+        return self.data["frames"]
+
+    def bind(self, mesh_path: str, settings: dict):
+        """
+        Attach the manifest to a mesh and render settings, dropping the recorded
+        frames when either changed since the last export.
+        """
+        stat = os.stat(mesh_path)
+        signature = [os.path.abspath(mesh_path), stat.st_size, stat.st_mtime_ns]
+        previous = self.data.get("mesh", {})
+        # hashing a large mesh is slow, reuse the hash while the file is untouched
+        if previous.get("signature") == signature:
+            mesh_hash = previous["hash"]
+        else:
+            mesh_hash = file_hash(mesh_path)
+
+        if previous.get("hash") != mesh_hash or self.data.get("settings") != settings:
+            if self.frames:
+                log.info(f"Mesh or render settings changed, re-rendering {self.kind}")
+            self.data["frames"] = {}
+        self.data["mesh"] = {"signature": signature, "hash": mesh_hash}
+        self.data["settings"] = settings
+
+    def is_current(self, file_name: str, camera: SceneKitCamera) -> bool:
+        return self.frames.get(file_name) == camera_hash(camera) and os.path.isfile(
+            os.path.join(self.output_dir, file_name)
+        )
+
+    def pending(self, cameras: List[SceneKitCamera], file_names: List[str]):
+        return [
+            (camera, file_name)
+            for camera, file_name in zip(cameras, file_names)
+            if not self.is_current(file_name, camera)
+        ]
+
+    def mark(self, file_name: str, camera: SceneKitCamera):
+        self.frames[file_name] = camera_hash(camera)
+
+    def save(self):
+        # replace the manifest atomically so an interrupted export can resume
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        write_json(self.data, tmp_path)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,436 @@
+import os
+import json
+import time
+import sqlite3
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from tqdm import tqdm
+from natsort import natsorted
+
+from pyscenekit.utils.common import log, read_json
+from pyscenekit.scenekit3d.datasets.colmap import (
+    CAMERA_DTYPE,
+    IMAGE_DTYPE,
+    ColmapModel,
+    read_cameras,
+    read_images,
+)
+
+# bump when the schema or the recorded modalities change, older indexes are rebuilt
+INDEX_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS scenes (scene_id TEXT PRIMARY KEY, indexed_at REAL);
+CREATE TABLE IF NOT EXISTS modalities (
+    scene_id TEXT,
+    modality TEXT,
+    path TEXT,
+    num_frames INTEGER,
+    PRIMARY KEY (scene_id, modality)
+);
+CREATE INDEX IF NOT EXISTS modalities_frames ON modalities (modality, num_frames);
+CREATE TABLE IF NOT EXISTS frames (
+    scene_id TEXT,
+    modality TEXT,
+    frame INTEGER,
+    path TEXT,
+    PRIMARY KEY (scene_id, modality, frame)
+);
+CREATE TABLE IF NOT EXISTS cameras (
+    scene_id TEXT,
+    modality TEXT,
+    cameras BLOB,
+    images BLOB,
+    image_names TEXT,
+    metadata TEXT,
+    PRIMARY KEY (scene_id, modality)
+);
+"""
+
+# dataset name -> function(record) filling a SceneRecord, see scene_indexer
+SCENE_INDEXERS: Dict[str, Callable] = {}
+
+
+def scene_indexer(dataset: str):
+    """
+    Register the function that records the modalities of one scene of a dataset.
+    """
+
+    def register(function: Callable):
+        SCENE_INDEXERS[dataset] = function
+        return function
+
+    return register
+
+
+@dataclass
+class SceneRecord:
+    """
+    Everything the index knows about one scene, paths are relative to the scene.
+
+    modalities maps a modality to its path and number of frames (None for
+    single files), frames holds the sorted frame files of folder modalities and
+    cameras the colmap arrays and metadata of the camera modalities.
+    """
+
+    scene_id: str
+    scene_path: str
+    modalities: Dict[str, Tuple[str, int]] = field(default_factory=dict)
+    frames: Dict[str, List[str]] = field(default_factory=dict)
+    cameras: Dict[str, Dict] = field(default_factory=dict)
+
+    def has(self, modality: str) -> bool:
+        return modality in self.modalities
+
+    def path(self, modality: str) -> str:
+        if modality not in self.modalities:
+            return None
+        return os.path.join(self.scene_path, self.modalities[modality][0])
+
+    def num_frames(self, modality: str) -> int:
+        return self.modalities.get(modality, (None, 0))[1] or 0
+
+    def frame_paths(self, modality: str) -> List[str]:
+        paths = self.frames.get(modality, [])
+        return [os.path.join(self.scene_path, path) for path in paths]
+
+    def metadata(self, modality: str) -> Dict:
+        return self.cameras.get(modality, {}).get("metadata") or {}
+
+    def colmap_images(self, modality: str) -> Tuple[np.ndarray, np.ndarray]:
+        cameras = self.cameras.get(modality, {})
+        if cameras.get("images") is None:
+            return None
+        return cameras["images"], cameras["image_names"]
+
+    def colmap(self, modality: str) -> ColmapModel:
+        cameras = self.cameras.get(modality, {})
+        if cameras.get("cameras") is None or cameras.get("images") is None:
+            return None
+        return ColmapModel.from_arrays(
+            cameras["cameras"],
+            cameras["images"],
+            cameras["image_names"],
+            colmap_dir=self.path(modality),
+        )
+
+    # the helpers below are used by the indexers and only record what exists
+
+    def add_file(self, modality: str, path: str, num_frames: int = None):
+        if os.path.isfile(os.path.join(self.scene_path, path)):
+            self.modalities[modality] = (path, num_frames)
+
+    def add_frames(self, modality: str, folder: str, pattern: str):
+        folder_path = os.path.join(self.scene_path, folder)
+        if not os.path.isdir(folder_path):
+            return
+        paths = natsorted(glob(os.path.join(folder_path, pattern)))
+        self.frames[modality] = [
+            os.path.relpath(path, self.scene_path) for path in paths
+        ]
+        self.modalities[modality] = (folder, len(paths))
+
+    def add_colmap(self, modality: str, folder: str, metadata: Dict = None):
+        colmap_dir = os.path.join(self.scene_path, folder)
+        if not os.path.isdir(colmap_dir):
+            return
+        try:
+            images, image_names = read_images(colmap_dir)
+        except FileNotFoundError:
+            return
+        try:
+            cameras = read_cameras(colmap_dir)
+        except FileNotFoundError:
+            # e.g. the DSLR intrinsics come from the nerfstudio transforms
+            cameras = np.zeros(0, dtype=CAMERA_DTYPE)
+        self.modalities[modality] = (folder, len(images))
+        self.cameras[modality] = {
+            "cameras": cameras,
+            "images": images,
+            "image_names": image_names,
+            "metadata": metadata,
+        }
+
+
+@scene_indexer("scannetpp")
+def index_scannetpp_scene(record: SceneRecord):
+    record.add_file("iphone_video", os.path.join("iphone", "rgb.mp4"))
+    record.add_file("iphone_depth_bin", os.path.join("iphone", "depth.bin"))
+    record.add_file("iphone_mask_video", os.path.join("iphone", "rgb_mask.mkv"))
+    record.add_frames("iphone_rgb", os.path.join("iphone", "rgb"), "*.jpg")
+    record.add_frames("iphone_depth", os.path.join("iphone", "depth"), "*.png")
+    record.add_frames("iphone_mask", os.path.join("iphone", "mask"), "*.png")
+    record.add_colmap("iphone", os.path.join("iphone", "colmap"))
+
+    transforms_path = os.path.join(
+        record.scene_path, "dslr", "nerfstudio", "transforms.json"
+    )
+    transforms = read_json(transforms_path) if os.path.isfile(transforms_path) else None
+    record.add_frames("dslr_images", os.path.join("dslr", "resized_images"), "*.JPG")
+    record.add_frames(
+        "dslr_masks", os.path.join("dslr", "resized_anon_masks"), "*.png"
+    )
+    record.add_colmap(
+        "dslr", os.path.join("dslr", "colmap"), metadata={"transforms": transforms}
+    )
+
+    record.add_file("mesh", os.path.join("scans", "mesh_aligned_0.05.ply"))
+
+
+@scene_indexer("scannet")
+def index_scannet_scene(record: SceneRecord):
+    from pyscenekit.scenekit3d.datasets.scannet.frame import read_sens_header
+
+    scene_id = record.scene_id
+    sens_path = os.path.join(record.scene_path, f"{scene_id}.sens")
+    if os.path.isfile(sens_path):
+        header = read_sens_header(sens_path)
+        record.add_file("sens", f"{scene_id}.sens", header["num_frames"])
+        record.cameras["sens"] = {
+            "metadata": {
+                key: value.tolist() if isinstance(value, np.ndarray) else value
+                for key, value in header.items()
+                if key != "sensor_name"
+            }
+        }
+    record.add_file("mesh", f"{scene_id}_vh_clean_2.ply")
+    record.add_file("labels_mesh", f"{scene_id}_vh_clean_2.labels.ply")
+    record.add_frames("color", "color", "*.jpg")
+    record.add_frames("depth", "depth", "*.png")
+    record.add_frames("pose", "pose", "*.txt")
+
+
+def _index_scene(dataset: str, data_dir: str, scene_id: str) -> SceneRecord:
+    record = SceneRecord(scene_id, os.path.join(data_dir, scene_id))
+    SCENE_INDEXERS[dataset](record)
+    return record
+
+
+class SceneIndex:
+    """
+    SQLite index of the scenes of a ScanNet or ScanNet++ data directory.
+
+    build() walks the scenes once and records per scene the available
+    modalities, their frame counts and frame files, and the camera parameters.
+    Datasets given the index list and open scenes from it without touching the
+    filesystem, and scenes can be queried by modality and frame count:
+
+        index = SceneIndex(data_dir, "scannetpp")
+        index.build()
+        index.scenes("iphone", min_frames=501)
+
+    The index is a snapshot, call build(update=True) or update_scenes after
+    extracting frames so that the new files are listed.
+    """
+
+    def __init__(self, data_dir: str, dataset: str, index_path: str = None):
+        if dataset not in SCENE_INDEXERS:
+            raise ValueError(
+                f"Unknown dataset {dataset}, expected {list(SCENE_INDEXERS)}"
+            )
+        self.data_dir = data_dir
+        self.dataset = dataset
+        self.index_path = (
+            index_path
+            if index_path is not None
+            else os.path.join(data_dir, ".scene_index.sqlite")
+        )
+        self.connection = sqlite3.connect(self.index_path)
+        self._check_version()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM scenes").fetchone()[0]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _check_version(self):
+        self.connection.executescript(_SCHEMA)
+        info = dict(self.connection.execute("SELECT key, value FROM info"))
+        expected = {"version": str(INDEX_VERSION), "dataset": self.dataset}
+        if info and info != expected:
+            log.warning(f"Rebuilding scene index {self.index_path}, was {info}")
+            with self.connection:
+                for table in ("scenes", "modalities", "frames", "cameras", "info"):
+                    self.connection.execute(f"DELETE FROM {table}")
+            info = {}
+        if not info:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT INTO info VALUES (?, ?)", expected.items()
+                )
+
+    def list_scenes_ids(self) -> List[str]:
+        # the only place that lists data_dir, hidden entries hold bookkeeping
+        return natsorted(
+            folder
+            for folder in os.listdir(self.data_dir)
+            if not folder.startswith(".")
+            and os.path.isdir(os.path.join(self.data_dir, folder))
+        )
+
+    def build(
+        self, scenes_ids: List[str] = None, update: bool = False, num_workers: int = 8
+    ) -> int:
+        """
+        Index the scenes of data_dir, or only scenes_ids. Scenes already in the
+        index are kept unless update is set. Returns the number of indexed scenes.
+        """
+        if scenes_ids is None:
+            scenes_ids = self.list_scenes_ids()
+        if not update:
+            indexed = set(self.scenes())
+            scenes_ids = [
+                scene_id for scene_id in scenes_ids if scene_id not in indexed
+            ]
+        if not scenes_ids:
+            return 0
+
+        log.info(f"Indexing {len(scenes_ids)} scenes of {self.data_dir}")
+        # indexing waits on the filesystem, threads overlap the globs and reads
+        with ThreadPoolExecutor(max_workers=max(num_workers, 1)) as executor:
+            records = executor.map(
+                lambda scene_id: _index_scene(self.dataset, self.data_dir, scene_id),
+                scenes_ids,
+            )
+            for record in tqdm(records, total=len(scenes_ids), desc="index"):
+                self.add(record)
+        return len(scenes_ids)
+
+    def update_scenes(self, scenes_ids: List[str]):
+        self.build(scenes_ids, update=True)
+
+    def add(self, record: SceneRecord):
+        scene_id = record.scene_id
+        # one transaction per scene, an interrupted build keeps the finished scenes
+        with self.connection:
+            self._delete(scene_id)
+            self.connection.execute(
+                "INSERT INTO scenes VALUES (?, ?)", (scene_id, time.time())
+            )
+            self.connection.executemany(
+                "INSERT INTO modalities VALUES (?, ?, ?, ?)",
+                (
+                    (scene_id, modality, path, num_frames)
+                    for modality, (path, num_frames) in record.modalities.items()
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO frames VALUES (?, ?, ?, ?)",
+                (
+                    (scene_id, modality, i, path)
+                    for modality, paths in record.frames.items()
+                    for i, path in enumerate(paths)
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO cameras VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        scene_id,
+                        modality,
+                        _to_blob(cameras.get("cameras")),
+                        _to_blob(cameras.get("images")),
+                        json.dumps(np.asarray(cameras["image_names"]).tolist())
+                        if cameras.get("image_names") is not None
+                        else None,
+                        json.dumps(cameras.get("metadata")),
+                    )
+                    for modality, cameras in record.cameras.items()
+                ),
+            )
+
+    def remove(self, scene_id: str):
+        with self.connection:
+            self._delete(scene_id)
+
+    def _delete(self, scene_id: str):
+        for table in ("scenes", "modalities", "frames", "cameras"):
+            self.connection.execute(
+                f"DELETE FROM {table} WHERE scene_id = ?", (scene_id,)
+            )
+
+    def scenes(
+        self, modality: str = None, min_frames: int = None, max_frames: int = None
+    ) -> List[str]:
+        """
+        Scenes that have modality with min_frames <= num_frames <= max_frames,
+        all indexed scenes without arguments.
+        """
+        if modality is None:
+            rows = self.connection.execute("SELECT scene_id FROM scenes")
+        else:
+            query = "SELECT scene_id FROM modalities WHERE modality = ?"
+            params = [modality]
+            if min_frames is not None:
+                query += " AND num_frames >= ?"
+                params.append(min_frames)
+            if max_frames is not None:
+                query += " AND num_frames <= ?"
+                params.append(max_frames)
+            rows = self.connection.execute(query, params)
+        return natsorted(scene_id for (scene_id,) in rows)
+
+    def has_scene(self, scene_id: str) -> bool:
+        row = self.connection.execute(
+            "SELECT 1 FROM scenes WHERE scene_id = ?", (scene_id,)
+        ).fetchone()
+        return row is not None
+
+    def num_frames(self, scene_id: str) -> Dict[str, int]:
+        rows = self.connection.execute(
+            "SELECT modality, num_frames FROM modalities WHERE scene_id = ?",
+            (scene_id,),
+        )
+        return dict(rows)
+
+    def record(self, scene_id: str) -> SceneRecord:
+        if not self.has_scene(scene_id):
+            raise KeyError(f"Scene {scene_id} is not in {self.index_path}")
+        record = SceneRecord(scene_id, os.path.join(self.data_dir, scene_id))
+        for modality, path, num_frames in self.connection.execute(
+            "SELECT modality, path, num_frames FROM modalities WHERE scene_id = ?",
+            (scene_id,),
+        ):
+            record.modalities[modality] = (path, num_frames)
+        for modality, path in self.connection.execute(
+            "SELECT modality, path FROM frames WHERE scene_id = ? "
+            "ORDER BY modality, frame",
+            (scene_id,),
+        ):
+            record.frames.setdefault(modality, []).append(path)
+        for modality, cameras, images, image_names, metadata in self.connection.execute(
+            "SELECT modality, cameras, images, image_names, metadata FROM cameras "
+            "WHERE scene_id = ?",
+            (scene_id,),
+        ):
+            record.cameras[modality] = {
+                "cameras": _from_blob(cameras, CAMERA_DTYPE),
+                "images": _from_blob(images, IMAGE_DTYPE),
+                "image_names": np.array(json.loads(image_names), dtype=str)
+                if image_names is not None
+                else None,
+                "metadata": json.loads(metadata),
+            }
+        return record
+
+
+def _to_blob(array: np.ndarray) -> bytes:
+    return None if array is None else np.ascontiguousarray(array).tobytes()
+
+
+def _from_blob(blob: bytes, dtype: np.dtype) -> np.ndarray:
+    return None if blob is None else np.frombuffer(blob, dtype=dtype).copy()
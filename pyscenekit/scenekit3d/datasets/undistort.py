@@ -0,0 +1,193 @@
+import os
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from pyscenekit.utils.common import log
+from pyscenekit.scenekit2d.cache import hash_values
+
+# bump when the cached maps change, e.g. a different map format
+MAPS_VERSION = 1
+
+
+def target_size(width: int, height: int, target_resolution: int = 0) -> Tuple[int, int]:
+    # target_resolution is the output width as in the mesh exports, 0 keeps the size
+    if not target_resolution or target_resolution == width:
+        return width, height
+    scale = target_resolution / width
+    return int(target_resolution), int(round(height * scale))
+
+
+class Undistorter:
+    """
+    Undistorts the images of one camera with cv2.remap.
+
+    The remap tables are built once in the CV_16SC2 fixed point format, which
+    remaps faster than float maps and takes half the memory, and cached as npz
+    in cache_dir keyed by the camera parameters. With target_resolution the images are
+    undistorted straight to that width, new_K is scaled to match, instead of
+    undistorting at full size and resizing afterwards. The remap samples the
+    source, for large reductions downscale the input first to avoid aliasing.
+
+    undistort_batch runs on a pool of num_workers threads, cv2 releases the GIL.
+    """
+
+    def __init__(
+        self,
+        K: np.ndarray,
+        distortion_params: np.ndarray,
+        width: int,
+        height: int,
+        new_K: np.ndarray,
+        fisheye: bool = False,
+        target_resolution: int = 0,
+        cache_dir: str = None,
+        num_workers: int = 4,
+    ):
+        self.K = np.asarray(K, dtype=np.float64)
+        self.distortion_params = np.asarray(distortion_params, dtype=np.float64)
+        self.input_width, self.input_height = int(width), int(height)
+        self.fisheye = fisheye
+        self.width, self.height = target_size(
+            self.input_width, self.input_height, target_resolution
+        )
+        # intrinsics of the output images
+        self.new_K = np.array(new_K, dtype=np.float64)
+        self.new_K[0] *= self.width / self.input_width
+        self.new_K[1] *= self.height / self.input_height
+
+        self.cache_dir = cache_dir
+        self.num_workers = num_workers
+        self._maps = None
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if getattr(self, "_executor", None) is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def key(self) -> str:
+        return hash_values(
+            MAPS_VERSION,
+            self.K,
+            self.distortion_params,
+            self.input_width,
+            self.input_height,
+            self.new_K,
+            self.width,
+            self.height,
+            self.fisheye,
+        )
+
+    @property
+    def cache_path(self) -> str:
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f"{self.key}.npz")
+
+    @property
+    def maps(self) -> Tuple[np.ndarray, np.ndarray]:
+        # built or loaded on first use, once for all threads
+        if self._maps is None:
+            with self._lock:
+                if self._maps is None:
+                    self._maps = self._load_maps()
+                    if self._maps is None:
+                        self._maps = self._build_maps()
+                        self._save_maps()
+        return self._maps
+
+    def _build_maps(self) -> Tuple[np.ndarray, np.ndarray]:
+        init = (
+            cv2.fisheye.initUndistortRectifyMap
+            if self.fisheye
+            else cv2.initUndistortRectifyMap
+        )
+        return init(
+            self.K,
+            self.distortion_params,
+            np.eye(3),
+            self.new_K,
+            (self.width, self.height),
+            cv2.CV_16SC2,
+        )
+
+    def _load_maps(self):
+        path = self.cache_path
+        if path is None or not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return data["map1"], data["map2"]
+        except (OSError, ValueError, KeyError) as e:
+            log.warning(f"Ignoring unreadable undistortion maps {path}: {e}")
+            return None
+
+    def _save_maps(self):
+        path = self.cache_path
+        if path is None:
+            return
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                np.savez(f, map1=self._maps[0], map2=self._maps[1])
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning(f"Could not cache undistortion maps to {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def undistort(
+        self,
+        image: np.ndarray,
+        interpolation: int = cv2.INTER_LINEAR,
+        border_mode: int = cv2.BORDER_REFLECT_101,
+        border_value=0,
+    ) -> np.ndarray:
+        map1, map2 = self.maps
+        return cv2.remap(
+            image,
+            map1,
+            map2,
+            interpolation=interpolation,
+            borderMode=border_mode,
+            borderValue=border_value,
+        )
+
+    def undistort_mask(self, mask: np.ndarray) -> np.ndarray:
+        # 255 marks valid pixels, pixels blended with an invalid one become 0
+        if np.all(mask > 0):
+            return np.full((self.height, self.width), 255, dtype=np.uint8)
+        mask = self.undistort(mask, border_mode=cv2.BORDER_CONSTANT, border_value=255)
+        mask[mask < 255] = 0
+        return mask
+
+    def map(self, function: Callable, items: Sequence) -> List:
+        """
+        Apply function to items on the thread pool, e.g. to read and undistort
+        frames together. Results keep the order of items.
+        """
+        if self.num_workers <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_workers)
+        return list(self._executor.map(function, items))
+
+    def undistort_batch(self, images: Sequence[np.ndarray], **kwargs) -> List:
+        return self.map(lambda image: self.undistort(image, **kwargs), images)
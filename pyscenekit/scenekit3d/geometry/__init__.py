@@ -0,0 +1,20 @@
+from pyscenekit.utils.lazy import lazy_attributes
+
+__getattr__ = lazy_attributes(
+    __name__,
+    {
+        "RGBDUnprojector": "pyscenekit.scenekit3d.geometry.unproject",
+        "TSDFVolume": "pyscenekit.scenekit3d.geometry.tsdf",
+        "UnprojectedPoints": "pyscenekit.scenekit3d.geometry.unproject",
+        "unproject_frames": "pyscenekit.scenekit3d.geometry.unproject",
+        "depth_to_normals": "pyscenekit.scenekit3d.geometry.normals",
+    },
+)
+
+__all__ = [
+    "RGBDUnprojector",
+    "TSDFVolume",
+    "UnprojectedPoints",
+    "depth_to_normals",
+    "unproject_frames",
+]
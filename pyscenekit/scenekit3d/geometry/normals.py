@@ -0,0 +1,124 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def _camera_points(depths: np.ndarray, intrinsics: np.ndarray) -> np.ndarray:
+    # (3, N, H, W) camera space points of depths (N, H, W), intrinsics (N, 3, 3)
+    _, height, width = depths.shape
+    x = np.arange(width, dtype=np.float32)[None, None, :]
+    y = np.arange(height, dtype=np.float32)[None, :, None]
+    fx, fy = intrinsics[:, 0, 0, None, None], intrinsics[:, 1, 1, None, None]
+    cx, cy = intrinsics[:, 0, 2, None, None], intrinsics[:, 1, 2, None, None]
+    return np.stack(
+        [(x - cx) / fx * depths, (y - cy) / fy * depths, depths]
+    ).astype(np.float32, copy=False)
+
+
+def _tangent(
+    points: np.ndarray, valid: np.ndarray, axis: int, rtol: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Difference to the next pixel along axis of (3, N, H, W) points, taken
+    forward or backward towards the neighbour with the closer depth.
+    Neighbours further than rtol * depth are across a depth edge and not used.
+    """
+
+    def along(index: slice, ndim: int = 3):
+        # slice the image axis of (N, H, W) or (3, N, H, W) arrays
+        return (slice(None),) * (ndim - 3 + axis) + (index,)
+
+    # forward differences, shared by pixel i forward and pixel i + 1 backward
+    difference = np.diff(points, axis=axis + 1)
+    pair_valid = valid[along(slice(1, None))] & valid[along(slice(None, -1))]
+    gap = np.where(pair_valid, np.abs(difference[2]), np.float32(np.inf))
+
+    forward_gap = np.full(valid.shape, np.inf, dtype=np.float32)
+    backward_gap = np.full(valid.shape, np.inf, dtype=np.float32)
+    forward_gap[along(slice(None, -1))] = gap
+    backward_gap[along(slice(1, None))] = gap
+    forward = forward_gap <= backward_gap
+
+    tangent = np.zeros(points.shape, dtype=np.float32)
+    tangent[along(slice(1, None), 4)] = difference
+    np.copyto(
+        tangent[along(slice(None, -1), 4)],
+        difference,
+        where=forward[along(slice(None, -1))],
+    )
+    depths = points[2]
+    tangent_valid = valid & (np.minimum(forward_gap, backward_gap) <= rtol * depths)
+    return tangent, tangent_valid
+
+
+def depth_to_normals(
+    depths: np.ndarray,
+    intrinsics: np.ndarray,
+    masks: np.ndarray = None,
+    extrinsics: np.ndarray = None,
+    rtol: float = 0.05,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normals of depth maps from the image grid, without a neighbour search.
+
+    depths is (H, W) or (N, H, W) in meters, or millimeters for uint16, with
+    intrinsics (3, 3) or (N, 3, 3) and optional masks of valid pixels. The
+    horizontal and vertical tangents use the neighbour with the closer depth,
+    pixels whose neighbours on both sides of an axis differ by more than
+    rtol * depth lie on a depth edge and are invalid.
+
+    Returns normals (..., H, W, 3) facing the camera, in camera space or in
+    world space with world to camera extrinsics (4, 4) or (N, 4, 4), and the
+    mask of valid normals (..., H, W).
+    """
+    depths = np.asarray(depths)
+    single = depths.ndim == 2
+    if depths.dtype == np.uint16:
+        depths = depths.astype(np.float32) / 1000.0
+    depths = depths.astype(np.float32, copy=False)
+    if single:
+        depths = depths[None]
+    intrinsics = np.asarray(intrinsics, dtype=np.float32)
+    if intrinsics.ndim == 2:
+        intrinsics = np.repeat(intrinsics[None], len(depths), axis=0)
+
+    valid = np.isfinite(depths) & (depths > 0)
+    if masks is not None:
+        valid &= np.asarray(masks, dtype=bool).reshape(depths.shape)
+    depths = np.where(valid, depths, 0.0)
+    points = _camera_points(depths, intrinsics)
+
+    dx, valid_x = _tangent(points, valid, 2, rtol)
+    dy, valid_y = _tangent(points, valid, 1, rtol)
+    # x right, y down, z forward: dy x dx points towards the camera
+    normals = np.stack(
+        [
+            dy[1] * dx[2] - dy[2] * dx[1],
+            dy[2] * dx[0] - dy[0] * dx[2],
+            dy[0] * dx[1] - dy[1] * dx[0],
+        ]
+    )
+    norm = np.sqrt((normals * normals).sum(axis=0))
+    valid = valid_x & valid_y & (norm > 0)
+    normals *= np.where(valid, 1.0 / np.where(valid, norm, 1.0), 0.0)
+    normals = np.moveaxis(normals, 0, -1)
+
+    if extrinsics is not None:
+        rotations = np.asarray(extrinsics, dtype=np.float32).reshape(-1, 4, 4)
+        # camera to world rotation, R^T n written for row vectors
+        shape = normals.shape
+        normals = np.matmul(
+            normals.reshape(len(normals), -1, 3), rotations[:, :3, :3]
+        ).reshape(shape)
+
+    if single:
+        return normals[0], valid[0]
+    return normals, valid
+
+
+def normals_to_image(normals: np.ndarray, valid: np.ndarray = None) -> np.ndarray:
+    # uint8 RGB encoding of camera facing normals, invalid pixels are black
+    image = ((1.0 - normals) * 127.5).clip(0, 255).astype(np.uint8)
+    if valid is not None:
+        image[~valid] = 0
+    return image
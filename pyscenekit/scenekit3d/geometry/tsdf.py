@@ -0,0 +1,453 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple, Union
+
+import numpy as np
+
+from pyscenekit.utils.common import log
+from pyscenekit.scenekit3d.common import SceneKitCamera, SceneKitMesh
+from pyscenekit.scenekit3d.geometry.unproject import (
+    RGBDUnprojector,
+    cameras_to_arrays,
+    iter_rgbd_chunks,
+)
+
+# block coordinates are packed into one int64 key, 21 bits per axis
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+# the 8 corners of a cube, e.g. the neighbours padding a block for marching cubes
+_CORNERS = np.array(
+    [[x, y, z] for x in (0, 1) for y in (0, 1) for z in (0, 1)], dtype=np.int64
+)
+
+
+def pack_keys(coords: np.ndarray) -> np.ndarray:
+    coords = np.asarray(coords, dtype=np.int64) + _KEY_OFFSET
+    x, y, z = coords[..., 0], coords[..., 1], coords[..., 2]
+    return (x << (2 * _KEY_BITS)) | (y << _KEY_BITS) | z
+
+
+def unpack_keys(keys: np.ndarray) -> np.ndarray:
+    keys = np.asarray(keys, dtype=np.int64)
+    coords = np.stack([keys >> (2 * _KEY_BITS), keys >> _KEY_BITS, keys], axis=-1)
+    return (coords & _KEY_MASK) - _KEY_OFFSET
+
+
+class TSDFVolume:
+    """
+    Truncated signed distance volume stored in a sparse voxel block hash.
+
+    Space is split into blocks of block_size^3 voxels and only blocks within
+    sdf_trunc of an observed surface are allocated, so memory grows with the
+    surface area instead of the scene bounds. Blocks live in pooled arrays
+    indexed through a dict from packed block coordinates to slots.
+
+    Frames are integrated in batches, the blocks touched by a batch are split
+    between num_workers threads that each integrate all frames of the batch
+    into their own blocks, so results do not depend on the number of workers.
+    """
+
+    def __init__(
+        self,
+        voxel_size: float = 0.02,
+        sdf_trunc: float = None,
+        block_size: int = 8,
+        depth_trunc: float = 5.0,
+        max_weight: float = 255.0,
+        with_color: bool = True,
+        num_workers: int = 4,
+        allocation_stride: int = 4,
+        initial_capacity: int = 1024,
+    ):
+        self.voxel_size = float(voxel_size)
+        self.sdf_trunc = float(sdf_trunc) if sdf_trunc else 4 * self.voxel_size
+        self.block_size = int(block_size)
+        self.depth_trunc = depth_trunc
+        self.max_weight = max_weight
+        self.with_color = with_color
+        self.num_workers = num_workers
+        # pixel stride of the points used to find touched blocks
+        self.allocation_stride = allocation_stride
+
+        self.blocks: Dict[int, int] = {}
+        shape = (initial_capacity,) + (self.block_size,) * 3
+        self.keys = np.zeros(initial_capacity, dtype=np.int64)
+        self.tsdf = np.ones(shape, dtype=np.float32)
+        self.weight = np.zeros(shape, dtype=np.float32)
+        self.color = np.zeros(shape + (3,), dtype=np.float32) if with_color else None
+
+        self._unprojector = RGBDUnprojector(depth_trunc=depth_trunc)
+        self._local_grid = (
+            np.stack(
+                np.meshgrid(*[np.arange(self.block_size)] * 3, indexing="ij"), axis=-1
+            )
+            .reshape(-1, 3)
+            .astype(np.float32)
+        )
+        self._executor = None
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def block_length(self) -> float:
+        return self.block_size * self.voxel_size
+
+    @property
+    def nbytes(self) -> int:
+        # memory of the allocated blocks
+        voxels = len(self.blocks) * self.block_size**3
+        return voxels * (8 + (12 if self.with_color else 0))
+
+    def _map(self, function, items: Sequence) -> List:
+        if self.num_workers <= 1 or len(items) <= 1:
+            return [function(item) for item in items]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.num_workers)
+        return list(self._executor.map(function, items))
+
+    def _grow(self, capacity: int):
+        old = len(self.keys)
+        if capacity <= old:
+            return
+        capacity = max(capacity, 2 * old)
+        shape = (capacity - old,) + self.tsdf.shape[1:]
+        self.keys = np.concatenate([self.keys, np.zeros(capacity - old, np.int64)])
+        self.tsdf = np.concatenate([self.tsdf, np.ones(shape, np.float32)])
+        self.weight = np.concatenate([self.weight, np.zeros(shape, np.float32)])
+        if self.with_color:
+            color = np.zeros(shape + (3,), np.float32)
+            self.color = np.concatenate([self.color, color])
+
+    def allocate(self, keys: np.ndarray) -> np.ndarray:
+        """
+        Slots of the blocks with the given packed keys, allocating missing ones.
+        """
+        slots = self.lookup(keys)
+        missing = np.flatnonzero(slots < 0)
+        if len(missing):
+            start = len(self.blocks)
+            self._grow(start + len(missing))
+            new_slots = np.arange(start, start + len(missing))
+            self.keys[new_slots] = keys[missing]
+            self.blocks.update(zip(keys[missing].tolist(), new_slots.tolist()))
+            slots[missing] = new_slots
+        return slots
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        # slots of the blocks, -1 for blocks that are not allocated
+        keys = np.asarray(keys)
+        slots = [self.blocks.get(key, -1) for key in keys.ravel().tolist()]
+        return np.array(slots, dtype=np.int64).reshape(keys.shape)
+
+    def _touched_blocks(
+        self, depths: np.ndarray, intrinsics: np.ndarray, extrinsics: np.ndarray
+    ) -> List[np.ndarray]:
+        # keys of the blocks within sdf_trunc of the points of every frame
+        stride = self.allocation_stride
+        # pixel x of the strided image is pixel x * stride of the full one
+        intrinsics = intrinsics.copy()
+        intrinsics[:, :2] /= stride
+        points = self._unprojector.unproject(
+            depths[:, ::stride, ::stride], intrinsics, extrinsics
+        )
+        # steps of at most a block length cover every block of the box
+        steps = int(np.ceil(2 * self.sdf_trunc / self.block_length)) + 1
+        axis = np.linspace(-self.sdf_trunc, self.sdf_trunc, steps)
+        offsets = np.stack(np.meshgrid(axis, axis, axis), axis=-1).reshape(-1, 3)
+        touched = []
+        for i in range(len(depths)):
+            frame_points = points.frame(i).points
+            coords = np.floor(
+                (frame_points[:, None] + offsets) / self.block_length
+            ).astype(np.int64)
+            touched.append(np.unique(pack_keys(coords)))
+        return touched
+
+    def integrate(
+        self,
+        depths: np.ndarray,
+        intrinsics: np.ndarray,
+        extrinsics: np.ndarray,
+        colors: np.ndarray = None,
+    ):
+        """
+        Integrate a batch of depth maps (N, H, W) in meters, or millimeters for
+        uint16, with intrinsics (N, 3, 3) and world to camera extrinsics
+        (N, 4, 4). Colors (N, H, W, 3) must match the depth size.
+        """
+        depths = np.asarray(depths)
+        if len(depths) == 0:
+            return
+        if depths.dtype == np.uint16:
+            depths = depths.astype(np.float32) / 1000.0
+        depths = depths.astype(np.float32, copy=False)
+        intrinsics = np.asarray(intrinsics, dtype=np.float64)
+        if intrinsics.ndim == 2:
+            intrinsics = np.repeat(intrinsics[None], len(depths), axis=0)
+        extrinsics = np.asarray(extrinsics, dtype=np.float64)
+        if colors is not None and not self.with_color:
+            colors = None
+
+        touched = self._touched_blocks(depths, intrinsics, extrinsics)
+        all_keys = np.unique(np.concatenate(touched))
+        self.allocate(all_keys)
+        frame_slots = [self.lookup(keys) for keys in touched]
+
+        # slot modulo workers splits the blocks, no two threads share a block
+        num_parts = max(min(self.num_workers, len(all_keys)), 1)
+
+        def integrate_part(part: int):
+            for i in range(len(depths)):
+                slots = frame_slots[i]
+                slots = slots[slots % num_parts == part]
+                if len(slots):
+                    self._integrate_blocks(
+                        slots,
+                        depths[i],
+                        intrinsics[i],
+                        extrinsics[i],
+                        None if colors is None else colors[i],
+                    )
+
+        self._map(integrate_part, list(range(num_parts)))
+
+    def _integrate_blocks(
+        self,
+        slots: np.ndarray,
+        depth: np.ndarray,
+        intrinsics: np.ndarray,
+        extrinsics: np.ndarray,
+        color: np.ndarray,
+    ):
+        height, width = depth.shape
+        origins = unpack_keys(self.keys[slots]) * self.block_size
+        voxels = origins[:, None].astype(np.float32) + self._local_grid
+        voxels *= self.voxel_size
+        rotation = extrinsics[:3, :3].astype(np.float32)
+        translation = extrinsics[:3, 3].astype(np.float32)
+        points = voxels @ rotation.T + translation
+        z = points[..., 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            u = np.round(intrinsics[0, 0] * points[..., 0] / z + intrinsics[0, 2])
+            v = np.round(intrinsics[1, 1] * points[..., 1] / z + intrinsics[1, 2])
+        valid = (z > 0) & (u >= 0) & (u < width) & (v >= 0) & (v < height)
+        u = np.where(valid, u, 0).astype(np.int64)
+        v = np.where(valid, v, 0).astype(np.int64)
+        d = depth[v, u]
+        sdf = d - z
+        valid &= (d > 0) & (d < self.depth_trunc) & (sdf >= -self.sdf_trunc)
+        if not valid.any():
+            return
+
+        block_index, voxel_index = np.nonzero(valid)
+        tsdf = np.minimum(sdf[valid] / self.sdf_trunc, 1.0)
+        flat = self.block_size**3
+        index = slots[block_index] * flat + voxel_index
+        tsdf_flat = self.tsdf.reshape(-1)
+        weight_flat = self.weight.reshape(-1)
+
+        weight = weight_flat[index]
+        new_weight = weight + 1
+        tsdf_flat[index] = (tsdf_flat[index] * weight + tsdf) / new_weight
+        if color is not None:
+            color_flat = self.color.reshape(-1, 3)
+            sample = color[v[valid], u[valid]].astype(np.float32)
+            color_flat[index] = (
+                color_flat[index] * weight[:, None] + sample
+            ) / new_weight[:, None]
+        weight_flat[index] = np.minimum(new_weight, self.max_weight)
+
+    def integrate_frames(
+        self,
+        cameras: Sequence[SceneKitCamera],
+        depths: Sequence[Union[str, np.ndarray]],
+        colors: Sequence[Union[str, np.ndarray]] = None,
+        target_resolution: int = 0,
+        batch_size: int = 16,
+    ):
+        """
+        Stream depth and color images, paths or arrays, of cameras into the
+        volume batch_size frames at a time. Only one batch is held in memory,
+        the next one is read while the current one is integrated.
+        """
+        if len(depths) != len(cameras):
+            raise ValueError(f"{len(depths)} depth images for {len(cameras)} cameras")
+        if colors is not None and len(colors) != len(cameras):
+            raise ValueError(f"{len(colors)} color images for {len(cameras)} cameras")
+        if not self.with_color:
+            colors = None
+        for start, batch_depths, batch_colors in iter_rgbd_chunks(
+            depths,
+            colors,
+            target_resolution=target_resolution,
+            chunk_size=batch_size,
+            num_workers=self.num_workers,
+        ):
+            batch_cameras = cameras[start : start + len(batch_depths)]
+            intrinsics, extrinsics = cameras_to_arrays(
+                batch_cameras, batch_depths.shape[2]
+            )
+            self.integrate(batch_depths, intrinsics, extrinsics, batch_colors)
+        log.info(
+            f"Integrated {len(depths)} frames into {len(self)} blocks, "
+            f"{self.nbytes / 2**20:.1f} MB"
+        )
+
+    def _padded_blocks(self, slots: np.ndarray) -> Tuple[np.ndarray, ...]:
+        # blocks extended by one voxel from their +x, +y, +z neighbours
+        size = self.block_size
+        keys = unpack_keys(self.keys[slots])
+        neighbours = self.lookup(pack_keys(keys[:, None] + _CORNERS))
+        shape = (len(slots),) + (size + 1,) * 3
+        tsdf = np.ones(shape, dtype=np.float32)
+        weight = np.zeros(shape, dtype=np.float32)
+        color = np.zeros(shape + (3,), np.float32) if self.with_color else None
+        for corner, (x, y, z) in enumerate(_CORNERS):
+            target = (
+                slice(None),
+                slice(size) if x == 0 else slice(size, size + 1),
+                slice(size) if y == 0 else slice(size, size + 1),
+                slice(size) if z == 0 else slice(size, size + 1),
+            )
+            source = (
+                slice(size) if x == 0 else slice(0, 1),
+                slice(size) if y == 0 else slice(0, 1),
+                slice(size) if z == 0 else slice(0, 1),
+            )
+            found = neighbours[:, corner] >= 0
+            rows = (neighbours[found, corner],) + source
+            tsdf[target][found] = self.tsdf[rows]
+            weight[target][found] = self.weight[rows]
+            if color is not None:
+                color[target][found] = self.color[rows]
+        return tsdf, weight, color
+
+    def extract_arrays(
+        self, min_weight: float = 0.0, chunk_size: int = 4096
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vertices (V, 3) float32, faces (F, 3) int64 and vertex colors (V, 3)
+        uint8, or None without color, of the zero level set.
+        """
+        # scikit-image is optional, only needed to extract meshes
+        from skimage.measure import marching_cubes
+
+        slots = np.arange(len(self.blocks))
+        occupied = (self.weight[slots] > min_weight).reshape(len(slots), -1).any(1)
+        slots = slots[occupied]
+        size = self.block_size
+        side = size + 1
+
+        def extract(chunk: np.ndarray):
+            tsdf, weight, color = self._padded_blocks(chunk)
+            observed = weight > min_weight
+            # a cube is valid when all 8 corners were observed, marching cubes
+            # tests the mask at the corner opposite to the cube origin
+            cubes = np.zeros_like(observed)
+            cubes[:, 1:, 1:, 1:] = np.logical_and.reduce(
+                [
+                    observed[:, x : x + size, y : y + size, z : z + size]
+                    for x, y, z in _CORNERS
+                ]
+            )
+            # skip blocks without a sign change
+            signs = np.where(observed, np.sign(tsdf), 0)
+            crossing = cubes.reshape(len(chunk), -1).any(1) & (
+                (signs > 0).reshape(len(chunk), -1).any(1)
+                & (signs < 0).reshape(len(chunk), -1).any(1)
+            )
+            if not crossing.any():
+                return None
+            chunk, tsdf, cubes = chunk[crossing], tsdf[crossing], cubes[crossing]
+            color = None if color is None else color[crossing]
+            # blocks are stacked along x, the masked first layer keeps cubes
+            # from spanning two blocks
+            try:
+                vertices, faces, _, _ = marching_cubes(
+                    tsdf.reshape(-1, side, side),
+                    level=0.0,
+                    mask=cubes.reshape(-1, side, side),
+                    gradient_direction="descent",
+                )
+            except (ValueError, RuntimeError):
+                return None
+            block = (vertices[:, 0] // side).astype(np.int64)
+            block = np.minimum(block, len(chunk) - 1)
+            local = vertices.copy()
+            local[:, 0] -= block * side
+            origins = unpack_keys(self.keys[chunk]) * size
+            # vertices in voxel units of the global grid
+            grid = origins[block] + local
+            vertex_colors = None
+            if color is not None:
+                nearest = np.clip(np.round(local).astype(np.int64), 0, size)
+                vertex_colors = color[
+                    block, nearest[:, 0], nearest[:, 1], nearest[:, 2]
+                ]
+            return grid, faces.astype(np.int64), vertex_colors
+
+        chunks = [slots[i : i + chunk_size] for i in range(0, len(slots), chunk_size)]
+        results = [r for r in self._map(extract, chunks) if r is not None]
+        if not results:
+            colors = np.zeros((0, 3), np.uint8) if self.with_color else None
+            return np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int64), colors
+
+        offsets = np.cumsum([0] + [len(vertices) for vertices, _, _ in results])
+        vertices = np.concatenate([vertices for vertices, _, _ in results])
+        faces = np.concatenate(
+            [faces + offset for (_, faces, _), offset in zip(results, offsets)]
+        )
+        colors = None
+        if self.with_color:
+            colors = np.concatenate([colors for _, _, colors in results])
+
+        # vertices on block faces are produced by both blocks, weld them by the
+        # grid edge they lie on, two coordinates are integers
+        nearest = np.round(vertices)
+        offset = np.abs(vertices - nearest)
+        axis = np.argmax(offset, axis=1)
+        on_edge = offset[np.arange(len(vertices)), axis] > 1e-6
+        edges = nearest.astype(np.int64)
+        rows = np.flatnonzero(on_edge)
+        edges[rows, axis[rows]] = np.floor(vertices[rows, axis[rows]])
+        edges = np.concatenate([edges, np.where(on_edge, axis, 3)[:, None]], axis=1)
+        _, unique, inverse = np.unique(
+            edges, axis=0, return_index=True, return_inverse=True
+        )
+        vertices = (vertices[unique] * self.voxel_size).astype(np.float32)
+        faces = inverse.ravel()[faces]
+        if colors is not None:
+            colors = np.clip(np.round(colors[unique]), 0, 255).astype(np.uint8)
+        degenerate = (
+            (faces[:, 0] == faces[:, 1])
+            | (faces[:, 1] == faces[:, 2])
+            | (faces[:, 0] == faces[:, 2])
+        )
+        return vertices, faces[~degenerate], colors
+
+    def extract_mesh(self, min_weight: float = 0.0, output_path: str = None):
+        """
+        Mesh of the zero level set as a trimesh SceneKitMesh.
+        """
+        import trimesh
+
+        vertices, faces, colors = self.extract_arrays(min_weight)
+        mesh = trimesh.Trimesh(
+            vertices=vertices, faces=faces, vertex_colors=colors, process=False
+        )
+        if output_path is not None:
+            mesh.export(output_path)
+        return SceneKitMesh(mesh)
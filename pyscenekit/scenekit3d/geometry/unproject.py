@@ -0,0 +1,455 @@
+import os
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+from pyscenekit.utils.common import log
+from pyscenekit.scenekit3d.common import SceneKitCamera
+
+BACKENDS = ("numpy", "torch")
+
+
+@dataclass
+class UnprojectedPoints:
+    """
+    World space points of a batch of frames, sorted by frame.
+
+    frame_indices holds the frame of every point and pixels its (x, y) pixel,
+    colors is None when the frames had no color.
+    """
+
+    points: np.ndarray
+    colors: np.ndarray
+    frame_indices: np.ndarray
+    pixels: np.ndarray
+
+    def __len__(self):
+        return len(self.points)
+
+    def frame(self, frame_index: int) -> "UnprojectedPoints":
+        start, stop = np.searchsorted(
+            self.frame_indices, [frame_index, frame_index + 1]
+        )
+        return UnprojectedPoints(
+            self.points[start:stop],
+            None if self.colors is None else self.colors[start:stop],
+            self.frame_indices[start:stop],
+            self.pixels[start:stop],
+        )
+
+
+def cameras_to_arrays(
+    cameras: Sequence[SceneKitCamera], width: int = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stack the intrinsics (N, 3, 3) and extrinsics (N, 4, 4) of cameras, with the
+    intrinsics scaled to images of the given width as in SceneKitStructuredPointCloud.
+    """
+    intrinsics = np.stack([np.asarray(c.intrinsics, np.float64) for c in cameras])
+    extrinsics = np.stack([np.asarray(c.extrinsics, np.float64) for c in cameras])
+    if width is not None:
+        scales = np.array([width / camera.width for camera in cameras])
+        intrinsics[:, :2] *= scales[:, None, None]
+    return intrinsics, extrinsics
+
+
+def read_depth(depth: Union[str, np.ndarray]) -> np.ndarray:
+    if isinstance(depth, str):
+        depth_path, depth = depth, cv2.imread(depth, cv2.IMREAD_UNCHANGED)
+        if depth is None:
+            raise FileNotFoundError(f"Could not read depth image {depth_path}")
+    # 16-bit depth pngs store millimeters
+    if depth.dtype == np.uint16:
+        return depth.astype(np.float32) / 1000.0
+    return depth.astype(np.float32)
+
+
+def read_rgb(rgb: Union[str, np.ndarray]) -> np.ndarray:
+    if isinstance(rgb, str):
+        rgb_path, rgb = rgb, cv2.imread(rgb)
+        if rgb is None:
+            raise FileNotFoundError(f"Could not read image {rgb_path}")
+        return cv2.cvtColor(rgb, cv2.COLOR_BGR2RGB)
+    if rgb.dtype != np.uint8:
+        return (rgb * 255).astype(np.uint8)
+    return rgb
+
+
+def read_rgbd_frame(
+    depth: Union[str, np.ndarray],
+    rgb: Union[str, np.ndarray] = None,
+    target_resolution: int = 640,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Depth in meters resized to target_resolution wide (0 keeps the size) and
+    the RGB image resized to the depth, or None without rgb. Both are image
+    paths or arrays.
+    """
+    depth = read_depth(depth)
+    height, width = depth.shape[:2]
+    if target_resolution and width != target_resolution:
+        size = (target_resolution, int(height * target_resolution / width))
+        depth = cv2.resize(depth, size, interpolation=cv2.INTER_NEAREST)
+
+    if rgb is not None:
+        rgb = read_rgb(rgb)
+        if rgb.shape[:2] != depth.shape[:2]:
+            size = (depth.shape[1], depth.shape[0])
+            rgb = cv2.resize(rgb, size, interpolation=cv2.INTER_LINEAR)
+    return depth, rgb
+
+
+class RGBDUnprojector:
+    """
+    Unprojects stacks of depth maps to world space points in one pass.
+
+    Depths (N, H, W) are in meters, or millimeters for uint16, intrinsics
+    (N, 3, 3) or one (3, 3) matrix and extrinsics (N, 4, 4) world to camera
+    matrices, as SceneKitCamera. The camera rays of every intrinsic matrix and
+    image size are computed once and kept in an LRU cache of max_cached_rays
+    grids. Frames are processed chunk_size at a time to bound the memory.
+
+    backend "numpy" runs on the CPU, "torch" runs the same math on device.
+    """
+
+    def __init__(
+        self,
+        backend: str = "numpy",
+        device: str = "cpu",
+        depth_scale: float = 1.0,
+        depth_trunc: float = 20.0,
+        chunk_size: int = 16,
+        max_cached_rays: int = 8,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, expected {BACKENDS}")
+        self.backend = backend
+        self.device = device
+        self.depth_scale = depth_scale
+        self.depth_trunc = depth_trunc
+        self.chunk_size = chunk_size
+        self.max_cached_rays = max_cached_rays
+        self._rays = OrderedDict()
+
+    def rays(self, intrinsics: np.ndarray, height: int, width: int) -> np.ndarray:
+        """
+        Camera space rays with z = 1 of every pixel, shape (H * W, 3) float32.
+        """
+        intrinsics = np.asarray(intrinsics, dtype=np.float64)
+        key = (intrinsics.tobytes(), height, width)
+        rays = self._rays.get(key)
+        if rays is None:
+            x, y = np.meshgrid(np.arange(width), np.arange(height))
+            pixels = np.stack([x, y, np.ones_like(x)], axis=-1).reshape(-1, 3)
+            rays = (pixels @ np.linalg.inv(intrinsics).T).astype(np.float32)
+            self._rays[key] = rays
+            if len(self._rays) > self.max_cached_rays:
+                self._rays.popitem(last=False)
+        else:
+            self._rays.move_to_end(key)
+        return rays
+
+    def _depth_in_meters(self, depths: np.ndarray) -> np.ndarray:
+        if depths.dtype == np.uint16:
+            depths = depths.astype(np.float32) / 1000.0
+        depths = depths.astype(np.float32, copy=False)
+        if self.depth_scale != 1.0:
+            depths = depths / self.depth_scale
+        return depths
+
+    def unproject(
+        self,
+        depths: np.ndarray,
+        intrinsics: np.ndarray,
+        extrinsics: np.ndarray,
+        colors: np.ndarray = None,
+        masks: np.ndarray = None,
+        frame_offset: int = 0,
+    ) -> UnprojectedPoints:
+        """
+        Points of all valid pixels, depth in (0, depth_trunc) and mask set.
+        frame_offset is added to the frame indices, e.g. the index of the
+        first frame of a chunk in a longer sequence.
+        """
+        shared_intrinsics = np.ndim(intrinsics) == 2
+        chunks = []
+        for i in range(0, len(depths), self.chunk_size):
+            chunk = slice(i, i + self.chunk_size)
+            chunks.append(
+                self._unproject_chunk(
+                    depths[chunk],
+                    intrinsics if shared_intrinsics else intrinsics[chunk],
+                    extrinsics[chunk],
+                    None if colors is None else colors[chunk],
+                    None if masks is None else masks[chunk],
+                    frame_offset + i,
+                )
+            )
+        if len(chunks) == 0:
+            return UnprojectedPoints(
+                np.empty((0, 3), dtype=np.float32),
+                None if colors is None else np.empty((0, 3), np.asarray(colors).dtype),
+                np.empty(0, dtype=np.int32),
+                np.empty((0, 2), dtype=np.int32),
+            )
+        if len(chunks) == 1:
+            return chunks[0]
+        return UnprojectedPoints(
+            np.concatenate([chunk.points for chunk in chunks]),
+            None if colors is None else np.concatenate([c.colors for c in chunks]),
+            np.concatenate([chunk.frame_indices for chunk in chunks]),
+            np.concatenate([chunk.pixels for chunk in chunks]),
+        )
+
+    def _unproject_chunk(
+        self, depths, intrinsics, extrinsics, colors, masks, frame_offset
+    ) -> UnprojectedPoints:
+        depths = self._depth_in_meters(np.asarray(depths))
+        num_frames, height, width = depths.shape
+        extrinsics = np.asarray(extrinsics, dtype=np.float32).reshape(-1, 4, 4)
+
+        # frames usually share one camera, then a single ray grid is broadcast
+        intrinsics = np.asarray(intrinsics, dtype=np.float64)
+        if intrinsics.ndim == 2:
+            rays = self.rays(intrinsics, height, width)[None]
+        else:
+            unique, inverse = np.unique(
+                intrinsics.reshape(num_frames, 9), axis=0, return_inverse=True
+            )
+            grids = [self.rays(K.reshape(3, 3), height, width) for K in unique]
+            if len(grids) == 1:
+                rays = grids[0][None]
+            else:
+                rays = np.stack(grids)[inverse.ravel()]
+
+        valid = np.isfinite(depths) & (depths > 0) & (depths < self.depth_trunc)
+        if masks is not None:
+            valid &= np.asarray(masks, dtype=bool)
+        valid = valid.reshape(num_frames, -1)
+
+        depths = depths.reshape(num_frames, -1, 1)
+        rotations, translations = extrinsics[:, :3, :3], extrinsics[:, None, :3, 3]
+        if self.backend == "torch":
+            points = self._transform_torch(rays, depths, rotations, translations, valid)
+        else:
+            # x_world = R^T (x_cam - t), written for row vectors
+            points = np.matmul(rays * depths - translations, rotations)[valid]
+
+        frame_indices, pixel_indices = np.nonzero(valid)
+        pixels = np.stack([pixel_indices % width, pixel_indices // width], axis=-1)
+        if colors is not None:
+            colors = np.asarray(colors).reshape(num_frames, -1, 3)[valid]
+        return UnprojectedPoints(
+            points.astype(np.float32, copy=False),
+            colors,
+            (frame_indices + frame_offset).astype(np.int32),
+            pixels.astype(np.int32),
+        )
+
+    def _transform_torch(self, rays, depths, rotations, translations, valid):
+        import torch
+
+        def tensor(array):
+            return torch.from_numpy(np.ascontiguousarray(array)).to(self.device)
+
+        with torch.no_grad():
+            points = torch.matmul(
+                tensor(rays) * tensor(depths) - tensor(translations),
+                tensor(rotations),
+            )
+            points = points[tensor(valid)]
+        return points.cpu().numpy()
+
+
+class PLYWriter:
+    """
+    Binary PLY file written in chunks, for point clouds larger than memory.
+
+    The vertex count is patched into the header on close and the file is
+    moved into place atomically. with_indices adds the frame and pixel of
+    every point as int properties, which Open3D and trimesh ignore.
+    """
+
+    # room for the vertex count, patched on close
+    _COUNT_WIDTH = 12
+
+    def __init__(self, path: str, with_colors: bool = True, with_indices: bool = False):
+        self.path = path
+        fields = [("x", "<f4"), ("y", "<f4"), ("z", "<f4")]
+        if with_colors:
+            fields += [("red", "u1"), ("green", "u1"), ("blue", "u1")]
+        if with_indices:
+            fields += [("frame", "<i4"), ("px", "<i4"), ("py", "<i4")]
+        self.dtype = np.dtype(fields)
+        self.with_colors = with_colors
+        self.with_indices = with_indices
+        self.count = 0
+
+        self._tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(self._header(0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _header(self, count: int) -> bytes:
+        ply_types = {"f": "float", "u": "uchar", "i": "int"}
+        lines = [
+            "ply",
+            "format binary_little_endian 1.0",
+            f"element vertex {count:0{self._COUNT_WIDTH}d}",
+        ]
+        for name in self.dtype.names:
+            lines.append(f"property {ply_types[self.dtype[name].kind]} {name}")
+        lines.append("end_header")
+        return ("\n".join(lines) + "\n").encode("ascii")
+
+    def write(self, points: UnprojectedPoints):
+        vertices = np.empty(len(points), dtype=self.dtype)
+        vertices["x"], vertices["y"], vertices["z"] = points.points.T
+        if self.with_colors:
+            colors = points.colors
+            if colors is None:
+                colors = np.zeros((len(points), 3), dtype=np.uint8)
+            vertices["red"], vertices["green"], vertices["blue"] = colors.T
+        if self.with_indices:
+            vertices["frame"] = points.frame_indices
+            vertices["px"], vertices["py"] = points.pixels.T
+        self._file.write(vertices.tobytes())
+        self.count += len(points)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.seek(0)
+        self._file.write(self._header(self.count))
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._tmp_path)
+
+
+def write_ply(path: str, points: UnprojectedPoints, with_indices: bool = False):
+    with PLYWriter(
+        path, with_colors=points.colors is not None, with_indices=with_indices
+    ) as writer:
+        writer.write(points)
+
+
+def iter_rgbd_chunks(
+    depths: Sequence[Union[str, np.ndarray]],
+    rgbs: Sequence[Union[str, np.ndarray]] = None,
+    target_resolution: int = 640,
+    chunk_size: int = 16,
+    num_workers: int = 4,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Yield (first frame index, depths, colors) of chunk_size frames, from image
+    paths or arrays. Frames are decoded on a thread pool and the next chunk is
+    read while the caller processes the current one.
+    """
+    starts = list(range(0, len(depths), chunk_size))
+    if not starts:
+        return
+
+    def read_frame(i):
+        rgb = None if rgbs is None else rgbs[i]
+        return read_rgbd_frame(depths[i], rgb, target_resolution)
+
+    def submit(start):
+        stop = min(start + chunk_size, len(depths))
+        return [executor.submit(read_frame, i) for i in range(start, stop)]
+
+    with ThreadPoolExecutor(max_workers=max(num_workers, 1)) as executor:
+        pending = submit(starts[0])
+        for i, start in enumerate(starts):
+            frames = [future.result() for future in pending]
+            if i + 1 < len(starts):
+                pending = submit(starts[i + 1])
+            chunk_depths = np.stack([depth for depth, _ in frames])
+            chunk_colors = None
+            if rgbs is not None:
+                chunk_colors = np.stack([rgb for _, rgb in frames])
+            yield start, chunk_depths, chunk_colors
+
+
+def unproject_frames(
+    depth_paths: List[str],
+    cameras: List[SceneKitCamera],
+    rgb_paths: List[str] = None,
+    output_path: str = None,
+    output_dir: str = None,
+    target_resolution: int = 640,
+    unprojector: RGBDUnprojector = None,
+    num_workers: int = 4,
+    with_indices: bool = False,
+) -> int:
+    """
+    Unproject the depth images of cameras and stream the points to disk, to a
+    single PLY at output_path and/or one PLY per camera name in output_dir.
+    Returns the number of points written.
+    """
+    if output_path is None and output_dir is None:
+        raise ValueError("Pass output_path, output_dir or both")
+    if len(depth_paths) != len(cameras):
+        raise ValueError(
+            f"{len(depth_paths)} depth images for {len(cameras)} cameras"
+        )
+    unprojector = unprojector if unprojector is not None else RGBDUnprojector()
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    writer = None
+    if output_path is not None:
+        writer = PLYWriter(
+            output_path, with_colors=rgb_paths is not None, with_indices=with_indices
+        )
+    num_points = 0
+    try:
+        for start, depths, colors in iter_rgbd_chunks(
+            depth_paths,
+            rgb_paths,
+            target_resolution=target_resolution,
+            chunk_size=unprojector.chunk_size,
+            num_workers=num_workers,
+        ):
+            chunk_cameras = cameras[start : start + len(depths)]
+            intrinsics, extrinsics = cameras_to_arrays(chunk_cameras, depths.shape[2])
+            points = unprojector.unproject(
+                depths, intrinsics, extrinsics, colors, frame_offset=start
+            )
+            num_points += len(points)
+            if writer is not None:
+                writer.write(points)
+            if output_dir is not None:
+                for i, camera in enumerate(chunk_cameras):
+                    name = os.path.splitext(camera.name)[0]
+                    write_ply(
+                        os.path.join(output_dir, f"{name}.ply"),
+                        points.frame(start + i),
+                        with_indices=with_indices,
+                    )
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None:
+        writer.close()
+    log.info(f"Unprojected {len(depth_paths)} frames to {num_points} points")
+    return num_points
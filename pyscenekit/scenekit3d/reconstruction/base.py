@@ -4,9 +4,9 @@ from dataclasses import dataclass
 
 import cv2
 import torch
-import trimesh
 import numpy as np
-import open3d as o3d
+from pyscenekit.utils.lazy import lazy_import
+from pyscenekit.utils.registry import SharedModelMixin
 from pyscenekit.scenekit2d.utils import ImageInput
 from pyscenekit.scenekit2d.common import SceneKitImage
 from pyscenekit.scenekit3d.common import (
@@ -15,6 +15,9 @@ from pyscenekit.scenekit3d.common import (
     SceneKitPointCloud,
 )
 
+o3d = lazy_import("open3d")
+trimesh = lazy_import("trimesh")
+
 
 @dataclass
 class SingleViewReconstructionInput:
@@ -91,12 +94,13 @@ class SingleViewReconstructionOutput:
         )
 
 
-class SingleViewReconstructionModel(abc.ABC):
+class SingleViewReconstructionModel(SharedModelMixin, abc.ABC):
     @abc.abstractmethod
     def __init__(self, model_name: str = None):
         self.model_path = model_name
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
+        self._registry_key = None
 
         self.input: SceneKitImage = None
         self.output: SingleViewReconstructionOutput = None
@@ -114,13 +118,10 @@ class SingleViewReconstructionModel(abc.ABC):
     ) -> SingleViewReconstructionOutput:
         input_image = SceneKitImage(image)
         self.input = SingleViewReconstructionInput(input_image, camera)
+        self.ensure_model_loaded()
         output = self._predict()
         return output
 
-    @abc.abstractmethod
-    def to(self, device: str):
-        raise NotImplementedError
-
 
 @dataclass
 class MultiViewReconstructionInput:
@@ -251,16 +252,19 @@ class MultiViewReconstructionOutput:
         )
 
 
-class MultiViewReconstructionModel(abc.ABC):
+class MultiViewReconstructionModel(SharedModelMixin, abc.ABC):
     @abc.abstractmethod
     def __init__(self, model_name: str = None):
         self.model_path = model_name
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
+        self._registry_key = None
 
         # input and output are SceneKitImage objects
         self.input = MultiViewReconstructionInput()
         self.output = MultiViewReconstructionOutput()
+        # method specific parameters of the current call
+        self.options = {}
 
     @abc.abstractmethod
     def load_model(self):
@@ -271,13 +275,14 @@ class MultiViewReconstructionModel(abc.ABC):
         raise NotImplementedError
 
     def __call__(
-        self, image_list: ImageInput, camera_list: List[SceneKitCamera] = None
+        self,
+        image_list: ImageInput,
+        camera_list: List[SceneKitCamera] = None,
+        **options,
     ) -> MultiViewReconstructionOutput:
         input_image_list = [SceneKitImage(image).image for image in image_list]
         self.input = MultiViewReconstructionInput(input_image_list, camera_list)
+        self.options = options
+        self.ensure_model_loaded()
         output = self._predict()
         return output
-
-    @abc.abstractmethod
-    def to(self, device: str):
-        raise NotImplementedError
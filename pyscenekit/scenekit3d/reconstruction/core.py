@@ -1,7 +1,16 @@
 from enum import Enum
 
-from pyscenekit.scenekit3d.reconstruction.moge import MoGeReconstruction
-from pyscenekit.scenekit3d.reconstruction.dust3r import Dust3rReconstruction
+from pyscenekit.utils.lazy import lazy_attributes
+
+# backends are imported when their method is selected
+_import_backend = lazy_attributes(
+    __name__,
+    {
+        "MoGeReconstruction": "pyscenekit.scenekit3d.reconstruction.moge",
+        "Dust3rReconstruction": "pyscenekit.scenekit3d.reconstruction.dust3r",
+    },
+)
+__getattr__ = _import_backend
 
 
 class SingleViewReconstructionMethod(Enum):
@@ -14,7 +23,7 @@ class SingleViewReconstructionModel:
             method = SingleViewReconstructionMethod[method.upper()]
 
         if method == SingleViewReconstructionMethod.MOGE:
-            return MoGeReconstruction(model_path)
+            return _import_backend("MoGeReconstruction")(model_path)
         else:
             raise NotImplementedError(
                 f"Single-view reconstruction method {method} not implemented"
@@ -31,7 +40,7 @@ class MultiViewReconstructionModel:
             method = MultiViewReconstructionMethod[method.upper()]
 
         if method == MultiViewReconstructionMethod.DUST3R:
-            return Dust3rReconstruction(model_path)
+            return _import_backend("Dust3rReconstruction")(model_path)
         else:
             raise NotImplementedError(
                 f"Multi-view reconstruction method {method} not implemented"
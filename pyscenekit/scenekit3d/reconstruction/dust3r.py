@@ -1,7 +1,7 @@
 import torch
 import numpy as np
 from copy import deepcopy
-from typing import Literal, List
+from typing import Dict, Literal, List
 
 import trimesh
 import PIL.Image
@@ -11,12 +11,12 @@ from torchvision import transforms
 from mini_dust3r.utils.image import ImageDict
 from mini_dust3r.inference import inference, Dust3rResult
 from mini_dust3r.model import AsymmetricCroCo3DStereo
-from mini_dust3r.image_pairs import make_pairs
 from mini_dust3r.cloud_opt import global_aligner, GlobalAlignerMode
 from mini_dust3r.cloud_opt.base_opt import BasePCOptimizer
 from mini_dust3r.viz import pts3d_to_trimesh
 from mini_dust3r.model import AsymmetricCroCo3DStereo
 
+from pyscenekit.utils.common import log
 from pyscenekit.scenekit3d.common import (
     SceneKitCamera,
     SceneKitPointCloud,
@@ -26,6 +26,14 @@ from pyscenekit.scenekit3d.reconstruction.base import (
     MultiViewReconstructionModel,
     MultiViewReconstructionOutput,
 )
+from pyscenekit.scenekit3d.reconstruction.pairs import (
+    make_pair_indices,
+    parse_scene_graph,
+)
+from pyscenekit.scenekit3d.reconstruction.pair_cache import (
+    CachedPairModel,
+    PairPredictionCache,
+)
 
 
 class Dust3rReconstruction(MultiViewReconstructionModel):
@@ -50,18 +58,56 @@ class Dust3rReconstruction(MultiViewReconstructionModel):
         if self.model_path is None:
             self.model_path = "nielsr/DUSt3R_ViTLarge_BaseDecoder_512_dpt"
 
-        self.load_model()
         self.image_transform = transforms.Compose(
             [
                 transforms.ToTensor(),
                 transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)),
             ]
         )
+        # DINOv2 backbone of the retrieval scene graph, loaded on first use
+        self.retrieval_model_path = "dinov2_vits14"
+        self.retrieval_model = None
+        # pair predictions and the aligned views of the last run, for incremental runs
+        self.pair_cache: PairPredictionCache = None
+        self.previous_views: Dict[str, dict] = {}
 
     def load_model(self):
         self.model = AsymmetricCroCo3DStereo.from_pretrained(self.model_path)
 
-    # TODO: implement common way to set method specific parameters
+    def __call__(
+        self,
+        image_list: List[np.ndarray],
+        camera_list: List[SceneKitCamera] = None,
+        scene_graph: str = "complete",
+        batch_size: int = 1,
+        niter: int = 100,
+        image_size: Literal[224, 512] = 512,
+        cache_dir: str = None,
+        incremental: bool = False,
+        **options,
+    ) -> MultiViewReconstructionOutput:
+        """
+        Reconstruct the images with the pairs of scene_graph, see
+        inferece_dust3r for the other options.
+
+        With cache_dir the pair predictions are stored on disk and reused by
+        later runs. With incremental, pair predictions are also kept in memory
+        and the global alignment starts from the poses, depths and focals of
+        the images already aligned by the previous call, so adding an image
+        only runs its new pairs through the network.
+        """
+        return super().__call__(
+            image_list,
+            camera_list,
+            scene_graph=scene_graph,
+            batch_size=batch_size,
+            niter=niter,
+            image_size=image_size,
+            cache_dir=cache_dir,
+            incremental=incremental,
+            **options,
+        )
+
     def _predict(self) -> np.ndarray:
         self.to(self.device)
         image_list = self.input.image_list
@@ -69,11 +115,125 @@ class Dust3rReconstruction(MultiViewReconstructionModel):
         return self.inferece_dust3r(
             image_list=image_list,
             device=self.device.type,
+            **self.options,
+        )
+
+    def image_descriptors(self, image_list: List[np.ndarray]) -> np.ndarray:
+        from pyscenekit.scenekit3d.reconstruction.retrieval import (
+            GlobalDescriptorModel,
         )
 
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
+        if self.retrieval_model is None:
+            self.retrieval_model = GlobalDescriptorModel(self.retrieval_model_path)
+            self.retrieval_model.device = self.device
+        return self.retrieval_model(image_list)
+
+    def get_pair_cache(
+        self, image_size: int, cache_dir: str = None
+    ) -> PairPredictionCache:
+        # reused across calls while the settings stay the same
+        cache = self.pair_cache
+        if (
+            cache is None
+            or cache.model_path != self.model_path
+            or cache.image_size != image_size
+            or cache.cache_dir != cache_dir
+        ):
+            cache = PairPredictionCache(self.model_path, image_size, cache_dir)
+            self.pair_cache = cache
+        return cache
+
+    def reset(self):
+        # forget the previous run, the next incremental run starts from scratch
+        self.previous_views = {}
+        if self.pair_cache is not None and self.pair_cache.cache_dir is None:
+            self.pair_cache.clear()
+
+    @torch.no_grad()
+    def _warm_start(self, scene: BasePCOptimizer, image_keys: List[str]) -> bool:
+        """
+        Move the minimum spanning tree initialization of the scene into the
+        frame of the previous run, with the rotation, translation and scale
+        that best map its cameras onto the previously aligned ones, and set the
+        poses, depths and focals of the previously aligned images.
+        """
+        known = [i for i, key in enumerate(image_keys) if key in self.previous_views]
+        if not known:
+            return False
+
+        poses = scene.get_im_poses().detach().cpu().double()
+        depths = [depth.detach().cpu() for depth in scene.get_depthmaps()]
+        pw_poses = scene.get_pw_poses().detach().cpu().double()
+        pw_scales = scene.get_pw_scale().detach().cpu().double()
+        previous = [self.previous_views[image_keys[i]] for i in known]
+        previous_poses = torch.stack(
+            [torch.from_numpy(view["pose"]) for view in previous]
+        ).double()
+
+        # rotation of the summed relative rotations, projected onto SO(3)
+        u, _, vt = torch.linalg.svd(
+            (previous_poses[:, :3, :3] @ poses[known, :3, :3].transpose(1, 2)).sum(0)
+        )
+        reflection = torch.ones(3, dtype=torch.float64)
+        reflection[2] = torch.sign(torch.det(u @ vt))
+        rotation = u @ torch.diag(reflection) @ vt
+        ratios = []
+        for i, view in zip(known, previous):
+            valid = (depths[i] > 0) & (view["depth"] > 0)
+            ratios.append(view["depth"][valid] / depths[i][valid])
+        ratios = torch.cat(ratios)
+        if len(ratios) == 0:
+            return False
+        scale = float(ratios.median())
+        translation = (
+            previous_poses[:, :3, 3] - scale * poses[known, :3, 3] @ rotation.T
+        ).mean(0)
+
+        device = next(scene.parameters()).device
+
+        def tensor(value):
+            return torch.as_tensor(value, dtype=torch.float32, device=device)
+
+        for i, key in enumerate(image_keys):
+            view = self.previous_views.get(key)
+            if view is not None:
+                scene._set_pose(scene.im_poses, i, tensor(view["pose"]), force=True)
+                scene._set_depthmap(i, tensor(view["depth"]), force=True)
+                scene._set_focal(i, view["focal"], force=True)
+            else:
+                scene._set_pose(
+                    scene.im_poses,
+                    i,
+                    tensor(rotation @ poses[i, :3, :3]),
+                    tensor(scale * rotation @ poses[i, :3, 3] + translation),
+                    force=True,
+                )
+                scene._set_depthmap(i, tensor(depths[i] * scale), force=True)
+
+        # the pairwise scales now carry the scale of the previous run
+        scene.norm_pw_scale = False
+        for e in range(len(pw_poses)):
+            pw_rotation = pw_poses[e, :3, :3] / pw_scales[e]
+            scene._set_pose(
+                scene.pw_poses,
+                e,
+                tensor(rotation @ pw_rotation),
+                tensor(scale * rotation @ pw_poses[e, :3, 3] + translation),
+                scale=float(scale * pw_scales[e]),
+                force=True,
+            )
+        log.info(f"Warm started {len(known)} of {len(image_keys)} images")
+        return True
+
+    @torch.no_grad()
+    def _store_views(self, scene: BasePCOptimizer, image_keys: List[str]):
+        poses = scene.get_im_poses().detach().cpu().numpy()
+        depths = [depth.detach().cpu() for depth in scene.get_depthmaps()]
+        focals = scene.get_focals().detach().cpu().numpy().reshape(len(poses), -1)
+        self.previous_views = {
+            key: {"pose": poses[i], "depth": depths[i], "focal": float(focals[i, 0])}
+            for i, key in enumerate(image_keys)
+        }
 
     # ref: https://github.com/pablovela5620/mini-dust3r
     def inferece_dust3r(
@@ -85,6 +245,10 @@ class Dust3rReconstruction(MultiViewReconstructionModel):
         niter: int = 100,
         schedule: Literal["linear", "cosine"] = "linear",
         min_conf_thr: float = 10,
+        scene_graph: str = "complete",
+        descriptors: np.ndarray = None,
+        cache_dir: str = None,
+        incremental: bool = False,
     ) -> MultiViewReconstructionOutput:
         """
         Perform inference using the Dust3r algorithm.
@@ -98,6 +262,10 @@ class Dust3rReconstruction(MultiViewReconstructionModel):
             niter (int, optional): The number of iterations for the global alignment optimization. Defaults to 100.
             schedule (Literal["linear", "cosine"], optional): The learning rate schedule for the global alignment optimization. Defaults to "linear".
             min_conf_thr (float, optional): The minimum confidence threshold for the optimized result. Defaults to 10.
+            scene_graph (str, optional): The image pairs to run through the network, "complete", "swin-<window>", "logwin-<window>", "oneref-<index>" or "retrieval-<k>". Defaults to "complete".
+            descriptors (np.ndarray, optional): (N, D) global image descriptors of the retrieval scene graph, computed with DINOv2 when not given.
+            cache_dir (str, optional): Directory of the on-disk pair prediction cache, pairs are only run through the network once. Defaults to None.
+            incremental (bool, optional): Reuse the pair predictions of previous calls and warm start the global alignment from the previously aligned images. Defaults to False.
 
         Returns:
             MultiViewReconstructionOutput: The optimized result containing the RGB, depth, and confidence images.
@@ -112,12 +280,30 @@ class Dust3rReconstruction(MultiViewReconstructionModel):
             imgs = [imgs[0], deepcopy(imgs[0])]
             imgs[1]["idx"] = 1
 
-        pairs: list[tuple[ImageDict, ImageDict]] = make_pairs(
-            imgs, scene_graph="complete", prefilter=None, symmetrize=True
-        )
-        output: Dust3rResult = inference(
-            pairs, self.model, device, batch_size=batch_size
+        if len(image_list) == 1:
+            scene_graph = "complete"
+        if parse_scene_graph(scene_graph)[0] == "retrieval" and descriptors is None:
+            descriptors = self.image_descriptors(image_list)
+        pair_indices = make_pair_indices(len(imgs), scene_graph, descriptors)
+        log.info(
+            f"Running {len(pair_indices)} pairs of {len(imgs)} images, "
+            f"scene graph {scene_graph}"
         )
+        pairs: list[tuple[ImageDict, ImageDict]] = [
+            (imgs[i], imgs[j]) for i, j in pair_indices
+        ]
+
+        model, image_keys = self.model, None
+        if cache_dir is not None or incremental:
+            pair_cache = self.get_pair_cache(image_size, cache_dir)
+            image_keys = [pair_cache.image_key(img["img"]) for img in imgs]
+            model = CachedPairModel(self.model, pair_cache, image_keys)
+            hits = pair_cache.hits
+        output: Dust3rResult = inference(pairs, model, device, batch_size=batch_size)
+        if image_keys is not None:
+            log.info(
+                f"Reused {pair_cache.hits - hits} of {len(pairs)} pair predictions"
+            )
 
         mode = (
             GlobalAlignerMode.PointCloudOptimizer
@@ -131,9 +317,19 @@ class Dust3rReconstruction(MultiViewReconstructionModel):
         lr = 0.01
 
         if mode == GlobalAlignerMode.PointCloudOptimizer:
-            loss = scene.compute_global_alignment(
-                init="mst", niter=niter, schedule=schedule, lr=lr
-            )
+            if incremental:
+                # initialize without optimizing, then continue from the previous run
+                scene.compute_global_alignment(init="mst", niter=0)
+                self._warm_start(scene, image_keys)
+                loss = scene.compute_global_alignment(
+                    init=None, niter=niter, schedule=schedule, lr=lr
+                )
+            else:
+                loss = scene.compute_global_alignment(
+                    init="mst", niter=niter, schedule=schedule, lr=lr
+                )
+        if image_keys is not None:
+            self._store_views(scene, image_keys)
 
         # get the optimized result from the scene
         optimized_result: MultiViewReconstructionOutput = self.scene_to_results(
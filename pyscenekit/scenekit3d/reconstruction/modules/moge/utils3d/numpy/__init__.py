@@ -102,6 +102,7 @@ __modules_all__ = {
     ],
     'rasterization': [
         'RastContext',
+        'RastMesh',
         'rasterize_triangle_faces',
         'rasterize_edges',
         'texture',
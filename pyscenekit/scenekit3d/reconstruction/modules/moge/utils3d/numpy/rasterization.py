@@ -9,6 +9,7 @@ from . import transforms, utils, mesh
 
 __all__ = [
     'RastContext',
+    'RastMesh',
     'rasterize_triangle_faces',
     'rasterize_edges',
     'texture',
@@ -57,10 +58,124 @@ class RastContext:
 
         self.__prog_src = {}
         self.__prog = {}
+        self.__framebuffers = {}
 
     def __del__(self):
+        self.release_framebuffers()
         self.mgl_ctx.release()
 
+    def framebuffer(self, width: int, height: int, channels: int) -> Tuple[moderngl.Framebuffer, moderngl.Texture, moderngl.Texture]:
+        """
+        Get a framebuffer with a float color texture of `channels` channels and a depth texture.
+        Framebuffers are created once per (width, height, channels) and reused by later renders.
+
+        Returns:
+            fbo (moderngl.Framebuffer): framebuffer
+            image_tex (moderngl.Texture): color attachment
+            depth_tex (moderngl.Texture): depth attachment
+        """
+        key = (width, height, channels)
+        if key not in self.__framebuffers:
+            image_tex = self.mgl_ctx.texture((width, height), channels, dtype='f4')
+            depth_tex = self.mgl_ctx.depth_texture((width, height))
+            fbo = self.mgl_ctx.framebuffer(color_attachments=[image_tex], depth_attachment=depth_tex)
+            self.__framebuffers[key] = (fbo, image_tex, depth_tex)
+        return self.__framebuffers[key]
+
+    def release_framebuffers(self):
+        for fbo, image_tex, depth_tex in self.__framebuffers.values():
+            fbo.release()
+            image_tex.release()
+            depth_tex.release()
+        self.__framebuffers.clear()
+
+    def upload_mesh(self, vertices: np.ndarray, faces: np.ndarray, attr: np.ndarray, mode: int = None) -> 'RastMesh':
+        """
+        Upload a mesh to the GPU once, so that it can be rendered from many viewpoints with `render_mesh`.
+
+        Args:
+            vertices (np.ndarray): [N, 3]
+            faces (np.ndarray): [T, 3] triangles, or [T, 2] edges with mode=moderngl.LINES
+            attr (np.ndarray): [N, C]
+            mode (int, optional): primitive type. Defaults to moderngl.TRIANGLES.
+
+        Returns:
+            RastMesh: handle of the uploaded buffers, release it when done.
+        """
+        assert vertices.ndim == 2 and vertices.shape[1] == 3
+        assert attr.ndim == 2 and attr.shape[1] in [1, 2, 3, 4], f'Vertex attribute only supports channels 1, 2, 3, 4, but got {attr.shape}'
+        assert vertices.shape[0] == attr.shape[0]
+        return RastMesh(self, vertices, faces, attr, moderngl.TRIANGLES if mode is None else mode)
+
+    def render_mesh(
+        self,
+        rast_mesh: 'RastMesh',
+        width: int,
+        height: int,
+        transforms: Union[np.ndarray, Sequence[np.ndarray]],
+        cull_backface: bool = True,
+        return_depth: bool = False,
+        image: np.ndarray = None,
+        depth: np.ndarray = None,
+        line_width: float = 1.0,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Render an uploaded mesh with each of the given model-view-projection matrices, reusing one framebuffer.
+
+        Args:
+            rast_mesh (RastMesh): mesh returned by `upload_mesh`
+            width (int): width of rendered images
+            height (int): height of rendered images
+            transforms (np.ndarray): [B, 4, 4] or a list of [4, 4] model-view-projection matrices
+            cull_backface (bool): whether to cull backface
+            return_depth (bool): whether to read back the depth
+            image: (np.ndarray): [H, W, C] background image
+            depth: (np.ndarray): [H, W] background depth
+            line_width (float): width of lines when the mesh holds edges
+
+        Returns:
+            images (np.ndarray): [B, H, W, C] rendered images
+            depths (np.ndarray): [B, H, W] screen space depth, ranging from 0 to 1. If return_depth is False, it is None.
+        """
+        C = rast_mesh.channels
+        fbo, image_tex, depth_tex = self.framebuffer(width, height, C)
+        background_image = np.ascontiguousarray(image[::-1, :, :], dtype='f4') if image is not None else None
+        background_depth = np.ascontiguousarray(depth[::-1, :], dtype='f4') if depth is not None else None
+
+        fbo.use()
+        fbo.viewport = (0, 0, width, height)
+        self.mgl_ctx.depth_func = '<'
+        self.mgl_ctx.enable(self.mgl_ctx.DEPTH_TEST)
+        if cull_backface and rast_mesh.mode == moderngl.TRIANGLES:
+            self.mgl_ctx.enable(self.mgl_ctx.CULL_FACE)
+        else:
+            self.mgl_ctx.disable(self.mgl_ctx.CULL_FACE)
+        self.mgl_ctx.line_width = line_width
+
+        transforms = np.asarray(transforms, dtype=np.float32).reshape(-1, 4, 4)
+        images = np.zeros((len(transforms), height, width, C), dtype='f4')
+        depths = np.zeros((len(transforms), height, width), dtype='f4') if return_depth else None
+        for i, transform in enumerate(transforms):
+            # the framebuffer is shared, restore the background before every view
+            fbo.clear(0.0, 0.0, 0.0, 0.0, depth=1.0)
+            if background_image is not None:
+                image_tex.write(background_image)
+            if background_depth is not None:
+                depth_tex.write(background_depth)
+
+            rast_mesh.vao.program['u_mvp'].write(transform.transpose().copy())
+            rast_mesh.vao.render()
+
+            image_tex.read_into(images[i])
+            if return_depth:
+                depth_tex.read_into(depths[i])
+        self.mgl_ctx.disable(self.mgl_ctx.DEPTH_TEST)
+
+        images = images[:, ::-1, :, :]
+        if return_depth:
+            depths = depths[:, ::-1, :]
+        return images, depths
+
     def screen_quad(self) -> moderngl.VertexArray:
         self.screen_quad_vbo = self.mgl_ctx.buffer(np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype='f4'))
         self.screen_quad_ibo = self.mgl_ctx.buffer(np.array([0, 1, 2, 0, 2, 3], dtype=np.int32))
@@ -101,7 +216,52 @@ class RastContext:
         
         return self.__prog[f'texture_{n}']
 
-    
+
+
+class RastMesh:
+    """
+    Vertex, attribute and index buffers of a mesh kept on the GPU, created by `RastContext.upload_mesh`.
+    """
+    def __init__(self, ctx: RastContext, vertices: np.ndarray, faces: np.ndarray, attr: np.ndarray, mode: int):
+        self.channels = attr.shape[1]
+        self.mode = mode
+        prog = ctx.program_vertex_attribute(self.channels)
+        self.ibo = ctx.mgl_ctx.buffer(np.ascontiguousarray(faces, dtype='i4'))
+        self.vbo_vertices = ctx.mgl_ctx.buffer(np.ascontiguousarray(vertices, dtype='f4'))
+        self.vbo_attr = ctx.mgl_ctx.buffer(np.ascontiguousarray(attr, dtype='f4'))
+        self.vao = ctx.mgl_ctx.vertex_array(
+            prog,
+            [
+                (self.vbo_vertices, '3f', 'i_position'),
+                (self.vbo_attr, f'{self.channels}f', 'i_attr'),
+            ],
+            self.ibo,
+            mode=mode,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+    def update_attr(self, attr: np.ndarray):
+        """
+        Replace the vertex attribute, keeping the vertex and index buffers. The number of channels must not change.
+        """
+        assert attr.ndim == 2 and attr.shape[1] == self.channels
+        self.vbo_attr.write(np.ascontiguousarray(attr, dtype='f4'))
+
+    def release(self):
+        if self.vao is None:
+            return
+        self.vao.release()
+        self.ibo.release()
+        self.vbo_vertices.release()
+        self.vbo_attr.release()
+        self.vao = None
+
+
 def rasterize_triangle_faces(
     ctx: RastContext,
     vertices: np.ndarray,
@@ -141,67 +301,21 @@ def rasterize_triangle_faces(
     assert faces.dtype == np.uint32 or faces.dtype == np.int32
     assert attr.dtype == np.float32, "Attribute should be float32"
 
-    C = attr.shape[1]
-    prog = ctx.program_vertex_attribute(C)
-
     transform = np.eye(4, np.float32) if transform is None else transform
 
-    # Create buffers
-    ibo = ctx.mgl_ctx.buffer(np.ascontiguousarray(faces, dtype='i4'))
-    vbo_vertices = ctx.mgl_ctx.buffer(np.ascontiguousarray(vertices, dtype='f4'))
-    vbo_attr = ctx.mgl_ctx.buffer(np.ascontiguousarray(attr, dtype='f4'))
-    vao = ctx.mgl_ctx.vertex_array(
-        prog,
-        [
-            (vbo_vertices, '3f', 'i_position'),
-            (vbo_attr, f'{C}f', 'i_attr'),
-        ],
-        ibo,
-        mode=moderngl.TRIANGLES,
-    )
+    with ctx.upload_mesh(vertices, faces, attr) as rast_mesh:
+        images, depths = ctx.render_mesh(
+            rast_mesh,
+            width,
+            height,
+            [transform],
+            cull_backface=cull_backface,
+            return_depth=return_depth,
+            image=image,
+            depth=depth,
+        )
 
-    # Create framebuffer
-    image_tex = ctx.mgl_ctx.texture((width, height), C, dtype='f4', data=np.ascontiguousarray(image[::-1, :, :]) if image is not None else None)
-    depth_tex = ctx.mgl_ctx.depth_texture((width, height), data=np.ascontiguousarray(depth[::-1, :]) if depth is not None else None)
-    fbo = ctx.mgl_ctx.framebuffer(
-        color_attachments=[image_tex],
-        depth_attachment=depth_tex,
-    )
-
-    # Render
-    prog['u_mvp'].write(transform.transpose().copy().astype('f4'))
-    fbo.use()
-    fbo.viewport = (0, 0, width, height)
-    ctx.mgl_ctx.depth_func = '<'
-    ctx.mgl_ctx.enable(ctx.mgl_ctx.DEPTH_TEST)
-    if cull_backface:
-        ctx.mgl_ctx.enable(ctx.mgl_ctx.CULL_FACE)
-    else:
-        ctx.mgl_ctx.disable(ctx.mgl_ctx.CULL_FACE)
-    vao.render()
-    ctx.mgl_ctx.disable(ctx.mgl_ctx.DEPTH_TEST)
-
-    # Read
-    image = np.zeros((height, width, C), dtype='f4') 
-    image_tex.read_into(image)
-    image = image[::-1, :, :]
-    if return_depth:
-        depth = np.zeros((height, width), dtype='f4')
-        depth_tex.read_into(depth)
-        depth = depth[::-1, :]
-    else:
-        depth = None
-
-    # Release
-    vao.release()
-    ibo.release()
-    vbo_vertices.release()
-    vbo_attr.release()
-    fbo.release()
-    image_tex.release()
-    depth_tex.release()
-
-    return image, depth
+    return images[0], depths[0] if return_depth else None
 
 
 def rasterize_edges(
@@ -242,64 +356,22 @@ def rasterize_edges(
     assert edges.dtype == np.uint32 or edges.dtype == np.int32
     assert attr.dtype == np.float32, "Attribute should be float32"
 
-    C = attr.shape[1]
-    prog = ctx.program_vertex_attribute(C)
-
     transform = transform if transform is not None else np.eye(4, np.float32)
 
-    # Create buffers
-    ibo = ctx.mgl_ctx.buffer(np.ascontiguousarray(edges, dtype='i4'))
-    vbo_vertices = ctx.mgl_ctx.buffer(np.ascontiguousarray(vertices, dtype='f4'))
-    vbo_attr = ctx.mgl_ctx.buffer(np.ascontiguousarray(attr, dtype='f4'))
-    vao = ctx.mgl_ctx.vertex_array(
-        prog,
-        [
-            (vbo_vertices, '3f', 'i_position'),
-            (vbo_attr, f'{C}f', 'i_attr'),
-        ],
-        ibo,
-        mode=moderngl.LINES,
-    )
-
-    # Create framebuffer
-    image_tex = ctx.mgl_ctx.texture((width, height), C, dtype='f4', data=np.ascontiguousarray(image[::-1, :, :]) if image is not None else None)
-    depth_tex = ctx.mgl_ctx.depth_texture((width, height), data=np.ascontiguousarray(depth[::-1, :]) if depth is not None else None)
-    fbo = ctx.mgl_ctx.framebuffer(
-        color_attachments=[image_tex],
-        depth_attachment=depth_tex,
-    )
-
-    # Render
-    prog['u_mvp'].write(transform.transpose().copy().astype('f4'))
-    fbo.use()
-    fbo.viewport = (0, 0, width, height)
-    ctx.mgl_ctx.depth_func = '<'
-    ctx.mgl_ctx.enable(ctx.mgl_ctx.DEPTH_TEST)
-    ctx.mgl_ctx.line_width = line_width
-    vao.render()
-    ctx.mgl_ctx.disable(ctx.mgl_ctx.DEPTH_TEST)
-
-    # Read
-    image = np.zeros((height, width, C), dtype='f4')
-    image_tex.read_into(image)
-    image = image[::-1, :, :]
-    if return_depth:
-        depth = np.zeros((height, width), dtype='f4')
-        depth_tex.read_into(depth)
-        depth = depth[::-1, :]
-    else:
-        depth = None
-
-    # Release
-    vao.release()
-    ibo.release()
-    vbo_vertices.release()
-    vbo_attr.release()
-    fbo.release()
-    image_tex.release()
-    depth_tex.release()
-
-    return image, depth
+    with ctx.upload_mesh(vertices, edges, attr, mode=moderngl.LINES) as rast_mesh:
+        images, depths = ctx.render_mesh(
+            rast_mesh,
+            width,
+            height,
+            [transform],
+            cull_backface=False,
+            return_depth=return_depth,
+            image=image,
+            depth=depth,
+            line_width=line_width,
+        )
+
+    return images[0], depths[0] if return_depth else None
 
 
 def texture(
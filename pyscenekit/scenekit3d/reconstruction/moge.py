@@ -1,4 +1,3 @@
-import torch
 import numpy as np
 
 import trimesh
@@ -40,8 +39,6 @@ class MoGeReconstruction(SingleViewReconstructionModel):
         if self.model_path is None:
             self.model_path = "Ruicheng/moge-vitl"
 
-        self.load_model()
-
     def load_model(self):
         self.model = MoGeModel.from_pretrained(self.model_path)
 
@@ -92,7 +89,3 @@ class MoGeReconstruction(SingleViewReconstructionModel):
 
         output.mesh = SceneKitMesh(mesh)
         return output
-
-    def to(self, device: str):
-        self.device = torch.device(device)
-        self.model.to(self.device)
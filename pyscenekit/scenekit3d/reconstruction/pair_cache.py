@@ -0,0 +1,174 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import numpy as np
+
+from pyscenekit.scenekit2d.cache import PredictionCache, hash_values
+
+# predictions of one pair, the network outputs for view1 and view2
+PairPrediction = Tuple[Dict[str, torch.Tensor], Dict[str, torch.Tensor]]
+
+_VIEWS = ("pred1", "pred2")
+
+
+class PairPredictionCache:
+    """
+    DUSt3R network predictions of single image pairs, keyed by the content of
+    both network input images, the image size and the model path.
+
+    Without cache_dir the predictions are kept in memory for the lifetime of
+    the cache, otherwise they are stored on disk where the least recently
+    used pairs are evicted beyond max_size_bytes.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        image_size: int,
+        cache_dir: str = None,
+        max_size_bytes: int = 10 * 1024**3,
+    ):
+        self.model_path = model_path
+        self.image_size = image_size
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._memory: Dict[str, PairPrediction] = {}
+        self._disk = None
+        if cache_dir is not None:
+            self._disk = PredictionCache(cache_dir, max_size_bytes)
+
+    def __len__(self):
+        return len(self._disk) if self._disk is not None else len(self._memory)
+
+    @staticmethod
+    def image_key(image: torch.Tensor) -> str:
+        # hash of the normalized network input, so resizing and cropping count
+        return hash_values(image.detach().cpu().float().numpy())
+
+    def key(self, image_key1: str, image_key2: str) -> str:
+        # pairs are ordered, (i, j) and (j, i) are separate network outputs
+        return hash_values(
+            "dust3r_pair", self.model_path, self.image_size, image_key1, image_key2
+        )
+
+    def get(self, key: str) -> Optional[PairPrediction]:
+        if self._disk is None:
+            prediction = self._memory.get(key)
+        else:
+            prediction = self._disk.get(key)
+            if prediction is not None:
+                prediction = self._from_arrays(prediction[1])
+        if prediction is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return prediction
+
+    def put(self, key: str, pred1: Dict[str, Any], pred2: Dict[str, Any]):
+        prediction = tuple(
+            {
+                # copies, so slices of a batch do not keep the whole batch alive
+                name: value.detach().to("cpu", torch.float32, copy=True)
+                for name, value in pred.items()
+                if isinstance(value, torch.Tensor)
+            }
+            for pred in (pred1, pred2)
+        )
+        if self._disk is None:
+            self._memory[key] = prediction
+            return
+        # every tensor goes into the output dict, the prediction entry is unused
+        arrays = {
+            f"{view}/{name}": value.numpy()
+            for view, pred in zip(_VIEWS, prediction)
+            for name, value in pred.items()
+        }
+        self._disk.put(key, np.zeros(0, dtype=np.float32), arrays)
+
+    @staticmethod
+    def _from_arrays(arrays: Dict[str, np.ndarray]) -> PairPrediction:
+        prediction = ({}, {})
+        for name, value in arrays.items():
+            view, name = name.split("/", 1)
+            prediction[_VIEWS.index(view)][name] = torch.from_numpy(value)
+        return prediction
+
+    def clear(self):
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+
+def _select_views(view: Dict[str, Any], indices: List[int]) -> Dict[str, Any]:
+    # the batch entries of a collated view dict at indices
+    selected = {}
+    for name, value in view.items():
+        if isinstance(value, torch.Tensor):
+            value = value[torch.as_tensor(indices, device=value.device)]
+        elif isinstance(value, np.ndarray):
+            value = value[indices]
+        elif isinstance(value, (list, tuple)):
+            value = [value[i] for i in indices]
+        selected[name] = value
+    return selected
+
+
+class CachedPairModel:
+    """
+    Wraps the DUSt3R network for mini_dust3r.inference, pairs of a batch found
+    in the cache skip the forward pass and new pairs are added to the cache.
+    image_keys maps the image "idx" of the views to PairPredictionCache.image_key.
+    """
+
+    def __init__(self, model, cache: PairPredictionCache, image_keys: List[str]):
+        self.model = model
+        self.cache = cache
+        self.image_keys = image_keys
+
+    def __getattr__(self, name: str):
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def __call__(self, view1: Dict[str, Any], view2: Dict[str, Any]):
+        keys = [
+            self.cache.key(self.image_keys[int(i)], self.image_keys[int(j)])
+            for i, j in zip(view1["idx"], view2["idx"])
+        ]
+        predictions = [self.cache.get(key) for key in keys]
+        missing = [b for b, prediction in enumerate(predictions) if prediction is None]
+        if missing:
+            pred1, pred2 = self.model(
+                _select_views(view1, missing), _select_views(view2, missing)
+            )
+            for n, b in enumerate(missing):
+                pair = tuple(
+                    {
+                        name: value[n : n + 1]
+                        for name, value in pred.items()
+                        if isinstance(value, torch.Tensor)
+                    }
+                    for pred in (pred1, pred2)
+                )
+                self.cache.put(keys[b], *pair)
+                predictions[b] = tuple(
+                    {name: value.detach().cpu().float() for name, value in pred.items()}
+                    for pred in pair
+                )
+
+        device = view1["img"].device
+        return tuple(
+            {
+                name: torch.cat([prediction[v][name] for prediction in predictions]).to(
+                    device
+                )
+                for name in predictions[0][v]
+            }
+            for v in range(2)
+        )
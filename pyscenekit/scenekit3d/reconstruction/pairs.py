@@ -0,0 +1,165 @@
+import inspect
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# name -> function(num_images, *args, descriptors=None) -> undirected pairs
+SCENE_GRAPHS: Dict[str, Callable] = {}
+
+Pair = Tuple[int, int]
+
+
+def scene_graph(name: str):
+    """
+    Register a scene graph strategy for multi-view reconstruction.
+
+    The function receives the number of images, the integer arguments of the
+    scene graph string, e.g. 5 for "swin-5", and the global image descriptors
+    when available, and returns pairs (i, j) with i < j.
+    """
+
+    def register(function: Callable):
+        SCENE_GRAPHS[name] = function
+        return function
+
+    return register
+
+
+def _unique_pairs(pairs) -> List[Pair]:
+    return sorted({(min(i, j), max(i, j)) for i, j in pairs if i != j})
+
+
+@scene_graph("complete")
+def complete_graph(num_images: int, descriptors: np.ndarray = None) -> List[Pair]:
+    return [(i, j) for i in range(num_images) for j in range(i + 1, num_images)]
+
+
+@scene_graph("swin")
+def sliding_window_graph(
+    num_images: int, window: int = 3, cyclic: int = 0, descriptors=None
+) -> List[Pair]:
+    # every image with the next window images, for ordered video frames
+    pairs = []
+    for i in range(num_images):
+        for offset in range(1, window + 1):
+            j = i + offset
+            if j >= num_images:
+                if not cyclic:
+                    break
+                j %= num_images
+            pairs.append((i, j))
+    return _unique_pairs(pairs)
+
+
+@scene_graph("logwin")
+def log_window_graph(
+    num_images: int, window: int = 3, cyclic: int = 0, descriptors=None
+) -> List[Pair]:
+    # every image with the images 1, 2, 4, ... 2^(window - 1) frames later
+    pairs = []
+    for i in range(num_images):
+        for offset in (2**k for k in range(window)):
+            j = i + offset
+            if j >= num_images:
+                if not cyclic:
+                    break
+                j %= num_images
+            pairs.append((i, j))
+    return _unique_pairs(pairs)
+
+
+@scene_graph("oneref")
+def one_reference_graph(
+    num_images: int, reference: int = 0, descriptors=None
+) -> List[Pair]:
+    if not 0 <= reference < num_images:
+        raise ValueError(f"Reference image {reference} of {num_images} images")
+    return _unique_pairs((reference, i) for i in range(num_images))
+
+
+def _maximum_spanning_tree(similarity: np.ndarray) -> List[Pair]:
+    # Prim's algorithm, keeps the retrieval graph connected for the alignment
+    num_images = len(similarity)
+    in_tree = np.zeros(num_images, dtype=bool)
+    in_tree[0] = True
+    best = similarity[0].copy()
+    parent = np.zeros(num_images, dtype=np.int64)
+    pairs = []
+    for _ in range(num_images - 1):
+        candidates = np.where(in_tree, -np.inf, best)
+        j = int(np.argmax(candidates))
+        pairs.append((int(parent[j]), j))
+        in_tree[j] = True
+        closer = similarity[j] > best
+        best[closer] = similarity[j][closer]
+        parent[closer] = j
+    return pairs
+
+
+@scene_graph("retrieval")
+def retrieval_graph(
+    num_images: int, k: int = 10, adjacent: int = 0, descriptors: np.ndarray = None
+) -> List[Pair]:
+    """
+    Every image with its k most similar images by cosine similarity of the
+    global descriptors, plus the adjacent images for ordered frames, and the
+    maximum spanning tree of the similarities so the graph is connected.
+    """
+    if descriptors is None:
+        raise ValueError("The retrieval scene graph needs image descriptors")
+    descriptors = np.asarray(descriptors, dtype=np.float32)
+    if len(descriptors) != num_images:
+        raise ValueError(f"{len(descriptors)} descriptors for {num_images} images")
+    norms = np.linalg.norm(descriptors, axis=1, keepdims=True)
+    descriptors = descriptors / np.maximum(norms, 1e-12)
+    similarity = descriptors @ descriptors.T
+    np.fill_diagonal(similarity, -np.inf)
+
+    k = min(k, num_images - 1)
+    pairs = []
+    if k > 0:
+        neighbours = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        pairs += [(i, int(j)) for i in range(num_images) for j in neighbours[i]]
+    if adjacent:
+        pairs += sliding_window_graph(num_images, adjacent)
+    if num_images > 1:
+        pairs += _maximum_spanning_tree(similarity)
+    return _unique_pairs(pairs)
+
+
+def parse_scene_graph(scene_graph: str) -> Tuple[str, List[int]]:
+    """
+    Split a DUSt3R style scene graph string such as "swin-5", "logwin-3-1"
+    (cyclic), "oneref-0" or "retrieval-10" into its name and arguments.
+    """
+    name, *args = scene_graph.split("-")
+    if name not in SCENE_GRAPHS:
+        raise ValueError(
+            f"Unknown scene graph {scene_graph}, expected one of {list(SCENE_GRAPHS)}"
+        )
+    try:
+        args = [int(arg) for arg in args]
+    except ValueError:
+        raise ValueError(f"Scene graph arguments must be integers, got {scene_graph}")
+    try:
+        inspect.signature(SCENE_GRAPHS[name]).bind(0, *args, descriptors=None)
+    except TypeError:
+        raise ValueError(f"Too many arguments for scene graph {scene_graph}")
+    return name, args
+
+
+def make_pair_indices(
+    num_images: int,
+    scene_graph: str = "complete",
+    descriptors: np.ndarray = None,
+    symmetrize: bool = True,
+) -> List[Pair]:
+    """
+    Image pairs of the scene graph, with both (i, j) and (j, i) when
+    symmetrize is set as the DUSt3R global alignment expects.
+    """
+    name, args = parse_scene_graph(scene_graph)
+    pairs = SCENE_GRAPHS[name](num_images, *args, descriptors=descriptors)
+    if symmetrize:
+        pairs = pairs + [(j, i) for i, j in pairs]
+    return pairs
@@ -0,0 +1,62 @@
+import importlib
+from typing import List
+
+import torch
+import numpy as np
+import torch.nn.functional as F
+
+from pyscenekit.utils.registry import SharedModelMixin
+
+
+class GlobalDescriptorModel(SharedModelMixin):
+    """
+    Global image descriptors for pair retrieval, the normalized class token of
+    the bundled DINOv2 backbone. model_path names a backbone of
+    pyscenekit.utils.modules.dinov2.hub.backbones, e.g. "dinov2_vitb14".
+    """
+
+    def __init__(self, model_path: str = None, image_size: int = 224):
+        self.model_path = model_path if model_path is not None else "dinov2_vits14"
+        self.image_size = image_size
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = None
+        self._registry_key = None
+
+    def load_model(self):
+        backbones = importlib.import_module(
+            "pyscenekit.utils.modules.dinov2.hub.backbones"
+        )
+        self.model = getattr(backbones, self.model_path)(pretrained=True)
+        self.model.eval()
+
+    def _preprocess(self, image: np.ndarray) -> torch.Tensor:
+        scale = 255.0 if image.dtype == np.uint8 else 1.0
+        image = torch.from_numpy(np.ascontiguousarray(image[..., :3]))
+        image = image.permute(2, 0, 1).float() / scale
+        image = F.interpolate(
+            image[None],
+            size=(self.image_size, self.image_size),
+            mode="bilinear",
+            align_corners=False,
+            antialias=True,
+        )[0]
+        mean = torch.tensor([0.485, 0.456, 0.406])[:, None, None]
+        std = torch.tensor([0.229, 0.224, 0.225])[:, None, None]
+        return (image - mean) / std
+
+    @torch.no_grad()
+    def __call__(
+        self, image_list: List[np.ndarray], batch_size: int = 16
+    ) -> np.ndarray:
+        """
+        Unit length descriptors (N, D) of RGB images (H, W, 3).
+        """
+        self.ensure_model_loaded()
+        descriptors = []
+        for i in range(0, len(image_list), batch_size):
+            batch = torch.stack(
+                [self._preprocess(image) for image in image_list[i : i + batch_size]]
+            ).to(self.device)
+            features = self.model.forward_features(batch)["x_norm_clstoken"]
+            descriptors.append(F.normalize(features, dim=-1).cpu().numpy())
+        return np.concatenate(descriptors)
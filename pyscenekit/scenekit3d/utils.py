@@ -39,4 +39,25 @@ def qvec2rotmat(qvec):
          2 * qvec[2] * qvec[3] - 2 * qvec[0] * qvec[1]],
         [2 * qvec[3] * qvec[1] - 2 * qvec[0] * qvec[2],
          2 * qvec[2] * qvec[3] + 2 * qvec[0] * qvec[1],
-         1 - 2 * qvec[1]**2 - 2 * qvec[2]**2]])
\ No newline at end of file
+         1 - 2 * qvec[1]**2 - 2 * qvec[2]**2]])
+
+
+def qvecs2rotmats(qvecs):
+    # batched qvec2rotmat, qvecs of shape (..., 4) in (w, x, y, z) order
+    qvecs = np.asarray(qvecs, dtype=np.float64)
+    w, x, y, z = np.moveaxis(qvecs, -1, 0)
+    rotmats = np.stack(
+        [
+            1 - 2 * y**2 - 2 * z**2,
+            2 * x * y - 2 * w * z,
+            2 * z * x + 2 * w * y,
+            2 * x * y + 2 * w * z,
+            1 - 2 * x**2 - 2 * z**2,
+            2 * y * z - 2 * w * x,
+            2 * z * x - 2 * w * y,
+            2 * y * z + 2 * w * x,
+            1 - 2 * x**2 - 2 * y**2,
+        ],
+        axis=-1,
+    )
+    return rotmats.reshape(qvecs.shape[:-1] + (3, 3))
@@ -1,3 +1,9 @@
-from .core import SceneKitRenderer
+from pyscenekit.utils.lazy import lazy_attributes
+
+# renderers import pyrender and pytorch3d, load them on first access
+__getattr__ = lazy_attributes(
+    __name__,
+    {"SceneKitRenderer": "pyscenekit.scenekit3d.visualization.core"},
+)
 
 __all__ = ["SceneKitRenderer"]
@@ -0,0 +1,293 @@
+import os
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from pyscenekit.utils.lazy import lazy_import
+from pyscenekit.scenekit3d.common import SceneKitCamera
+
+trimesh = lazy_import("trimesh")
+
+# barycentric tolerance, avoids cracks along edges shared by two faces
+_EDGE_EPS = 1e-6
+
+# mesh shared with the worker processes, set once per worker by the initializer
+_WORKER_MESH = None
+
+
+@dataclass
+class CPUFragments:
+    """
+    Rasterization output with the layout of pytorch3d Fragments, as numpy arrays.
+
+    zbuf holds the camera space depth and pix_to_face the index of the visible
+    face, both of shape (N, H, W, 1) and -1 where no face is hit.
+    """
+
+    zbuf: np.ndarray
+    pix_to_face: np.ndarray
+
+
+def _init_raster_worker(vertices: np.ndarray, faces: np.ndarray):
+    global _WORKER_MESH
+    _WORKER_MESH = (vertices, faces)
+
+
+def _run_raster_task(args):
+    vertices, faces = _WORKER_MESH
+    return rasterize_mesh(vertices, faces, *args)
+
+
+def _face_bounds(values: np.ndarray, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    # pixel centers sit on integer coordinates, as in the OpenCV camera model
+    low = np.minimum(np.minimum(values[:, 0], values[:, 1]), values[:, 2])
+    high = np.maximum(np.maximum(values[:, 0], values[:, 1]), values[:, 2])
+    low = np.maximum(np.ceil(low), 0).astype(np.int64)
+    high = np.minimum(np.floor(high), size - 1).astype(np.int64)
+    return low, high
+
+
+def _plane_coefficients(u: np.ndarray, v: np.ndarray, z: np.ndarray) -> np.ndarray:
+    """
+    Coefficients (A, B, C) of w0, w1 and 1/z as A * x + B * y + C over the
+    screen, shape (F, 3, 3). Degenerate faces get all zero coefficients.
+    """
+    u0, u1, u2 = u[:, 0], u[:, 1], u[:, 2]
+    v0, v1, v2 = v[:, 0], v[:, 1], v[:, 2]
+    area = (u1 - u0) * (v2 - v0) - (v1 - v0) * (u2 - u0)
+    inv_area = np.divide(1.0, area, out=np.zeros_like(area), where=area != 0)
+
+    coefficients = np.empty((len(u), 3, 3), dtype=np.float64)
+    coefficients[:, 0] = np.stack([v1 - v2, u2 - u1, u1 * v2 - v1 * u2], axis=1)
+    coefficients[:, 1] = np.stack([v2 - v0, u0 - u2, u2 * v0 - v2 * u0], axis=1)
+    coefficients[:, :2] *= inv_area[:, None, None]
+
+    # screen space barycentrics interpolate 1/z linearly
+    inv_z = 1.0 / z
+    coefficients[:, 2] = coefficients[:, 0] * (inv_z[:, 0] - inv_z[:, 2])[:, None]
+    coefficients[:, 2] += coefficients[:, 1] * (inv_z[:, 1] - inv_z[:, 2])[:, None]
+    coefficients[:, 2, 2] += inv_z[:, 2]
+    return coefficients
+
+
+def rasterize_mesh(
+    vertices: np.ndarray,
+    faces: np.ndarray,
+    intrinsics: np.ndarray,
+    extrinsics: np.ndarray,
+    height: int,
+    width: int,
+    cull_backfaces: bool = True,
+    znear: float = 1e-2,
+    chunk_pixels: int = 1 << 21,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Rasterize one view of a triangle mesh with an OpenCV camera.
+
+    Every face is binned to the pixels of its screen space bounding box, the
+    candidates are tested with barycentric coordinates and resolved against a
+    z-buffer in chunks of at most chunk_pixels candidates. Faces with a vertex
+    in front of znear are dropped instead of clipped.
+    Returns depth (H, W) float32 and pix_to_face (H, W) int64, -1 for background.
+    """
+    num_pixels = height * width
+    zbuf = np.full(num_pixels, np.inf, dtype=np.float32)
+    pix_to_face = np.full(num_pixels, -1, dtype=np.int64)
+
+    verts_cam = vertices.astype(np.float64) @ extrinsics[:3, :3].T
+    verts_cam += extrinsics[:3, 3]
+    z = verts_cam[:, 2]
+    safe_z = np.where(np.abs(z) > 1e-8, z, 1e-8)
+    u = intrinsics[0, 0] * verts_cam[:, 0] / safe_z + intrinsics[0, 2]
+    v = intrinsics[1, 1] * verts_cam[:, 1] / safe_z + intrinsics[1, 2]
+
+    # drop faces behind the near plane or outside the image before anything else
+    in_front = z > znear
+    valid = in_front[faces[:, 0]] & in_front[faces[:, 1]] & in_front[faces[:, 2]]
+    face_ids = np.flatnonzero(valid)
+    face_u, face_v = u[faces[face_ids]], v[faces[face_ids]]
+    x_min, x_max = _face_bounds(face_u, width)
+    y_min, y_max = _face_bounds(face_v, height)
+    valid = (x_min <= x_max) & (y_min <= y_max)
+    if cull_backfaces:
+        # counter-clockwise faces in the world are clockwise on screen, y points down
+        signed_area = (face_u[:, 1] - face_u[:, 0]) * (face_v[:, 2] - face_v[:, 0]) - (
+            face_v[:, 1] - face_v[:, 0]
+        ) * (face_u[:, 2] - face_u[:, 0])
+        valid &= signed_area < 0
+
+    face_ids = face_ids[valid]
+    if len(face_ids) == 0:
+        return _finish(zbuf, pix_to_face, height, width)
+
+    coefficients = _plane_coefficients(
+        face_u[valid], face_v[valid], z[faces[face_ids]]
+    )
+    x_min, y_min = x_min[valid], y_min[valid]
+    box_width = x_max[valid] - x_min + 1
+    counts = box_width * (y_max[valid] - y_min + 1)
+
+    # split the faces so that no chunk expands to more than chunk_pixels candidates
+    ends = np.cumsum(counts)
+    boundaries = np.searchsorted(
+        ends, np.arange(chunk_pixels, ends[-1], chunk_pixels), side="right"
+    )
+    boundaries = np.unique(np.concatenate([[0], boundaries, [len(face_ids)]]))
+
+    for start, stop in zip(boundaries[:-1], boundaries[1:]):
+        chunk_counts = counts[start:stop]
+        local = np.repeat(np.arange(start, stop), chunk_counts)
+        offsets = np.arange(len(local)) - np.repeat(
+            np.cumsum(chunk_counts) - chunk_counts, chunk_counts
+        )
+        widths = box_width[local]
+        px = x_min[local] + offsets % widths
+        py = y_min[local] + offsets // widths
+
+        # w[:, i] = A * x + B * y + C for w0, w1 and 1/z
+        plane = coefficients[local]
+        w = plane[:, :, 0] * px[:, None] + plane[:, :, 1] * py[:, None]
+        w += plane[:, :, 2]
+        inside = (w[:, 0] >= -_EDGE_EPS) & (w[:, 1] >= -_EDGE_EPS)
+        inside &= w[:, 0] + w[:, 1] <= 1 + _EDGE_EPS
+        inside &= w[:, 2] > 0
+        if not inside.any():
+            continue
+
+        depth = (1.0 / w[inside, 2]).astype(np.float32)
+        pixels = py[inside] * width + px[inside]
+        local = local[inside]
+
+        # nearest candidate per pixel, positive floats sort like their bit patterns
+        keys = (pixels.astype(np.uint64) << np.uint64(32)) | depth.view(
+            np.uint32
+        ).astype(np.uint64)
+        order = np.argsort(keys)
+        pixels, depth, local = pixels[order], depth[order], local[order]
+        first = np.ones(len(pixels), dtype=bool)
+        first[1:] = pixels[1:] != pixels[:-1]
+        pixels, depth, local = pixels[first], depth[first], local[first]
+
+        # then merge into the z-buffer
+        closer = depth < zbuf[pixels]
+        pixels = pixels[closer]
+        zbuf[pixels] = depth[closer]
+        pix_to_face[pixels] = face_ids[local[closer]]
+
+    return _finish(zbuf, pix_to_face, height, width)
+
+
+def _finish(zbuf: np.ndarray, pix_to_face: np.ndarray, height: int, width: int):
+    zbuf[pix_to_face < 0] = -1
+    return zbuf.reshape(height, width), pix_to_face.reshape(height, width)
+
+
+class CPURasterizer:
+    """
+    NumPy mesh rasterizer for machines without a GPU.
+
+    Mirrors the PyTorch3DRenderer interface used by the datasets: load a mesh
+    once, set SceneKitCameras and rasterize them. Views are distributed over
+    num_workers processes that keep a copy of the mesh between calls.
+    """
+
+    def __init__(
+        self,
+        mesh=None,
+        num_workers: int = None,
+        cull_backfaces: bool = True,
+        znear: float = 1e-2,
+    ):
+        self.vertices = None
+        self.faces = None
+        self.cameras = []
+        self.num_workers = num_workers if num_workers is not None else os.cpu_count()
+        self.cull_backfaces = cull_backfaces
+        self.znear = znear
+        self._executor = None
+
+        if mesh is not None:
+            self.set_mesh(mesh)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def load_ply(self, ply_path: str):
+        mesh = trimesh.load(ply_path, process=False)
+        self.set_mesh((mesh.vertices, mesh.faces))
+        return self.vertices, self.faces
+
+    def set_mesh(self, mesh):
+        if isinstance(mesh, str):
+            self.load_ply(mesh)
+            return
+        if isinstance(mesh, tuple):
+            vertices, faces = mesh
+        else:
+            vertices, faces = mesh.vertices, mesh.faces
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int64)
+        # workers hold the previous mesh
+        self.close()
+
+    def add_camera(self, camera: SceneKitCamera):
+        self.cameras.append(camera)
+
+    def set_cameras(self, cameras: List[SceneKitCamera]):
+        self.cameras = cameras
+
+    def reset_cameras(self):
+        self.cameras = []
+
+    def close(self):
+        if getattr(self, "_executor", None) is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def convert_scenekit_cameras(self, target_resolution: int = 640):
+        tasks = []
+        for camera in self.cameras:
+            scale = target_resolution / camera.width
+            intrinsics = np.array(camera.intrinsics, dtype=np.float64)
+            intrinsics[:2, :] = intrinsics[:2, :] * scale
+            tasks.append(
+                (
+                    intrinsics,
+                    np.asarray(camera.extrinsics, dtype=np.float64),
+                    int(camera.height * scale),
+                    int(camera.width * scale),
+                    self.cull_backfaces,
+                    self.znear,
+                )
+            )
+        return tasks
+
+    def rasterize(self, target_resolution: int = 640) -> CPUFragments:
+        if self.vertices is None:
+            raise ValueError("No mesh loaded, call load_ply or set_mesh first")
+
+        tasks = self.convert_scenekit_cameras(target_resolution)
+        if self.num_workers > 1 and len(tasks) > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    initializer=_init_raster_worker,
+                    initargs=(self.vertices, self.faces),
+                )
+            results = list(self._executor.map(_run_raster_task, tasks))
+        else:
+            results = [
+                rasterize_mesh(self.vertices, self.faces, *task) for task in tasks
+            ]
+
+        zbuf = np.stack([depth for depth, _ in results])[..., None]
+        pix_to_face = np.stack([faces for _, faces in results])[..., None]
+        return CPUFragments(zbuf=zbuf, pix_to_face=pix_to_face)
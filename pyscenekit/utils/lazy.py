@@ -0,0 +1,57 @@
+import sys
+import importlib
+import importlib.util
+from types import ModuleType
+from typing import Dict
+
+
+class _MissingModule(ModuleType):
+    def __getattr__(self, attr: str):
+        name = self.__name__
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+
+
+class _LazyModule(ModuleType):
+    # proxy that imports the module on first attribute access, it is not put in
+    # sys.modules, so code walking sys.modules (e.g. import torch) cannot load it
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Return a module that is only executed on first attribute access.
+
+    Used for heavy dependencies such as open3d or trimesh that are needed by a
+    few methods but would otherwise be imported with the whole package.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        spec = importlib.util.find_spec(name)
+    except ModuleNotFoundError:
+        spec = None
+    if spec is None:
+        # report the missing dependency when it is used, not when it is imported
+        return _MissingModule(name)
+    return _LazyModule(name)
+
+
+def lazy_attributes(module_name: str, attributes: Dict[str, str]):
+    """
+    Build a module-level __getattr__ that imports attributes on first access.
+
+    attributes maps an attribute name to the module that defines it.
+    """
+
+    def __getattr__(name: str):
+        if name not in attributes:
+            raise AttributeError(f"module '{module_name}' has no attribute '{name}'")
+        value = getattr(importlib.import_module(attributes[name]), name)
+        setattr(sys.modules[module_name], name, value)
+        return value
+
+    return __getattr__
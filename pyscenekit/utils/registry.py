@@ -0,0 +1,128 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import torch
+
+from pyscenekit.utils.common import log
+
+
+class ModelRegistry:
+    """
+    Process-wide store of loaded model weights.
+
+    Models that resolve to the same key share one set of weights. Each holder
+    acquires the weights on first use and releases them on unload, the weights
+    are dropped once the last holder releases them.
+    """
+
+    def __init__(self):
+        self._models: Dict[Hashable, Dict[str, Any]] = {}
+        self._refcounts: Dict[Hashable, int] = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, key: Hashable):
+        return key in self._models
+
+    def __len__(self):
+        return len(self._models)
+
+    def keys(self):
+        return list(self._models.keys())
+
+    def acquire(
+        self, key: Hashable, loader: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        with self._lock:
+            if key not in self._models:
+                log.info(f"Loading model {key}")
+                self._models[key] = loader()
+                self._refcounts[key] = 0
+            self._refcounts[key] += 1
+            return self._models[key]
+
+    def release(self, key: Hashable):
+        with self._lock:
+            if key not in self._models:
+                return
+            self._refcounts[key] -= 1
+            if self._refcounts[key] <= 0:
+                log.info(f"Unloading model {key}")
+                del self._models[key]
+                del self._refcounts[key]
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._refcounts.clear()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+
+class SharedModelMixin:
+    """
+    Lazy loading through MODEL_REGISTRY for classes that implement load_model.
+
+    load_model fills the attributes listed in model_attributes, they are shared
+    by every instance with the same registry_key and moved to self.device once.
+    """
+
+    model_attributes: Tuple[str, ...] = ("model",)
+
+    # identifies the weights independent of the device, subclasses with extra
+    # loading options append them here
+    def model_signature(self) -> Tuple:
+        return (
+            type(self).__name__,
+            self.model_path,
+            str(getattr(self, "weight_dtype", None)),
+        )
+
+    def registry_key(self) -> Tuple:
+        return self.model_signature() + (str(self.device),)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.model is not None
+
+    def ensure_model_loaded(self):
+        if self.model is not None:
+            return
+
+        key = self.registry_key()
+        state = MODEL_REGISTRY.acquire(key, self._load_shared_model)
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._registry_key = key
+
+    def _load_shared_model(self) -> Dict[str, Any]:
+        self.load_model()
+        self._move_model()
+        return {name: getattr(self, name) for name in self.model_attributes}
+
+    # move freshly loaded weights to self.device
+    def _move_model(self):
+        self.model.to(self.device)
+
+    def warmup(self):
+        self.ensure_model_loaded()
+        return self
+
+    def unload(self):
+        if self.model is None:
+            return
+        for name in self.model_attributes:
+            setattr(self, name, None)
+        MODEL_REGISTRY.release(self._registry_key)
+        self._registry_key = None
+
+    def to(self, device: str):
+        device = torch.device(device)
+        if self.model is not None and device != self.device:
+            # the loaded weights are shared, reload them for the new device instead
+            self.unload()
+        self.device = device
@@ -0,0 +1,39 @@
+import os
+
+import cv2
+import numpy as np
+
+from pyscenekit.scenekit3d.datasets.scannetpp.dlsr import ScanNetPPDLSRDataset
+
+
+def make_scene(data_dir, num_images=3):
+    # minimal DSLR scene: resized images and colmap images.txt, no transforms
+    image_dir = os.path.join(data_dir, "resized_images")
+    colmap_dir = os.path.join(data_dir, "colmap")
+    os.makedirs(image_dir)
+    os.makedirs(colmap_dir)
+    rng = np.random.default_rng(0)
+    images = []
+    lines = []
+    for i in range(num_images):
+        name = f"DSC{i:05d}.JPG"
+        image = rng.integers(0, 255, (12, 16, 3), dtype=np.uint8)
+        path = os.path.join(image_dir, name)
+        cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 100])
+        images.append(cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB))
+        lines += [f"{i + 1} 1 0 0 0 0 0 0 1 {name}", ""]
+    with open(os.path.join(colmap_dir, "images.txt"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return images
+
+
+def test_get_images_by_indices_without_undistortion(tmp_path):
+    images = make_scene(str(tmp_path))
+    dataset = ScanNetPPDLSRDataset(str(tmp_path), undistort=False, num_workers=2)
+
+    batch = dataset.get_images_by_indices([2, 0])
+
+    assert len(batch) == 2
+    np.testing.assert_array_equal(batch[0], images[2])
+    np.testing.assert_array_equal(batch[1], images[0])
+    np.testing.assert_array_equal(batch[0], dataset.get_image_by_index(2))